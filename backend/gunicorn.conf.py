@@ -0,0 +1,58 @@
+"""
+Gunicorn configuration for production serving.
+
+Loaded automatically when gunicorn starts from this directory. The app is
+preloaded in the master, which then builds the GraphQL schema, persisted
+queries and entity caches once before forking workers (see
+huskyden.warmup). Every value can be overridden through the environment.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# gthread workers overlap database waits inside a worker with threads, so
+# one process per usable CPU is enough; the 2 x CPUs + 1 rule is for sync
+# workers and only added contention in load tests. Set
+# GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker and serve
+# huskyden.asgi:application to run under ASGI instead.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+try:
+    _cpus = len(os.sched_getaffinity(0))
+except AttributeError:  # not available on macOS
+    _cpus = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpus))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Settings split DB_MAX_CONNECTIONS between the workers' connection pools;
+# the app is loaded after this file, so it sees the final count.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+preload_app = True
+
+# Recycle workers periodically to cap memory growth; the jitter keeps them
+# from all restarting at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before workers fork.
+    from huskyden.warmup import warm_up
+
+    warm_up()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    # Connections must never be shared with the master process.
+    for connection in connections.all(initialized_only=True):
+        connection.close()
@@ -0,0 +1,9 @@
+from django.utils.crypto import constant_time_compare
+
+
+def staff_or_bearer_token(request, token):
+    """True for staff sessions or an ``Authorization: Bearer <token>`` header."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f"Bearer {token}")
@@ -0,0 +1,87 @@
+"""
+Negotiated compression for GraphQL responses.
+
+Only bodies larger than ``GRAPHQL_COMPRESSION_MIN_BYTES`` are compressed;
+small payloads cost more CPU than they save on the wire. Brotli is used when
+the ``brotli`` package is installed and the client accepts it, gzip otherwise.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+ENCODING_SUFFIXES = ('-br', '-gzip')
+
+
+def accepted_encodings(request):
+    """Map each encoding in Accept-Encoding to its q-value."""
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(request):
+    accepted = accepted_encodings(request)
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=getattr(settings, 'GRAPHQL_BROTLI_QUALITY', 5))
+    return gzip.compress(data, compresslevel=getattr(settings, 'GRAPHQL_GZIP_LEVEL', 6), mtime=0)
+
+
+def strip_etag_suffix(etag):
+    """Return the identity ETag for a tag that may carry an encoding suffix."""
+    for suffix in ENCODING_SUFFIXES:
+        if etag.endswith(suffix + '"'):
+            return etag[:-len(suffix) - 1] + '"'
+    return etag
+
+
+def compress_response(request, response):
+    """Compress ``response`` in place if it is large enough and accepted."""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if response.streaming or response.has_header('Content-Encoding'):
+        return response
+
+    encoding = negotiate_encoding(request)
+    if encoding is None:
+        return response
+
+    if response.status_code != 200:
+        return response
+    if len(response.content) < getattr(settings, 'GRAPHQL_COMPRESSION_MIN_BYTES', 1024):
+        return response
+
+    compressed = compress(response.content, encoding)
+    if len(compressed) >= len(response.content):
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    if response.has_header('ETag'):
+        # Strong ETags must differ between representations.
+        response['ETag'] = response['ETag'][:-1] + f'-{encoding}"'
+    return response
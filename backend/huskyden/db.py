@@ -0,0 +1,87 @@
+import json
+
+from django.db import DatabaseError, connections
+
+
+def pool_stats():
+    """
+    Connection pool statistics for this worker, keyed by database alias.
+    Databases without a psycopg pool are reported as ``None``.
+    """
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        if not settings_dict.get("OPTIONS", {}).get("pool"):
+            stats[alias] = None
+            continue
+        pool = connections[alias].pool
+        raw = pool.get_stats()
+        in_use = raw.get("pool_size", 0) - raw.get("pool_available", 0)
+        stats[alias] = {
+            "size": raw.get("pool_size", 0),
+            "available": raw.get("pool_available", 0),
+            "in_use": in_use,
+            "max_size": pool.max_size,
+            "saturation": round(in_use / pool.max_size, 3) if pool.max_size else None,
+            "requests_waiting": raw.get("requests_waiting", 0),
+            "requests_queued": raw.get("requests_queued", 0),
+            "requests_wait_ms": raw.get("requests_wait_ms", 0),
+            "requests_errors": raw.get("requests_errors", 0),
+            "connections_lost": raw.get("connections_lost", 0),
+        }
+    return stats
+
+
+def _table_estimate(connection, table):
+    """The planner's row count for ``table``, or None if it has none."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # reltuples is -1 until the table is first vacuumed or analyzed.
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # sqlite_stat1 exists once ANALYZE has run; stat starts with the row count.
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+def _plan_estimate(connection, queryset):
+    """The PostgreSQL planner's row estimate for ``queryset``."""
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.get_compiler(connection=connection).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset, exact_limit):
+    """
+    ``queryset.count()`` without scanning large tables: counts up to
+    ``exact_limit`` rows exactly, and past that uses the table statistics
+    (unfiltered) or the query planner's estimate (filtered, PostgreSQL).
+    Falls back to an exact count where neither is available.
+    """
+    connection = connections[queryset.db]
+    query = queryset.query
+    if not query.where and not query.distinct and not query.combinator:
+        estimate = _table_estimate(connection, queryset.model._meta.db_table)
+        if estimate is not None and estimate > exact_limit:
+            return estimate
+
+    capped = queryset.order_by()[:exact_limit + 1].count()
+    if capped <= exact_limit:
+        return capped
+    estimate = _plan_estimate(connection, queryset)
+    if estimate is not None:
+        return max(estimate, capped)
+    return queryset.count()
@@ -0,0 +1,233 @@
+"""
+HTTP caching for read-only GraphQL GET requests.
+
+Queries can be sent as GET with the full ``query`` or, once registered, with
+only an Apollo-style persisted-query hash::
+
+    /graphql/?extensions={"persistedQuery":{"version":1,"sha256Hash":"..."}}
+
+A query is registered when a request carries both the query and its hash.
+Only documents under ``PERSISTED_QUERY_MAX_BYTES`` that validate against
+the schema are stored: for ``PERSISTED_QUERY_TIMEOUT`` seconds in the shared
+cache and in a per-process LRU of ``PERSISTED_QUERY_LOCAL_SIZE`` entries.
+Clients re-register an expired hash when told PersistedQueryNotFound.
+
+The ETag of a response is derived from the query hash, the variables and the
+version counters (reviews.cache) of every model the operation can read, so a
+conditional GET is answered with 304 before the query is executed. Bodies
+read from a replica get no ETag: the versions count writes the replica may
+not have replayed yet.
+``Cache-Control`` comes from the hints declared in ``reviews.schema``.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import (
+    FieldNode,
+    OperationDefinitionNode,
+    OperationType,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    graphql_sync,
+    parse,
+    validate,
+    visit,
+)
+
+from reviews.cache import get_version
+
+from .compression import strip_etag_suffix
+from reviews.schema import CACHE_HINTS
+
+PERSISTED_QUERY_PREFIX = 'persisted-query:'
+
+
+class PersistedQueryNotFound(Exception):
+    pass
+
+
+class PersistedQueryMismatch(Exception):
+    pass
+
+
+class PersistedQueryRejected(Exception):
+    pass
+
+
+def _persisted_query_cache():
+    return caches[getattr(settings, 'PERSISTED_QUERY_CACHE_ALIAS', 'entities')]
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+_local_queries = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _local_get(digest):
+    with _local_lock:
+        query = _local_queries.get(digest)
+        if query is not None:
+            _local_queries.move_to_end(digest)
+        return query
+
+
+def _local_set(digest, query):
+    with _local_lock:
+        _local_queries[digest] = query
+        _local_queries.move_to_end(digest)
+        while len(_local_queries) > settings.PERSISTED_QUERY_LOCAL_SIZE:
+            _local_queries.popitem(last=False)
+
+
+def register_persisted_query(query, sha256_hash=None, graphql_schema=None):
+    """
+    Store ``query`` under its SHA-256 hash and return the hash. With
+    ``graphql_schema``, raises PersistedQueryRejected for a document that
+    is too large or does not validate.
+    """
+    digest = query_hash(query)
+    if sha256_hash and sha256_hash != digest:
+        raise PersistedQueryMismatch('provided sha does not match query')
+    if _local_get(digest) is not None:
+        return digest
+    if graphql_schema is not None:
+        if len(query.encode('utf-8')) > settings.PERSISTED_QUERY_MAX_BYTES:
+            raise PersistedQueryRejected('query is too large to persist')
+        try:
+            errors = validate(graphql_schema, parse(query))
+        except Exception:
+            errors = True
+        if errors:
+            raise PersistedQueryRejected('query does not validate')
+    _local_set(digest, query)
+    _persisted_query_cache().set(
+        PERSISTED_QUERY_PREFIX + digest, query, timeout=settings.PERSISTED_QUERY_TIMEOUT,
+    )
+    return digest
+
+
+def lookup_persisted_query(sha256_hash):
+    query = _local_get(sha256_hash)
+    if query is None:
+        query = _persisted_query_cache().get(PERSISTED_QUERY_PREFIX + sha256_hash)
+        if query is None:
+            raise PersistedQueryNotFound(sha256_hash)
+        _local_set(sha256_hash, query)
+    return query
+
+
+def persisted_query_hash(extensions):
+    """Return the sha256Hash of an APQ ``extensions`` payload, if any."""
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get('persistedQuery') or {}
+    return persisted.get('sha256Hash')
+
+
+class CachePolicy:
+    def __init__(self, max_age, models, read_only=True, introspection=False):
+        self.max_age = max_age
+        self.models = models
+        self.read_only = read_only
+        self.introspection = introspection
+
+    @property
+    def header(self):
+        if self.max_age > 0:
+            return f"public, max-age={self.max_age}"
+        return "no-cache"
+
+
+@lru_cache(maxsize=512)
+def operation_cache_policy(graphql_schema, query):
+    """
+    Walk every field the query selects and collect the smallest ``max_age``
+    hint and the set of models whose writes can change the result.
+    """
+    document = parse(query)
+    type_info = TypeInfo(graphql_schema)
+    max_ages = []
+    models = set()
+
+    class HintVisitor(Visitor):
+        def enter_field(self, node, *args):
+            parent = type_info.get_parent_type()
+            field_type = type_info.get_type()
+            if parent is None or field_type is None:
+                return
+            named = get_named_type(field_type)
+            graphene_type = getattr(named, 'graphene_type', None)
+            model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+            if model is not None:
+                models.add(model)
+            hint = CACHE_HINTS.get(f"{parent.name}.{node.name.value}") or CACHE_HINTS.get(named.name)
+            if hint is not None:
+                max_ages.append(hint.max_age)
+                models.update(hint.models)
+
+    visit(document, TypeInfoVisitor(type_info, HintVisitor()))
+    max_age = min(max_ages) if max_ages else 0
+    operations = [
+        definition for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    ]
+    read_only = all(operation.operation == OperationType.QUERY for operation in operations)
+    introspection = read_only and all(
+        isinstance(selection, FieldNode) and selection.name.value.startswith('__')
+        for operation in operations
+        for selection in operation.selection_set.selections
+    )
+    return CachePolicy(
+        max_age, tuple(sorted(models, key=lambda m: m._meta.label_lower)), read_only, introspection
+    )
+
+
+@lru_cache(maxsize=16)
+def introspection_result(graphql_schema, query, operation_name=None):
+    """
+    Execute an introspection-only query once per schema. GraphiQL and
+    codegen tools send the same large document repeatedly and the answer
+    depends on nothing but the schema.
+    """
+    return graphql_sync(graphql_schema, query, operation_name=operation_name)
+
+
+def compute_etag(query, operation_name, variables, policy):
+    """Strong ETag over the query, its inputs and the models' versions."""
+    versions = [f"{model._meta.label_lower}={get_version(model)}" for model in policy.models]
+    payload = json.dumps(
+        [query_hash(query), operation_name, variables or {}, versions],
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return '"' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:40] + '"'
+
+
+def matching_etag(request, etag):
+    """
+    Return the If-None-Match tag that matches ``etag``, or None. Tags of
+    compressed representations match their identity tag.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return None
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or strip_etag_suffix(candidate) == etag:
+            return candidate
+    return None
@@ -0,0 +1,83 @@
+"""
+GraphQL documents sent by the frontend pages.
+
+Kept in one place so the server can pre-register them as persisted queries
+at startup and so the benchmark and load-test commands exercise exactly the
+documents real visitors send.
+"""
+
+# frontend/app/search/page.tsx
+SEARCH_PAGE = {
+    'GetCourses': """
+        query GetCourses {
+          courses(first: 100) {
+            edges { node { id code title department { code name } avgRating avgWorkload avgDifficulty } }
+          }
+        }
+    """,
+    'GetProfessors': """
+        query GetProfessors {
+          professors(first: 100) {
+            edges { node { id name department { code name } avgRating } }
+          }
+        }
+    """,
+    'GetDepartments': """
+        query GetDepartments {
+          departments(first: 100) {
+            edges { node { id code name } }
+          }
+        }
+    """,
+}
+
+# frontend/app/course/[code]/page.tsx and professors/[slug]/[courseCode]/page.tsx
+DETAIL_PAGES = {
+    'CoursePage': """
+        query CoursePage($code: String!) {
+          coursePage(code: $code, reviewsFirst: 0) {
+            course { id code title description department { code name } avgRating avgWorkload avgDifficulty }
+            professors {
+              professor { id name slug }
+              reviewCount avgRating avgWorkload avgDifficulty
+              mostHelpfulReview { id rating workload difficulty comment createdAt }
+            }
+          }
+        }
+    """,
+    'ProfessorCoursePage': """
+        query ProfessorCoursePage($slug: String!, $courseCode: String!) {
+          professorCoursePage(slug: $slug, courseCode: $courseCode, reviewsFirst: 20) {
+            professor { id name slug department { code name } avgRating }
+            course { id code title }
+            stats { reviewCount avgRating avgWorkload avgDifficulty }
+            reviews { id rating workload difficulty comment createdAt }
+            hasMoreReviews
+          }
+        }
+    """,
+}
+
+# What the detail pages sent before the page queries: the whole course or
+# professor with every review. Kept to compare against (benchmark_pages).
+STITCHED_DETAIL_PAGES = {
+    'GetCourse': """
+        query GetCourse($code: String!) {
+          course(code: $code) {
+            id code title description department { code name }
+            avgRating avgWorkload avgDifficulty
+            reviews { id rating workload difficulty comment professor { id name slug } createdAt }
+          }
+        }
+    """,
+    'GetProfessorBySlug': """
+        query GetProfessorBySlug($slug: String!) {
+          professor(slug: $slug) {
+            id name slug department { code name } avgRating
+            reviews { id rating workload difficulty comment course { id code title } createdAt }
+          }
+        }
+    """,
+}
+
+FRONTEND_OPERATIONS = {**SEARCH_PAGE, **DETAIL_PAGES}
@@ -0,0 +1,236 @@
+"""
+Opt-in profiling of GraphQL requests.
+
+A request is profiled when it carries a valid ``X-Profile`` header (a
+signed token from ``manage.py profile_token``) or, with
+``PROFILE_SAMPLE_RATE`` above zero, when it is picked at random. A sampler
+thread records the stack of the thread serving it every
+``PROFILE_INTERVAL`` seconds, and every SQL query it runs is timed. The
+result is stored as a ``RequestProfile``: the stacks in collapsed format
+(one ``frame;frame;frame count`` line per distinct stack, which speedscope
+and flamegraph.pl read) and the queries, keyed by operation name. The
+response carries the profile's id in ``X-Profile-Id``.
+
+Staff browse the slowest profiles in the admin. Requests that are not
+profiled pay for one header lookup and, with sampling on, one random
+number.
+"""
+import contextlib
+import logging
+import random
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from graphql import OperationDefinitionNode, parse
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'huskyden.profiling'
+TOKEN_VALUE = 'profile'
+# Deeper frames are cut off; Django, graphene and the ORM fit comfortably
+MAX_DEPTH = 200
+
+_PATH_PREFIXES = sorted(
+    {str(Path(path)) + '/' for path in (sysconfig.get_paths()['purelib'], sysconfig.get_paths()['stdlib'])}
+    | {str(settings.BASE_DIR) + '/'},
+    key=len, reverse=True,
+)
+
+
+def make_token():
+    """A header value that enables profiling for PROFILE_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def trigger(request):
+    """'header', 'sample' or None: why (and whether) to profile ``request``."""
+    token = request.META.get('HTTP_X_PROFILE')
+    if token:
+        try:
+            value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            value = None
+        if value == TOKEN_VALUE:
+            return 'header'
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def operation_name(entries):
+    """The operation names of a request's GraphQL payloads, joined with '+'."""
+    names = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get('operationName')
+        if not name:
+            try:
+                document = parse(entry.get('query') or '')
+            except Exception:
+                document = None
+            for definition in getattr(document, 'definitions', ()):
+                if isinstance(definition, OperationDefinitionNode):
+                    name = definition.name.value if definition.name else None
+                    break
+        names.append(name or 'anonymous')
+    return '+'.join(names)[:200] or 'anonymous'
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    # ';' separates frames in the collapsed format.
+    return f"{code.co_qualname} ({filename})".replace(';', ',')
+
+
+_switch_lock = threading.Lock()
+_active_samplers = 0
+_default_switch_interval = None
+
+
+class StackSampler:
+    """
+    Samples one thread's stack from a background thread. While any sampler
+    runs, the interpreter's thread switch interval (5 ms by default) is
+    lowered to the sampling interval, or the sampler would rarely get to run.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        global _active_samplers, _default_switch_interval
+        with _switch_lock:
+            if not _active_samplers:
+                _default_switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(_default_switch_interval, self.interval))
+            _active_samplers += 1
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active_samplers
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            _active_samplers -= 1
+            if not _active_samplers:
+                sys.setswitchinterval(_default_switch_interval)
+
+    def collapsed(self):
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that times every query."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.total = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total += elapsed
+            if len(self.queries) < self.limit:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'params': [str(param)[:200] for param in (params or ())] if not many else [],
+                    'ms': round(elapsed, 3),
+                })
+
+
+class Profile:
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.operation = 'anonymous'
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_INTERVAL)
+        self.recorder = QueryRecorder(settings.PROFILE_MAX_QUERIES)
+        self.duration = 0.0
+        self.pk = None
+
+    @contextlib.contextmanager
+    def running(self):
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.recorder))
+            stack.enter_context(self.sampler)
+            try:
+                yield self
+            finally:
+                self.duration = (time.perf_counter() - start) * 1000
+
+    def save(self):
+        """Store the profile and drop all but the newest PROFILE_KEEP. Returns its id."""
+        from reviews.models import RequestProfile
+
+        profile = RequestProfile.objects.create(
+            operation=self.operation,
+            trigger=self.trigger,
+            duration_ms=round(self.duration, 3),
+            query_count=self.recorder.count,
+            sql_ms=round(self.recorder.total, 3),
+            sample_count=sum(self.sampler.stacks.values()),
+            stacks=self.sampler.collapsed(),
+            queries=self.recorder.queries,
+        )
+        stale = list(
+            RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[settings.PROFILE_KEEP:]
+        )
+        if stale:
+            RequestProfile.objects.filter(pk__in=stale).delete()
+        return profile.pk
+
+
+@contextlib.contextmanager
+def maybe_profile(request):
+    """
+    Profile the enclosed block if ``request`` asks for it. Yields the
+    Profile (set its ``operation``) or None; stores it on exit.
+    """
+    reason = trigger(request)
+    if reason is None:
+        yield None
+        return
+    profile = Profile(reason)
+    with profile.running():
+        yield profile
+    try:
+        profile.pk = profile.save()
+    except Exception:
+        # Profiling must never fail the request it measured.
+        logger.exception("Could not store the profile of %s", profile.operation)
@@ -0,0 +1,348 @@
+"""
+Per-client token buckets for the GraphQL endpoint.
+
+Clients are identified by a known API key (``X-API-Key`` or
+``Authorization: Bearer``, listed in ``RATE_LIMIT_API_KEYS``) or else by IP.
+Each client has two buckets from ``RATE_LIMITS``: ``query`` is charged
+the estimated number of objects a query returns (``query_cost``) and
+``mutation`` one token per mutation field, or per item of its longest list
+argument (``createReviews(inputs: [...])`` costs one token per review).
+
+Buckets use GCRA, a token bucket stored as one timestamp. Every worker
+decides from its own copy of a client's bucket, which keeps the check to
+a few microseconds. Every ``RATE_LIMIT_SYNC_INTERVAL`` seconds it merges
+its consumption into the copy in the shared cache. Across N workers a
+client can overshoot by at most what N workers grant in one sync
+interval.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    IntValueNode,
+    ListValueNode,
+    OperationDefinitionNode,
+    OperationType,
+    VariableNode,
+    get_named_type,
+    is_list_type,
+    get_nullable_type,
+    parse,
+)
+
+CACHE_PREFIX = 'ratelimit:'
+
+
+class QueryTooExpensive(Exception):
+    pass
+
+
+def _page_size():
+    from graphene_django.settings import graphene_settings
+
+    return graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+
+
+def _is_model_type(named):
+    graphene_type = getattr(named, 'graphene_type', None)
+    return getattr(getattr(graphene_type, '_meta', None), 'model', None) is not None
+
+
+def _selection_cost(selection_set, parent_type, fragments, multiplier, schema, seen):
+    cost = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, InlineFragmentNode):
+            fragment_type = (
+                schema.get_type(selection.type_condition.name.value)
+                if selection.type_condition else parent_type
+            )
+            cost += _selection_cost(selection.selection_set, fragment_type, fragments, multiplier, schema, seen)
+            continue
+        if isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in seen:
+                continue
+            cost += _selection_cost(
+                fragment.selection_set, schema.get_type(fragment.type_condition.name.value),
+                fragments, multiplier, schema, seen | {name},
+            )
+            continue
+        if not isinstance(selection, FieldNode):
+            continue
+
+        name = selection.name.value
+        if name.startswith('__'):
+            cost += 1 if selection.selection_set else 0
+            continue
+        field = getattr(parent_type, 'fields', {}).get(name)
+        if field is None or selection.selection_set is None:
+            continue
+
+        named = get_named_type(field.type)
+        rows = multiplier
+        if 'edges' in getattr(named, 'fields', {}):
+            # Connections return up to first/last nodes.
+            size = _page_size()
+            for argument in selection.arguments:
+                if argument.name.value in ('first', 'last') and isinstance(argument.value, IntValueNode):
+                    size = min(size, int(argument.value.value))
+            rows = multiplier * size
+        elif is_list_type(get_nullable_type(field.type)) and _is_model_type(named):
+            rows = multiplier * getattr(settings, 'RATE_LIMIT_LIST_SIZE', 10)
+
+        if _is_model_type(named):
+            cost += rows
+        cost += _selection_cost(selection.selection_set, named, fragments, rows, schema, seen)
+    return cost
+
+
+def _mutation_size(field):
+    """
+    ``(inline, *variable_names)`` for a mutation field: the length of its
+    longest inline list argument (at least 1) and the variables passed as
+    arguments, which count at their length when they hold lists.
+    """
+    sizes = [1]
+    for argument in field.arguments:
+        if isinstance(argument.value, ListValueNode):
+            sizes.append(len(argument.value.values))
+        elif isinstance(argument.value, VariableNode):
+            sizes.append(argument.value.name.value)
+    numbers = [size for size in sizes if isinstance(size, int)]
+    names = tuple(size for size in sizes if isinstance(size, str))
+    return (max(numbers), *names)
+
+
+@lru_cache(maxsize=512)
+def _analyze(graphql_schema, query):
+    document = parse(query)
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    cost, mutations = 0, []
+    for definition in document.definitions:
+        if not isinstance(definition, OperationDefinitionNode):
+            continue
+        if definition.operation == OperationType.MUTATION:
+            mutations.extend(
+                _mutation_size(selection) if isinstance(selection, FieldNode) else (1,)
+                for selection in definition.selection_set.selections
+            )
+            root = graphql_schema.mutation_type
+        else:
+            root = graphql_schema.query_type
+        cost += _selection_cost(definition.selection_set, root, fragments, 1, graphql_schema, frozenset())
+    return cost, tuple(mutations)
+
+
+def query_cost(graphql_schema, query, variables=None):
+    """
+    ``(query_cost, mutation_count)`` for a document: the estimated number of
+    model objects its queries return and the number of writes its mutation
+    fields ask for. Unknown list lengths use the page size (connections) or
+    ``RATE_LIMIT_LIST_SIZE``; list arguments passed as ``variables`` count
+    at their length, up to ``REVIEW_BATCH_MAX``.
+    """
+    cost, mutations = _analyze(graphql_schema, query)
+    variables = variables if isinstance(variables, dict) else {}
+    writes = 0
+    for inline, *names in mutations:
+        lengths = [len(variables[name]) for name in names if isinstance(variables.get(name), list)]
+        writes += min(max([inline, *lengths]), max(1, settings.REVIEW_BATCH_MAX))
+    return cost, writes
+
+
+def proxy_count():
+    """
+    RATE_LIMIT_PROXY_COUNT, or 1 on Railway when it is not set: behind its
+    proxy every REMOTE_ADDR is the proxy's, so all clients would share one
+    bucket.
+    """
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    if proxies is None:
+        return 1 if os.environ.get('RAILWAY_ENVIRONMENT') else 0
+    return proxies
+
+
+def client_key(request):
+    """A known API key, else the client IP (behind RATE_LIMIT_PROXY_COUNT proxies)."""
+    api_key = request.META.get('HTTP_X_API_KEY')
+    if not api_key:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if authorization.startswith('Bearer '):
+            api_key = authorization[7:]
+    if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+    proxies = proxy_count()
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR') if proxies else None
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return 'ip:' + hops[-min(proxies, len(hops))]
+    return 'ip:' + request.META.get('REMOTE_ADDR', '')
+
+
+class _Bucket:
+    __slots__ = ('tat', 'pending', 'synced_at')
+
+    def __init__(self, now):
+        self.tat = now
+        self.pending = 0.0
+        self.synced_at = now
+
+
+class RateLimiter:
+    """GCRA buckets kept per worker and merged through the shared cache."""
+
+    def __init__(self, rate, burst, name, max_clients=10000):
+        self.interval = 1.0 / rate
+        self.tolerance = burst * self.interval
+        self.burst = burst
+        self.name = name
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache(self):
+        return caches[getattr(settings, 'RATE_LIMIT_CACHE_ALIAS', 'entities')]
+
+    def _sync(self, key, bucket, now):
+        with self._lock:
+            pending, bucket.pending = bucket.pending, 0.0
+        cache = self._cache()
+        cache_key = f"{CACHE_PREFIX}{self.name}:{key}"
+        merged = cache.get(cache_key)
+        if pending:
+            merged = max(merged if merged is not None else now, now) + pending
+            cache.set(cache_key, merged, timeout=math.ceil(self.tolerance) + 60)
+        if merged is not None:
+            with self._lock:
+                bucket.tat = max(bucket.tat, merged)
+
+    def consume(self, key, cost=1):
+        """Charge ``cost`` tokens. Returns 0 if allowed, else seconds to wait."""
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                sync = True
+            else:
+                self._buckets.move_to_end(key)
+                sync = now - bucket.synced_at >= settings.RATE_LIMIT_SYNC_INTERVAL
+            if sync:
+                # Claimed here so concurrent requests of this client skip it.
+                bucket.synced_at = now
+
+        if sync:
+            self._sync(key, bucket, now)
+
+        increment = cost * self.interval
+        with self._lock:
+            new_tat = max(bucket.tat, now) + increment
+            wait = new_tat - now - self.tolerance
+            if wait > 0:
+                return wait
+            bucket.tat = new_tat
+            bucket.pending += increment
+        return 0
+
+    def refund(self, key, cost):
+        """Give back tokens ``consume`` charged for a request that was refused."""
+        increment = cost * self.interval
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.tat -= increment
+                bucket.pending -= increment
+
+
+_limiters = {}
+
+
+def limiter(name):
+    limiter = _limiters.get(name)
+    if limiter is None:
+        rate, burst = settings.RATE_LIMITS[name]
+        limiter = _limiters[name] = RateLimiter(rate, burst, name)
+    return limiter
+
+
+def total_cost(graphql_schema, queries, variables=None):
+    """
+    ``(query_cost, mutation_count)`` summed over several documents;
+    ``variables`` holds each document's variables, in the same order.
+    """
+    cost = mutations = 0
+    for query, query_variables in zip(queries, variables or [None] * len(queries)):
+        try:
+            query_total, query_mutations = query_cost(graphql_schema, query, query_variables) if query else (1, 0)
+        except Exception:
+            # Syntax errors are reported by execution; charge a minimal cost.
+            query_total, query_mutations = 1, 0
+        cost += query_total
+        mutations += query_mutations
+    return cost, mutations
+
+
+def check(request, graphql_schema, *queries, variables=None):
+    """
+    Charge the request's queries (all operations of a batch at once, with
+    their ``variables``) to its client's buckets. Returns 0 when allowed or
+    the seconds to wait; raises QueryTooExpensive for a request that could
+    never fit in the bucket. Refused requests are charged nothing.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return 0
+    cost, mutations = total_cost(graphql_schema, queries, variables)
+
+    charges = []
+    if mutations:
+        writes = limiter('mutation')
+        if mutations > writes.burst:
+            raise QueryTooExpensive(
+                f"Request makes {mutations} writes, more than the limit of {writes.burst}; split it"
+            )
+        charges.append((writes, mutations))
+    if cost or not mutations:
+        queries = limiter('query')
+        if cost > queries.burst:
+            raise QueryTooExpensive(
+                f"Query cost {cost} exceeds the limit of {queries.burst}; request fewer objects"
+            )
+        charges.append((queries, max(cost, 1)))
+
+    # A refused request keeps none of its charges.
+    key = client_key(request)
+    charged = []
+    for bucket, amount in charges:
+        wait = bucket.consume(key, amount)
+        if wait:
+            for earlier, earlier_amount in charged:
+                earlier.refund(key, earlier_amount)
+            return wait
+        charged.append((bucket, amount))
+    return 0
+
+
+def too_many_requests(wait):
+    response = HttpResponse(status=429)
+    response['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
@@ -0,0 +1,129 @@
+"""
+Read-replica routing.
+
+Reads go to ``default`` unless the code runs inside ``use_replica()``, which
+the GraphQL view enters for query operations. One healthy replica is chosen
+per request and every read of the request goes to it, so a page never mixes
+rows from replicas at different lag. Mutations always run against
+the primary, and a client that just wrote is kept on the primary for
+``REPLICA_STICKY_SECONDS`` (read-your-writes). Replicas that lag more than
+``REPLICA_MAX_LAG_SECONDS`` or cannot be reached are skipped until the next
+lag check.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Alias reads are routed to, None for the primary
+_replica = contextvars.ContextVar('replica', default=None)
+
+STICKY_COOKIE = 'hd_primary_until'
+STICKY_HEADER = 'X-Primary-Until'
+
+# alias -> (checked_at, healthy)
+_replica_health = {}
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def choose_replica(request=None):
+    """
+    A healthy replica alias, or None when there is none. The choice is
+    remembered on ``request`` so all its reads use the same replica.
+    """
+    if request is not None and hasattr(request, 'replica_alias'):
+        return request.replica_alias
+    replicas = healthy_replicas()
+    alias = random.choice(replicas) if replicas else None
+    if request is not None:
+        request.replica_alias = alias
+    return alias
+
+
+def read_from_replica(request):
+    """The replica the request's reads went to, or None for the primary."""
+    return getattr(request, 'replica_alias', None)
+
+
+@contextmanager
+def use_replica(enabled=True, request=None):
+    """Route reads inside the block to the request's replica, if any."""
+    token = _replica.set(choose_replica(request) if enabled and replica_aliases() else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (0 for non-PostgreSQL)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_is_in_recovery() "
+            "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+            "ELSE 0 END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _is_healthy(alias):
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    checked_at, healthy = _replica_health.get(alias, (0, True))
+    now = time.monotonic()
+    if now - checked_at < interval:
+        return healthy
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+        if not healthy:
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind; reading from primary")
+    except DatabaseError as e:
+        logger.warning(f"Replica {alias} unavailable: {e}")
+        healthy = False
+    _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+def healthy_replicas():
+    return [alias for alias in replica_aliases() if _is_healthy(alias)]
+
+
+def is_sticky(request):
+    """True if the client wrote recently and must read from the primary."""
+    value = request.COOKIES.get(STICKY_COOKIE) or request.META.get('HTTP_X_PRIMARY_UNTIL')
+    try:
+        return value is not None and float(value) > time.time()
+    except ValueError:
+        return False
+
+
+def mark_sticky(response):
+    """Pin the client to the primary for REPLICA_STICKY_SECONDS."""
+    seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+    until = f"{time.time() + seconds:.3f}"
+    response.set_cookie(STICKY_COOKIE, until, max_age=seconds, httponly=True, samesite='Lax')
+    response[STICKY_HEADER] = until
+    return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
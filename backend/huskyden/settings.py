@@ -11,12 +11,21 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 import dj_database_url
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# graphene_django is not an installed app: importing it during setup pulls in
+# the whole GraphQL stack (and psycopg) for every manage.py command. Only its
+# GraphiQL template and script are needed, located here without importing it.
+GRAPHENE_DJANGO_DIR = Path(importlib.util.find_spec("graphene_django").origin).parent
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -43,7 +52,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "graphene_django",
     "corsheaders",
     "reviews",
 ]
@@ -64,7 +72,7 @@ ROOT_URLCONF = "huskyden.urls"
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
+        "DIRS": [GRAPHENE_DJANGO_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
@@ -86,7 +94,7 @@ WSGI_APPLICATION = "huskyden.wsgi.application"
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600, conn_health_checks=True)
     }
 else:
     DATABASES = {
@@ -96,6 +104,99 @@ else:
         }
     }
 
+# Read replicas: comma-separated database URLs. GraphQL queries are spread
+# across them; mutations and anything outside a query stay on the primary.
+# Locally, point this at a copy of the SQLite file to exercise routing.
+REPLICA_DATABASES = []
+for _index, _url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    _alias = f"replica{_index}"
+    DATABASES[_alias] = dj_database_url.parse(_url, conn_max_age=600, conn_health_checks=True)
+    DATABASES[_alias]["TEST"] = {"MIRROR": "default"}
+    REPLICA_DATABASES.append(_alias)
+
+DATABASE_ROUTERS = ["huskyden.routers.ReplicaRouter"]
+
+# Clients that just wrote read from the primary for this many seconds
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+# Replicas further behind than this are skipped; lag is rechecked every
+# REPLICA_LAG_CHECK_INTERVAL seconds per worker
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+# PostgreSQL connection pooling (psycopg 3). Each gunicorn worker keeps its
+# own pool, so connection setup stays out of request latency. Pooling
+# replaces persistent connections, which is why CONN_MAX_AGE drops to 0;
+# CONN_HEALTH_CHECKS makes the pool check a connection before lending it.
+DB_POOL = os.environ.get('DB_POOL', 'True') == 'True'
+# Every gunicorn worker has its own pool, so the web tier can hold
+# WEB_CONCURRENCY x max_size connections. DB_MAX_CONNECTIONS is the part of
+# PostgreSQL's max_connections (100 by default) the web tier may use; leave
+# the rest for process_review_queue, migrations and psql. Each worker's pool
+# is capped at an equal share of it.
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 80))
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+DB_POOL_WORKER_SHARE = DB_MAX_CONNECTIONS // WEB_CONCURRENCY
+_pool_max_size = min(int(os.environ.get('DB_POOL_MAX_SIZE', 10)), DB_POOL_WORKER_SHARE)
+DB_POOL_OPTIONS = {
+    "min_size": min(int(os.environ.get('DB_POOL_MIN_SIZE', 2)), _pool_max_size),
+    "max_size": _pool_max_size,
+    "timeout": float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    "max_lifetime": float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    "max_idle": float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+}
+
+# SQLite tuning for local load tests: WAL lets readers run alongside the
+# writer, and IMMEDIATE transactions wait for the write lock up front
+# instead of failing with "database is locked" halfway through.
+SQLITE_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))};"
+    ),
+    "transaction_mode": "IMMEDIATE",
+}
+
+for _database in DATABASES.values():
+    if _database["ENGINE"] == "django.db.backends.postgresql" and DB_POOL:
+        if DB_POOL_WORKER_SHARE < 1:
+            raise ImproperlyConfigured(
+                f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS} leaves no connection for each of "
+                f"{WEB_CONCURRENCY} workers; lower WEB_CONCURRENCY or raise DB_MAX_CONNECTIONS"
+            )
+        _database["CONN_MAX_AGE"] = 0
+        _database.setdefault("OPTIONS", {})["pool"] = DB_POOL_OPTIONS
+    elif _database["ENGINE"] == "django.db.backends.sqlite3":
+        _database.setdefault("OPTIONS", {}).update(SQLITE_OPTIONS)
+
+
+# Caches
+# The ``entities`` cache is the shared tier of reviews.cache.EntityCache. It is
+# file-based so every gunicorn worker on a host sees the same entries without
+# needing Redis; point ENTITY_CACHE_DIR at a shared volume if needed.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "entities": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get(
+            'ENTITY_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'huskyden-entity-cache')
+        ),
+        "TIMEOUT": int(os.environ.get('ENTITY_CACHE_TIMEOUT', 3600)),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+ENTITY_CACHE_ALIAS = "entities"
+ENTITY_CACHE_LOCAL_SIZE = int(os.environ.get('ENTITY_CACHE_LOCAL_SIZE', 512))
+# Seconds a worker trusts its copy of a model's version counter, and the
+# size and lifetime of its per-process cache of lookups that found nothing
+ENTITY_CACHE_VERSION_TTL = float(os.environ.get('ENTITY_CACHE_VERSION_TTL', '1'))
+ENTITY_CACHE_NEGATIVE_SIZE = 256
+ENTITY_CACHE_NEGATIVE_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -133,11 +234,17 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+STATICFILES_DIRS = [GRAPHENE_DJANGO_DIR / "static"]
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Lets browser clients echo the read-your-writes marker (huskyden.routers)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-primary-until')
+CORS_EXPOSE_HEADERS = ['X-Primary-Until']
+
 # Allow all origins in development if DEBUG is True
 if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
@@ -148,6 +255,42 @@ GRAPHENE = {
     "MIDDLEWARE": [],
 }
 
+# Serialize GraphQL responses with orjson when it is installed
+GRAPHQL_FAST_JSON = os.environ.get('GRAPHQL_FAST_JSON', 'True') == 'True'
+
+# Compress GraphQL responses larger than this many bytes (gzip, or brotli
+# when the ``brotli`` package is installed)
+GRAPHQL_COMPRESSION_MIN_BYTES = int(os.environ.get('GRAPHQL_COMPRESSION_MIN_BYTES', 1024))
+GRAPHQL_GZIP_LEVEL = 6
+GRAPHQL_BROTLI_QUALITY = 5
+
+# Automatic persisted queries (huskyden.http_cache): registrations are kept
+# this many seconds in the shared cache and in a per-process LRU of
+# PERSISTED_QUERY_LOCAL_SIZE. Larger documents, or ones that do not validate,
+# are executed but not stored.
+PERSISTED_QUERY_TIMEOUT = int(os.environ.get('PERSISTED_QUERY_TIMEOUT', 86400))
+PERSISTED_QUERY_LOCAL_SIZE = 1000
+PERSISTED_QUERY_MAX_BYTES = 16384
+
+# Maximum number of reviews accepted by one createReviews mutation
+REVIEW_BATCH_MAX = int(os.environ.get('REVIEW_BATCH_MAX', 100))
+
+# Review ingest: 'sync' writes reviews in the request, 'async' queues them for
+# the process_review_queue worker. Past REVIEW_QUEUE_MAX_DEPTH pending
+# submissions, or when the worker has not reported for
+# REVIEW_QUEUE_STATS_MAX_AGE seconds, requests fall back to writing
+# synchronously.
+REVIEW_INGEST_MODE = os.environ.get('REVIEW_INGEST_MODE', 'sync')
+REVIEW_QUEUE_MAX_DEPTH = int(os.environ.get('REVIEW_QUEUE_MAX_DEPTH', 10000))
+REVIEW_QUEUE_STATS_MAX_AGE = int(os.environ.get('REVIEW_QUEUE_STATS_MAX_AGE', 30))
+REVIEW_QUEUE_MAX_ATTEMPTS = 5
+
+# Bearer token accepted by /export/ in addition to staff sessions
+EXPORT_API_TOKEN = os.environ.get('EXPORT_API_TOKEN', '')
+
+# Bearer token accepted by /metrics/ in addition to staff sessions
+METRICS_API_TOKEN = os.environ.get('METRICS_API_TOKEN', '')
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -168,3 +311,115 @@ LOGGING = {
         },
     },
 }
+
+# Where build_catalog_snapshot writes the static catalog (serve it from a CDN
+# or copy it into frontend/public)
+CATALOG_SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR', str(BASE_DIR / 'catalog-snapshot'))
+
+# Live review events (reviews.events). LocalBroker only reaches subscribers
+# in the writing process, which is enough for a single runserver process.
+# Deployments write reviews in the web process and stream them from the
+# Procfile's events process (and the queue worker), so they relay through
+# the shared cache with CacheBroker.
+REVIEW_EVENTS_BACKEND = os.environ.get(
+    'REVIEW_EVENTS_BACKEND',
+    'reviews.events.LocalBroker' if DEBUG and WEB_CONCURRENCY == 1 and REVIEW_INGEST_MODE != 'async'
+    else 'reviews.events.CacheBroker',
+)
+REVIEW_EVENTS_POLL_INTERVAL = float(os.environ.get('REVIEW_EVENTS_POLL_INTERVAL', '1.0'))
+REVIEW_EVENTS_KEEPALIVE_SECONDS = 15
+# Streams on WSGI workers hold a thread, so they end (and the browser
+# reconnects) after this long, and each worker serves at most half its
+# threads' worth; the rest stay free for GraphQL. Streams past the limit get
+# a 503 asking the browser to retry later. ASGI streams hold no thread.
+REVIEW_EVENTS_MAX_STREAM_SECONDS = int(os.environ.get('REVIEW_EVENTS_MAX_STREAM_SECONDS', '300'))
+REVIEW_EVENTS_MAX_STREAMS = int(os.environ.get(
+    'REVIEW_EVENTS_MAX_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2),
+))
+REVIEW_EVENTS_MAX_ASYNC_STREAMS = int(os.environ.get('REVIEW_EVENTS_MAX_ASYNC_STREAMS', '1000'))
+REVIEW_EVENTS_BUSY_RETRY_SECONDS = 30
+
+# GraphQL rate limiting (huskyden.ratelimit). Budgets are (tokens per second,
+# burst). Queries cost the estimated number of objects they return (the search
+# page's three queries cost about 400), mutations one token per mutation
+# field or per review of a createReviews batch. The mutation burst defaults to
+# REVIEW_BATCH_MAX so a full batch fits; requests with more writes than the
+# burst are refused with 400.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMITS = {
+    'query': (
+        float(os.environ.get('RATE_LIMIT_QUERY_RATE', '200')),
+        int(os.environ.get('RATE_LIMIT_QUERY_BURST', '4000')),
+    ),
+    'mutation': (
+        float(os.environ.get('RATE_LIMIT_MUTATION_RATE', '0.2')),
+        int(os.environ.get('RATE_LIMIT_MUTATION_BURST', REVIEW_BATCH_MAX)),
+    ),
+}
+# Clients presenting one of these keys are limited per key instead of per IP
+RATE_LIMIT_API_KEYS = {key for key in os.environ.get('RATE_LIMIT_API_KEYS', '').split(',') if key}
+# Proxies in front of the app that append to X-Forwarded-For. Unset means 1
+# when RAILWAY_ENVIRONMENT is set (Railway's edge proxy) and 0 elsewhere.
+RATE_LIMIT_PROXY_COUNT = (
+    int(os.environ['RATE_LIMIT_PROXY_COUNT']) if os.environ.get('RATE_LIMIT_PROXY_COUNT') else None
+)
+RATE_LIMIT_LIST_SIZE = 10
+RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL', '1.0'))
+RATE_LIMIT_CACHE_ALIAS = 'entities'
+
+# Admin changelists past this many rows show an estimated total (table
+# statistics or the query planner) instead of running COUNT(*)
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+
+# Near-duplicate comments (reviews.duplicates): submissions whose comment is
+# at least this similar (estimated Jaccard over 5-character shingles) to a
+# stored review are rejected. Shorter comments are never compared.
+REVIEW_DUPLICATE_CHECK = os.environ.get('REVIEW_DUPLICATE_CHECK', 'True') == 'True'
+REVIEW_DUPLICATE_THRESHOLD = float(os.environ.get('REVIEW_DUPLICATE_THRESHOLD', '0.7'))
+REVIEW_DUPLICATE_MIN_CHARS = 30
+
+# Similar courses (reviews.similarity, build_course_similarity): neighbours
+# stored per course, the weight of the rating profile against text
+# similarity, and the lowest score worth showing
+COURSE_SIMILARITY_TOP_K = 10
+COURSE_SIMILARITY_PROFILE_WEIGHT = 0.25
+COURSE_SIMILARITY_MIN_SCORE = 0.05
+
+# Batched GraphQL POSTs (a JSON array of operations). The whole batch is
+# charged to the rate limiter at once and rejected past this total cost.
+# With GRAPHQL_BATCH_CONCURRENCY above 1, read-only batches served over ASGI
+# run their operations on that many threads (use with the connection pool).
+GRAPHQL_BATCH_MAX_OPERATIONS = int(os.environ.get('GRAPHQL_BATCH_MAX_OPERATIONS', '10'))
+GRAPHQL_BATCH_MAX_COST = int(os.environ.get('GRAPHQL_BATCH_MAX_COST', '4000'))
+GRAPHQL_BATCH_CONCURRENCY = int(os.environ.get('GRAPHQL_BATCH_CONCURRENCY', '1'))
+
+# Review partitions (reviews.partitions, PostgreSQL only): academic years
+# start on the first of this month (UTC). partition_reviews archives years
+# older than REVIEW_PARTITION_RETAIN_YEARS to REVIEW_ARCHIVE_DIR; None keeps
+# every year.
+REVIEW_ACADEMIC_YEAR_START_MONTH = 7
+REVIEW_PARTITION_RETAIN_YEARS = (
+    int(os.environ['REVIEW_PARTITION_RETAIN_YEARS']) if os.environ.get('REVIEW_PARTITION_RETAIN_YEARS') else None
+)
+REVIEW_ARCHIVE_DIR = Path(os.environ.get('REVIEW_ARCHIVE_DIR', BASE_DIR / 'review-archive'))
+
+# Review keyword summaries (reviews.keywords, summarize_reviews): terms kept
+# per course and professor, and the reviews that must use a term before it
+# can be one
+REVIEW_KEYWORDS_TOP_K = 10
+REVIEW_KEYWORDS_MIN_REVIEWS = 2
+
+# Request profiling (huskyden.profiling): requests with a signed X-Profile
+# header (manage.py profile_token) or a random PROFILE_SAMPLE_RATE share are
+# profiled and stored for the admin, keeping the newest PROFILE_KEEP
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.001'))
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_MAX_QUERIES = 200
+PROFILE_KEEP = 500
+
+# Page queries (reviews.pages): seconds a built coursePage or
+# professorCoursePage stays cached (writes invalidate it sooner), and the
+# largest reviewsFirst served
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', '30'))
+PAGE_REVIEWS_MAX = 100
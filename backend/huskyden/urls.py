@@ -16,25 +16,33 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
+from django.utils.module_loading import import_string
 from django.views.decorators.csrf import csrf_exempt
-import logging
-import json
-
-logger = logging.getLogger(__name__)
-
-class LoggingGraphQLView(GraphQLView):
-    def dispatch(self, request, *args, **kwargs):
-        if request.method == 'POST':
-            try:
-                body = json.loads(request.body)
-                logger.info(f"GraphQL Request - Query: {body.get('query', '')[:200]}")
-                logger.info(f"GraphQL Request - Variables: {body.get('variables', {})}")
-            except Exception as e:
-                logger.error(f"Error parsing GraphQL request: {e}")
-        return super().dispatch(request, *args, **kwargs)
+
+from reviews.views import export_data, review_events
+
+
+def lazy_view(dotted_path):
+    """
+    Import a view on its first request rather than when the URLconf loads.
+    System checks load the URLconf for every manage.py command, and the
+    GraphQL views import graphene and build the schema.
+    """
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("graphql/", csrf_exempt(LoggingGraphQLView.as_view(graphiql=True))),
+    path("graphql/", csrf_exempt(lazy_view("huskyden.views.graphql_view"))),
+    path("export/", export_data, name="export_data"),
+    path("events/reviews/", review_events, name="review_events"),
+    path("metrics/", lazy_view("huskyden.views.metrics"), name="metrics"),
 ]
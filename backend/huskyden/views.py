@@ -0,0 +1,265 @@
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from graphene_django.views import GraphQLView, HttpError
+
+from reviews import loaders
+from reviews.cache import entity_cache, shared_stats
+from reviews.events import open_streams
+
+from . import http_cache, profiling, ratelimit, routers
+from .access import staff_or_bearer_token
+from .db import pool_stats
+from .compression import compress_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_batch_executor = None
+
+
+def batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(
+            max_workers=settings.GRAPHQL_BATCH_CONCURRENCY, thread_name_prefix='graphql-batch',
+        )
+    return _batch_executor
+
+
+class LoggingGraphQLView(GraphQLView):
+    def dispatch(self, request, *args, **kwargs):
+        body = None
+        if request.method == 'POST':
+            try:
+                body = json.loads(request.body)
+                for entry in body if isinstance(body, list) else [body]:
+                    logger.info(f"GraphQL Request - Query: {entry.get('query', '')[:200]}")
+                    logger.info(f"GraphQL Request - Variables: {entry.get('variables', {})}")
+            except Exception as e:
+                logger.error(f"Error parsing GraphQL request: {e}")
+
+        with profiling.maybe_profile(request) as profile:
+            if profile is not None:
+                entries = body if isinstance(body, list) else [body if isinstance(body, dict) else request.GET]
+                profile.operation = profiling.operation_name(entries)
+            if isinstance(body, list):
+                response = self.batch_dispatch(request, body)
+            elif request.method == 'GET' and not (self.graphiql and self.request_wants_html(request)):
+                response = self.cached_get(request, *args, **kwargs)
+            else:
+                response = super().dispatch(request, *args, **kwargs)
+        if profile is not None and profile.pk:
+            response['X-Profile-Id'] = str(profile.pk)
+        if getattr(request, 'graphql_wrote', False):
+            routers.mark_sticky(response)
+        return compress_response(request, response)
+
+    def get_response(self, request, data, show_graphiql=False):
+        """Run queries against a replica and mutations against the primary."""
+        try:
+            query, variables = self.get_graphql_params(request, data)[:2]
+            policy = http_cache.operation_cache_policy(self.schema.graphql_schema, query) if query else None
+        except Exception:
+            # Invalid requests are reported by the regular execution path.
+            query, variables, policy = None, None, None
+
+        if not self.batch:
+            # Batches are charged as a whole before any operation runs.
+            self.rate_limit(request, [query], [variables])
+
+        read_only = policy is not None and policy.read_only
+        with routers.use_replica(read_only and not routers.is_sticky(request), request):
+            result, status_code = super().get_response(request, data, show_graphiql)
+
+        if not read_only:
+            # Later operations of a batch must see this one's writes.
+            loaders.reset(request)
+        if policy is not None and not read_only and status_code == 200:
+            request.graphql_wrote = True
+        return result, status_code
+
+    def rate_limit(self, request, queries, variables):
+        try:
+            wait = ratelimit.check(request, self.schema.graphql_schema, *queries, variables=variables)
+        except ratelimit.QueryTooExpensive as e:
+            raise HttpError(HttpResponseBadRequest(), str(e))
+        if wait:
+            raise HttpError(ratelimit.too_many_requests(wait), f"Rate limit exceeded; retry in {wait:.1f}s")
+
+    def batch_dispatch(self, request, entries):
+        """
+        Run a JSON array of operations from one POST and answer with an array
+        of results (with the entries' ``id`` and ``status``). Operations
+        share the request as context, so they share its loaders. Read-only
+        batches under ASGI run concurrently when GRAPHQL_BATCH_CONCURRENCY
+        is above 1.
+        """
+        self.batch = True
+        try:
+            max_operations = settings.GRAPHQL_BATCH_MAX_OPERATIONS
+            if not entries or len(entries) > max_operations:
+                raise HttpError(HttpResponseBadRequest(), f"A batch must hold 1 to {max_operations} operations")
+            if not all(isinstance(entry, dict) for entry in entries):
+                raise HttpError(HttpResponseBadRequest(), "Every operation in a batch must be a JSON object")
+
+            params = [self.get_graphql_params(request, entry)[:2] for entry in entries]
+            queries = [query for query, _ in params]
+            variables = [entry_variables for _, entry_variables in params]
+            cost, _ = ratelimit.total_cost(self.schema.graphql_schema, queries, variables)
+            if cost > settings.GRAPHQL_BATCH_MAX_COST:
+                raise HttpError(
+                    HttpResponseBadRequest(),
+                    f"Batch cost {cost} exceeds the limit of {settings.GRAPHQL_BATCH_MAX_COST}; split the batch",
+                )
+            self.rate_limit(request, queries, variables)
+
+            if self.run_concurrently(request, queries):
+                context = contextvars.copy_context()
+
+                def run(entry):
+                    # Pool threads keep their connections between batches.
+                    close_old_connections()
+                    return context.copy().run(self.get_response, request, entry)
+                responses = list(batch_executor().map(run, entries))
+            else:
+                responses = [self.get_response(request, entry) for entry in entries]
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+        results = [result if isinstance(result, bytes) else result.encode('utf-8') for result, _ in responses]
+        status_code = max(status for _, status in responses)
+        return HttpResponse(b'[' + b','.join(results) + b']', status=status_code, content_type='application/json')
+
+    def run_concurrently(self, request, queries):
+        if settings.GRAPHQL_BATCH_CONCURRENCY <= 1 or len(queries) < 2:
+            return False
+        if not isinstance(request, ASGIRequest):
+            return False
+        for query in queries:
+            try:
+                policy = http_cache.operation_cache_policy(self.schema.graphql_schema, query)
+            except Exception:
+                return False
+            if not policy.read_only:
+                return False
+        return True
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        if query and not variables:
+            try:
+                policy = http_cache.operation_cache_policy(self.schema.graphql_schema, query)
+            except Exception:
+                policy = None
+            if policy is not None and policy.introspection:
+                return http_cache.introspection_result(
+                    self.schema.graphql_schema, query, operation_name
+                )
+        return super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+    def cached_get(self, request, *args, **kwargs):
+        """Serve a read-only GET query with ETag and Cache-Control headers."""
+        try:
+            query, variables, operation_name, _ = self.get_graphql_params(request, {})
+        except HttpError:
+            # The regular dispatch formats the error response.
+            return super().dispatch(request, *args, **kwargs)
+
+        if not query:
+            return super().dispatch(request, *args, **kwargs)
+
+        try:
+            policy = http_cache.operation_cache_policy(self.schema.graphql_schema, query)
+        except Exception:
+            # Let the regular execution path report syntax errors.
+            return super().dispatch(request, *args, **kwargs)
+        if not policy.read_only:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = http_cache.compute_etag(query, operation_name, variables, policy)
+        matched = http_cache.matching_etag(request, etag)
+        if matched:
+            response = HttpResponseNotModified()
+            response['ETag'] = matched
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # The versions in the tag may count writes a lagging replica has
+            # not replayed; tagging its body would pin it until the next write.
+            if not routers.read_from_replica(request):
+                response['ETag'] = etag
+
+        response['Cache-Control'] = policy.header
+        return response
+
+    def json_encode(self, request, d, pretty=False):
+        if orjson is None or pretty or self.pretty or request.GET.get('pretty'):
+            return super().json_encode(request, d, pretty=pretty)
+        if not getattr(settings, 'GRAPHQL_FAST_JSON', True):
+            return super().json_encode(request, d, pretty=pretty)
+        return orjson.dumps(d)
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        sha256_hash = http_cache.persisted_query_hash(
+            request.GET.get('extensions') or data.get('extensions')
+        )
+        if sha256_hash:
+            try:
+                if query:
+                    try:
+                        http_cache.register_persisted_query(query, sha256_hash, self.schema.graphql_schema)
+                    except http_cache.PersistedQueryRejected:
+                        # Still executed (and its errors reported), just not stored.
+                        pass
+                else:
+                    query = http_cache.lookup_persisted_query(sha256_hash)
+            except http_cache.PersistedQueryNotFound:
+                # Apollo clients retry with the full query on this message.
+                raise HttpError(HttpResponse(status=200), 'PersistedQueryNotFound')
+            except http_cache.PersistedQueryMismatch as e:
+                raise HttpError(HttpResponseBadRequest(), str(e))
+
+        return query, variables, operation_name, id
+
+
+graphql_view = csrf_exempt(LoggingGraphQLView.as_view(graphiql=True))
+
+
+@require_GET
+def metrics(request):
+    """Runtime metrics of the worker that serves the request, as JSON."""
+    if not staff_or_bearer_token(request, settings.METRICS_API_TOKEN):
+        return HttpResponseForbidden("Metrics require staff access or an API token")
+    return JsonResponse({
+        'db_pools': pool_stats(),
+        'entity_cache': {'worker': entity_cache.stats(), 'all_workers': shared_stats()},
+        'event_streams': open_streams(),
+    })
@@ -0,0 +1,65 @@
+"""
+Startup warm-up, run once in the gunicorn master before workers fork
+(see gunicorn.conf.py). Everything built here is shared copy-on-write by
+the workers instead of being rebuilt on each worker's first request.
+"""
+import logging
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_schema():
+    from graphql import get_introspection_query, validate_schema
+
+    from . import http_cache, views  # noqa: F401 - the URLconf imports views lazily
+    from .schema import schema
+
+    # validate_schema memoizes its result on the schema object.
+    validate_schema(schema.graphql_schema)
+    http_cache.introspection_result(schema.graphql_schema, get_introspection_query())
+    return schema
+
+
+def warm_persisted_queries(schema):
+    from . import http_cache
+    from .operations import FRONTEND_OPERATIONS
+
+    for query in FRONTEND_OPERATIONS.values():
+        http_cache.register_persisted_query(query)
+        http_cache.operation_cache_policy(schema.graphql_schema, query)
+    return len(FRONTEND_OPERATIONS)
+
+
+def warm_entity_cache():
+    from reviews import cache
+
+    return cache.warm()
+
+
+def close_connections():
+    """Forked workers must not share the master's sockets or pool threads."""
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if getattr(connection, 'pool', None) is not None:
+            connection.close_pool()
+
+
+def warm_up():
+    start = time.perf_counter()
+    schema = warm_schema()
+    queries = warm_persisted_queries(schema)
+    try:
+        entities = warm_entity_cache()
+    except Exception as e:
+        # A missing or unmigrated database must not keep the server down.
+        logger.warning(f"Entity cache warm-up skipped: {e}")
+        entities = 0
+    finally:
+        close_connections()
+    logger.info(
+        f"Warm-up done in {time.perf_counter() - start:.2f}s: "
+        f"{queries} persisted queries, {entities} cached entities"
+    )
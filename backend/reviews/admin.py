@@ -1,5 +1,66 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Department, Course, Professor, Review
+from django.core.paginator import Paginator
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+
+from huskyden.db import estimated_count
+
+from .models import Department, Course, CourseAlias, Professor, Review, PendingReview, RequestProfile
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the total past ADMIN_EXACT_COUNT_LIMIT rows"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list, settings.ADMIN_EXACT_COUNT_LIMIT)
+
+
+def score_filter(field, title):
+    """
+    A 1-5 list filter for ``field``. The default filter for an integer field
+    without choices reads every distinct value with a full table scan.
+    """
+    class ScoreFilter(admin.SimpleListFilter):
+        parameter_name = field
+
+        def lookups(self, request, model_admin):
+            return [(str(score), str(score)) for score in range(1, 6)]
+
+        def queryset(self, request, queryset):
+            if self.value():
+                return queryset.filter(**{field: self.value()})
+            return queryset
+
+    ScoreFilter.title = title
+    return ScoreFilter
+
+
+def _average_ordering(field):
+    return Cast(F(f"{field}_sum"), FloatField()) / NullIf(F('review_count'), 0)
+
+
+class ReviewAggregatesAdmin(admin.ModelAdmin):
+    """Shows the stored review totals, so listing them costs no extra queries"""
+    readonly_fields = ['review_count', 'avg_rating', 'avg_workload', 'avg_difficulty']
+
+    @admin.display(description='Avg rating', ordering=_average_ordering('rating'))
+    def avg_rating(self, obj):
+        return obj.avg_rating
+
+    @admin.display(description='Avg workload', ordering=_average_ordering('workload'))
+    def avg_workload(self, obj):
+        return obj.avg_workload
+
+    @admin.display(description='Avg difficulty', ordering=_average_ordering('difficulty'))
+    def avg_difficulty(self, obj):
+        return obj.avg_difficulty
 
 
 @admin.register(Department)
@@ -8,23 +69,114 @@ class DepartmentAdmin(admin.ModelAdmin):
     search_fields = ['code', 'name']
 
 
+class CourseAliasInline(admin.TabularInline):
+    model = CourseAlias
+    fields = ['code']
+    extra = 0
+
+
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ['code', 'title', 'department', 'created_at']
+class CourseAdmin(ReviewAggregatesAdmin):
+    list_display = ['code', 'title', 'department', 'review_count', 'avg_rating', 'avg_workload', 'avg_difficulty', 'created_at']
     search_fields = ['code', 'title']
     list_filter = ['department', 'created_at']
+    list_select_related = ['department']
+    autocomplete_fields = ['department']
+    inlines = [CourseAliasInline]
 
 
 @admin.register(Professor)
-class ProfessorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'department', 'created_at']
+class ProfessorAdmin(ReviewAggregatesAdmin):
+    list_display = ['name', 'department', 'review_count', 'avg_rating', 'created_at']
     search_fields = ['name']
     list_filter = ['department', 'created_at']
+    list_select_related = ['department']
+    autocomplete_fields = ['department']
+    readonly_fields = ['review_count', 'avg_rating']
 
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['course', 'professor', 'rating', 'workload', 'difficulty', 'created_at']
-    list_filter = ['rating', 'workload', 'difficulty', 'created_at']
+    list_filter = [
+        score_filter('rating', 'rating'),
+        score_filter('workload', 'workload'),
+        score_filter('difficulty', 'difficulty'),
+        'created_at',
+    ]
     search_fields = ['course__code', 'course__title', 'professor__name', 'comment']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['course', 'professor']
+    autocomplete_fields = ['course', 'professor']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(PendingReview)
+class PendingReviewAdmin(admin.ModelAdmin):
+    list_display = ['id', 'course', 'professor', 'rating', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status']
+    list_select_related = ['course', 'professor']
+    readonly_fields = ['review', 'created_at', 'processed_at']
+    autocomplete_fields = ['course', 'professor']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """The slowest profiled requests, with their SQL and sampled stacks"""
+    list_display = ['operation', 'duration_ms', 'sql_ms', 'query_count', 'sample_count', 'trigger', 'created_at']
+    list_filter = ['trigger']
+    search_fields = ['operation']
+    ordering = ['-duration_ms']
+    fields = [
+        'operation', 'trigger', 'created_at', 'duration_ms', 'sql_ms', 'query_count', 'sample_count',
+        'download_stacks', 'sql',
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        # The changelist shows neither stacks nor queries.
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('stacks', 'queries')
+        return queryset
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/stacks/',
+                self.admin_site.admin_view(self.stacks_view),
+                name='reviews_requestprofile_stacks',
+            ),
+        ] + super().get_urls()
+
+    def stacks_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(profile.stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.collapsed.txt"'
+        return response
+
+    @admin.display(description='Stacks')
+    def download_stacks(self, obj):
+        return format_html(
+            '<a href="{}">Collapsed stacks</a> ({} samples; open in speedscope.app or flamegraph.pl)',
+            reverse('admin:reviews_requestprofile_stacks', args=[obj.pk]), obj.sample_count,
+        )
+
+    @admin.display(description='SQL')
+    def sql(self, obj):
+        queries = sorted(obj.queries, key=lambda query: -query['ms'])
+        return format_html_join(
+            '', '<pre style="white-space: pre-wrap">{} ms [{}]\n{}\n{}</pre>',
+            ((query['ms'], query['alias'], query['sql'], ', '.join(query['params'])) for query in queries),
+        )
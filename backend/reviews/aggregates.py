@@ -0,0 +1,82 @@
+"""
+Maintenance of the stored review totals on Course and Professor.
+
+``apply_reviews`` adds (or subtracts) a batch of reviews with one UPDATE per
+affected course/professor; ``recompute`` rebuilds totals from the Review
+table and is used when a review is edited or the totals need repairing.
+Both move the rows' ``updated_at``, so incremental exports pick up the new
+totals.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Course, Professor, Review
+
+TOTAL_FIELDS = ('rating', 'workload', 'difficulty')
+
+
+def _deltas(reviews, key):
+    deltas = defaultdict(lambda: dict.fromkeys(('review_count',) + TOTAL_FIELDS, 0))
+    for review in reviews:
+        owner = getattr(review, key)
+        if owner is None:
+            continue
+        delta = deltas[owner]
+        delta['review_count'] += 1
+        for field in TOTAL_FIELDS:
+            delta[field] += getattr(review, field)
+    return deltas
+
+
+def _apply(model, deltas, sign):
+    now = timezone.now()
+    for pk, delta in deltas.items():
+        model.objects.filter(pk=pk).update(
+            updated_at=now,
+            review_count=F('review_count') + sign * delta['review_count'],
+            **{
+                f"{field}_sum": F(f"{field}_sum") + sign * delta[field]
+                for field in TOTAL_FIELDS
+            },
+        )
+
+
+def apply_reviews(reviews, sign=1):
+    """Add ``reviews`` to (sign=1) or remove them from (sign=-1) the totals."""
+    _apply(Course, _deltas(reviews, 'course_id'), sign)
+    _apply(Professor, _deltas(reviews, 'professor_id'), sign)
+
+
+def _recompute(model, key, pks):
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=[pk for pk in pks if pk is not None])
+    totals = {
+        row[key]: row
+        for row in Review.objects.filter(**{f"{key}__in": queryset.values('pk')})
+        .values(key)
+        .annotate(
+            count=Count('id'),
+            **{field: Coalesce(Sum(field), 0) for field in TOTAL_FIELDS},
+        )
+    }
+    now = timezone.now()
+    for pk in queryset.values_list('pk', flat=True):
+        row = totals.get(pk, {})
+        model.objects.filter(pk=pk).update(
+            updated_at=now,
+            review_count=row.get('count', 0),
+            **{f"{field}_sum": row.get(field, 0) for field in TOTAL_FIELDS},
+        )
+
+
+def recompute(course_ids=None, professor_ids=None):
+    """
+    Rebuild totals from the Review table. ``None`` means every row; pass an
+    empty list to skip a model.
+    """
+    _recompute(Course, 'course_id', course_ids)
+    _recompute(Professor, 'professor_id', professor_ids)
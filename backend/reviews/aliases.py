@@ -0,0 +1,66 @@
+"""
+Cross-listings: several codes for one course.
+
+``cross_list`` makes each extra code an alias of the primary course. A code
+that is still a course of its own is merged into the primary first: its
+reviews, queued submissions and aliases move over and it is deleted, so
+both codes show the same reviews and aggregates. Moved reviews get a new
+``updated_at`` so ``export_data --since`` picks them up, and the next
+``summarize_reviews`` run sees the primary's changed review count and
+refreshes its keywords. Queued submissions carry no timestamp to touch.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import aggregates
+from .cache import bump_version
+from .codes import canonical_code
+from .models import Course, CourseAlias, PendingReview, Professor, Review
+
+
+class CrossListingError(Exception):
+    pass
+
+
+def cross_list(primary_code, codes):
+    """
+    Make ``codes`` aliases of the course ``primary_code``. Returns
+    ``[(code, merged review count), ...]``.
+    """
+    primary = Course.objects.filter(canonical_code=canonical_code(primary_code)).first()
+    if primary is None:
+        raise CrossListingError(f"Course {primary_code} not found")
+
+    results = []
+    now = timezone.now()
+    with transaction.atomic():
+        for code in codes:
+            canonical = canonical_code(code)
+            if not canonical:
+                raise CrossListingError(f"{code!r} is not a course code")
+            if canonical == primary.canonical_code:
+                raise CrossListingError(f"{code} is {primary.code} itself")
+
+            merged = 0
+            other = Course.objects.filter(canonical_code=canonical).first()
+            if other is not None:
+                code = other.code
+                merged = Review.objects.filter(course=other).update(course=primary, updated_at=now)
+                PendingReview.objects.filter(course=other).update(course=primary)
+                CourseAlias.objects.filter(course=other).update(course=primary)
+                other.delete()
+            CourseAlias.objects.update_or_create(
+                canonical_code=canonical, defaults={'code': code, 'course': primary},
+            )
+            results.append((code, merged))
+
+        aggregates.recompute(course_ids=[primary.pk], professor_ids=[])
+        transaction.on_commit(lambda: [bump_version(model) for model in (Review, Course, Professor, CourseAlias)])
+    return results
+
+
+def remove(code):
+    """Delete the alias ``code``; its reviews stay with the course."""
+    deleted, _ = CourseAlias.objects.filter(canonical_code=canonical_code(code)).delete()
+    if not deleted:
+        raise CrossListingError(f"{code} is not an alias")
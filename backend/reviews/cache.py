@@ -0,0 +1,278 @@
+"""
+Two-tier cache for hot entity lookups (course by code, professor by slug/id).
+
+Tier 1 is a small per-process LRU so repeated lookups inside one gunicorn
+worker never leave the process. Tier 2 is the shared ``entities`` Django
+cache (file-based by default) so a lookup made by one worker is reused by
+the others without needing Redis.
+
+Every key embeds a per-model version counter that lives in the shared tier.
+Saving or deleting a model bumps its version (see ``reviews.signals``), which
+makes every previously cached key for that model unreachable in all workers.
+Each worker re-reads a version at most every ``ENTITY_CACHE_VERSION_TTL``
+seconds (its own bumps apply at once), so other workers may serve the old
+entry for that long. Counters start from the current time in milliseconds:
+a counter culled from the shared tier comes back higher than before rather
+than at a value whose entries may still be cached.
+
+Lookups of codes that do not exist are remembered per process only, in a
+separate small LRU for ``ENTITY_CACHE_NEGATIVE_TTL`` seconds, so probing
+random codes cannot push real entries out of either tier.
+
+Courses are cached by canonical code (``reviews.codes``). ``get_course``
+first maps a cross-listed code to its course through ``course_aliases``, an
+in-process copy of the alias table reloaded when its version changes, so
+any spelling of any code costs at most one indexed query.
+"""
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .codes import canonical_code
+from .models import Course, CourseAlias, Professor
+
+MISSING = object()
+STATS_KEY = 'entity-cache-stats'
+STATS_FLUSH_EVERY = 100
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'ENTITY_CACHE_ALIAS', 'entities')]
+
+
+def version_key(model):
+    return f"entity-version:{model._meta.label_lower}"
+
+
+# {version key: (version, monotonic time read)}
+_versions = {}
+
+
+def _initial_version(key):
+    """A fresh counter: now in milliseconds, past any version this process saw."""
+    seen = _versions.get(key, (0, 0))[0]
+    return max(int(time.time() * 1000), seen + 1)
+
+
+def get_version(model):
+    """Return the current shared version counter for a model."""
+    key = version_key(model)
+    now = time.monotonic()
+    memo = _versions.get(key)
+    if memo is not None and now - memo[1] < settings.ENTITY_CACHE_VERSION_TTL:
+        return memo[0]
+    cache = _shared_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(key), timeout=None)
+        version = cache.get(key) or _initial_version(key)
+    _versions[key] = (version, now)
+    return version
+
+
+def bump_version(model):
+    """Invalidate every cached entry for a model across all workers."""
+    cache = _shared_cache()
+    key = version_key(model)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = _initial_version(key)
+        cache.set(key, version, timeout=None)
+    _versions[key] = (version, time.monotonic())
+    return version
+
+
+def forget_versions():
+    """Re-read every version from the shared tier on next use."""
+    _versions.clear()
+
+
+class EntityCache:
+    """Per-process LRU in front of the shared Django cache."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, 'ENTITY_CACHE_LOCAL_SIZE', 512)
+        self._local = OrderedDict()
+        # {key: monotonic expiry} of lookups that found nothing
+        self._negative = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._unflushed = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def _record(self, counter):
+        setattr(self, counter, getattr(self, counter) + 1)
+        self._unflushed[counter] += 1
+        if sum(self._unflushed.values()) >= STATS_FLUSH_EVERY:
+            self.flush_stats()
+
+    def _key(self, model, field, value, version):
+        return f"entity:{model._meta.label_lower}:{field}:{quote(str(value))}:v{version}"
+
+    def _local_get(self, key):
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                return self._local[key]
+        return MISSING
+
+    def _local_set(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _negative_get(self, key):
+        with self._lock:
+            expires = self._negative.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._negative[key]
+                return False
+            return True
+
+    def _negative_set(self, key):
+        with self._lock:
+            self._negative[key] = time.monotonic() + settings.ENTITY_CACHE_NEGATIVE_TTL
+            self._negative.move_to_end(key)
+            while len(self._negative) > settings.ENTITY_CACHE_NEGATIVE_SIZE:
+                self._negative.popitem(last=False)
+
+    def get(self, model, field, value):
+        """
+        Return the instance of ``model`` whose ``field`` equals ``value``, or
+        None if it does not exist. Negative results are cached per process
+        for a short time.
+        """
+        key = self._key(model, field, value, get_version(model))
+
+        obj = self._local_get(key)
+        if obj is not MISSING:
+            self._record('local_hits')
+            return obj
+        if self._negative_get(key):
+            self._record('local_hits')
+            return None
+
+        shared = _shared_cache()
+        obj = shared.get(key, MISSING)
+        if obj is not MISSING:
+            self._record('shared_hits')
+            self._local_set(key, obj)
+            return obj
+
+        self._record('misses')
+        # Always read misses from the primary: a lagging replica would
+        # otherwise cache stale rows under the freshly bumped version.
+        obj = (
+            model.objects.using(DEFAULT_DB_ALIAS)
+            .select_related('department')
+            .filter(**{field: value})
+            .first()
+        )
+        self.set(model, field, value, obj)
+        return obj
+
+    def set(self, model, field, value, obj):
+        key = self._key(model, field, value, get_version(model))
+        if obj is None:
+            self._negative_set(key)
+            return
+        _shared_cache().set(key, obj)
+        self._local_set(key, obj)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+            self._negative.clear()
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        hits = self.local_hits + self.shared_hits
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'lookups': lookups,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'local_size': len(self._local),
+        }
+
+    def reset_stats(self):
+        self.local_hits = self.shared_hits = self.misses = 0
+        self._unflushed = dict.fromkeys(self._unflushed, 0)
+
+    def flush_stats(self):
+        """Add this process's unreported counters to the shared totals."""
+        pending, self._unflushed = self._unflushed, dict.fromkeys(self._unflushed, 0)
+        cache = _shared_cache()
+        totals = cache.get(STATS_KEY) or dict.fromkeys(pending, 0)
+        for counter, value in pending.items():
+            totals[counter] = totals.get(counter, 0) + value
+        cache.set(STATS_KEY, totals, timeout=None)
+
+
+def shared_stats():
+    """Hit/miss totals reported by every worker sharing the cache."""
+    totals = _shared_cache().get(STATS_KEY) or {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+    lookups = sum(totals.values())
+    hits = totals['local_hits'] + totals['shared_hits']
+    return dict(totals, lookups=lookups, hit_rate=round(hits / lookups, 4) if lookups else None)
+
+
+entity_cache = EntityCache()
+
+_aliases = (None, {})
+_aliases_lock = threading.Lock()
+
+
+def course_aliases():
+    """``{alias canonical code: course canonical code}``, cached per process."""
+    global _aliases
+    version = get_version(CourseAlias)
+    loaded_version, aliases = _aliases
+    if loaded_version != version:
+        with _aliases_lock:
+            aliases = dict(
+                CourseAlias.objects.using(DEFAULT_DB_ALIAS)
+                .values_list('canonical_code', 'course__canonical_code')
+            )
+            _aliases = (version, aliases)
+    return aliases
+
+
+def get_course(code):
+    """The course with ``code`` in any spelling, or reached through an alias."""
+    canonical = canonical_code(code)
+    canonical = course_aliases().get(canonical, canonical)
+    return entity_cache.get(Course, 'canonical_code', canonical)
+
+
+def get_professor(id=None, slug=None):
+    if slug:
+        return entity_cache.get(Professor, 'slug', slug)
+    if id:
+        return entity_cache.get(Professor, 'id', int(id))
+    return None
+
+
+def warm():
+    """Load every course and professor into both cache tiers."""
+    count = 0
+    for course in Course.objects.select_related('department').iterator():
+        entity_cache.set(Course, 'canonical_code', course.canonical_code, course)
+        count += 1
+    for professor in Professor.objects.select_related('department').iterator():
+        entity_cache.set(Professor, 'slug', professor.slug, professor)
+        entity_cache.set(Professor, 'id', professor.id, professor)
+        count += 1
+    return count
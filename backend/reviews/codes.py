@@ -0,0 +1,16 @@
+"""
+Course code normalization.
+
+Codes are written "STAT 220" in the catalog but "stat220", "STAT-220" or
+"stat 220" in URLs and by users. ``canonical_code`` maps all of them to
+"STAT220", which is stored in ``Course.canonical_code`` (unique) and
+``CourseAlias.canonical_code`` and is what lookups match on.
+"""
+import re
+
+_SEPARATORS = re.compile(r'[^0-9A-Z]+')
+
+
+def canonical_code(code):
+    """Upper-case ``code`` without spaces, dashes or other separators."""
+    return _SEPARATORS.sub('', (code or '').upper())
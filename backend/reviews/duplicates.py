@@ -0,0 +1,265 @@
+"""
+Near-duplicate detection for review comments.
+
+Every comment gets a MinHash signature of its character 5-grams, stored in
+``Review.comment_signature``. The fraction of positions two signatures
+agree on estimates the Jaccard similarity of their comments. Signatures
+use one-permutation hashing (one hash per shingle, binned into ``BINS``
+minimums), so signing a comment is a single pass over it.
+
+For lookups the signature is cut into ``BANDS`` bands of ``ROWS`` values;
+each band is hashed to a key stored in ``CommentBucket``. Two comments that
+share any key are candidates, so checking a new comment is one indexed
+query for its keys instead of a scan of every comment. With 16 bands of 4,
+pairs at 0.7 similarity collide with probability 0.99 and pairs at 0.3 with
+about 0.12.
+
+Comments shorter than ``REVIEW_DUPLICATE_MIN_CHARS`` (after normalizing)
+get an empty signature: short praise like "great class" is repeated
+honestly all the time.
+"""
+import hashlib
+import re
+import struct
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+
+from .models import CommentBucket, Review
+
+SHINGLE_SIZE = 5
+BINS = 64
+BANDS = 16
+ROWS = BINS // BANDS
+# Candidates read per lookup; a pasted comment fills every bucket it hits
+MAX_CANDIDATES = 50
+
+_BIN_BITS = 6
+_VALUE_BITS = 32 - _BIN_BITS
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_EMPTY = 1 << 32
+_MIX = 0x9E3779B1
+_PACKING = struct.Struct(f"<{BINS}I")
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def signature(text):
+    """The packed MinHash signature of ``text``; b'' if it is too short."""
+    data = normalize(text).encode('utf-8')
+    if len(data) < getattr(settings, 'REVIEW_DUPLICATE_MIN_CHARS', 30):
+        return b''
+
+    minimums = [_EMPTY] * BINS
+    for start in range(len(data) - SHINGLE_SIZE + 1):
+        mixed = (zlib.crc32(data[start:start + SHINGLE_SIZE]) * _MIX) & 0xFFFFFFFF
+        position, value = mixed >> _VALUE_BITS, mixed & _VALUE_MASK
+        if value < minimums[position]:
+            minimums[position] = value
+
+    # Densify: an empty bin borrows the next filled bin's value, offset by
+    # the distance so that borrowed values stay distinguishable.
+    values = list(minimums)
+    for position, value in enumerate(minimums):
+        if value != _EMPTY:
+            continue
+        for distance in range(1, BINS):
+            borrowed = minimums[(position + distance) % BINS]
+            if borrowed != _EMPTY:
+                values[position] = borrowed + (distance << _VALUE_BITS)
+                break
+    return _PACKING.pack(*values)
+
+
+def band_keys(packed):
+    """The LSH bucket keys of a packed signature."""
+    if not packed:
+        return []
+    band_bytes = ROWS * 4
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(
+            packed[band * band_bytes:(band + 1) * band_bytes], digest_size=8, person=bytes([band]),
+        ).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    # Imported on first use: signals load this module in every process, and
+    # manage.py commands should not pay for NumPy.
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    return numpy
+
+
+def similarities(packed, others):
+    """Estimated Jaccard similarity of ``packed`` to each signature in ``others``."""
+    if not packed or not others:
+        return [0.0] * len(others)
+    numpy = _numpy()
+    if numpy is not None:
+        anchor = numpy.frombuffer(packed, dtype='<u4')
+        matrix = numpy.frombuffer(b''.join(other or bytes(_PACKING.size) for other in others), dtype='<u4')
+        scores = (matrix.reshape(-1, BINS) == anchor).mean(axis=1)
+        return [float(score) if other else 0.0 for score, other in zip(scores, others)]
+    anchor = _PACKING.unpack(packed)
+    return [
+        sum(a == b for a, b in zip(anchor, _PACKING.unpack(other))) / BINS if other else 0.0
+        for other in others
+    ]
+
+
+def sign(review):
+    """Set ``review.comment_signature`` from its comment."""
+    review.comment_signature = signature(review.comment)
+    return review.comment_signature
+
+
+def index_reviews(reviews, replace=False):
+    """Store the bucket keys of saved reviews; ``replace`` drops old keys first."""
+    if replace:
+        CommentBucket.objects.filter(review__in=[review.pk for review in reviews]).delete()
+    CommentBucket.objects.bulk_create([
+        CommentBucket(key=key, review_id=review.pk)
+        for review in reviews
+        for key in band_keys(review.comment_signature)
+    ])
+
+
+@lru_cache(maxsize=None)
+def _candidates_sql(alias):
+    # Compiled once per database: building this query with the ORM takes
+    # about ten times longer than running it. The reviews sharing the most
+    # bands are the likeliest duplicates, so they are kept when more than
+    # MAX_CANDIDATES match; ties go to the newest.
+    closest = (
+        CommentBucket.objects.using(alias)
+        .filter(key__in=range(BANDS))
+        .values('review')
+        .annotate(bands=Count('pk'))
+        .order_by('-bands', '-review')
+        .values('review')[:MAX_CANDIDATES]
+    )
+    queryset = (
+        Review.objects.using(alias)
+        .filter(pk__in=closest)
+        .order_by()
+        .values_list('pk', 'comment_signature')
+    )
+    return queryset.query.get_compiler(alias).as_sql()[0]
+
+
+def find_duplicate(packed, threshold=None):
+    """
+    ``(review_id, similarity)`` of the most similar stored comment at or
+    above ``threshold``, or None.
+    """
+    keys = band_keys(packed)
+    if not keys:
+        return None
+    threshold = threshold if threshold is not None else settings.REVIEW_DUPLICATE_THRESHOLD
+    alias = router.db_for_read(Review)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(_candidates_sql(alias), keys)
+        candidates = cursor.fetchall()
+    if not candidates:
+        return None
+    scores = similarities(packed, [bytes(signature) for _, signature in candidates])
+    score, review_id = max(zip(scores, (pk for pk, _ in candidates)))
+    return (review_id, score) if score >= threshold else None
+
+
+def backfill(batch_size=1000, reindex=False):
+    """
+    Sign and index reviews that have no signature yet (every review with
+    ``reindex``), ``batch_size`` at a time. Returns the number signed.
+    """
+    queryset = Review.objects.order_by('pk').only('pk', 'comment')
+    if not reindex:
+        queryset = queryset.filter(comment_signature__isnull=True)
+    signed, last_pk = 0, 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return signed
+        for review in batch:
+            sign(review)
+        with transaction.atomic():
+            # bulk_update leaves updated_at alone, so snapshots stay valid.
+            Review.objects.bulk_update(batch, ['comment_signature'])
+            index_reviews(batch, replace=True)
+        signed += len(batch)
+        last_pk = batch[-1].pk
+
+
+def _bucket_groups(batch_size):
+    """Review ids of every bucket key shared by more than one review."""
+    key, members = None, []
+    rows = CommentBucket.objects.order_by('key', 'review').values_list('key', 'review')
+    for bucket_key, review_id in rows.iterator(chunk_size=batch_size):
+        if bucket_key != key:
+            if len(members) > 1:
+                yield members
+            key, members = bucket_key, []
+        members.append(review_id)
+    if len(members) > 1:
+        yield members
+
+
+def find_clusters(threshold=None, batch_size=1000):
+    """
+    Groups of near-duplicate reviews in the whole corpus, largest first,
+    each as sorted review ids. Streams the bucket table in key order and
+    compares each shared bucket's reviews with its first one, about
+    ``batch_size`` signatures per comparison.
+    """
+    threshold = threshold if threshold is not None else settings.REVIEW_DUPLICATE_THRESHOLD
+    parent = {}
+
+    def find(pk):
+        parent.setdefault(pk, pk)
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    def compare(groups):
+        ids = {pk for group in groups for pk in group}
+        signatures = {
+            pk: bytes(packed)
+            for pk, packed in Review.objects.filter(pk__in=ids).values_list('pk', 'comment_signature')
+        }
+        for anchor, *others in groups:
+            others = [pk for pk in others if pk in signatures]
+            if anchor not in signatures or not others:
+                continue
+            scores = similarities(signatures[anchor], [signatures[pk] for pk in others])
+            for pk, score in zip(others, scores):
+                if score >= threshold:
+                    parent[find(pk)] = find(anchor)
+
+    pending, size = [], 0
+    for group in _bucket_groups(batch_size):
+        pending.append(group)
+        size += len(group)
+        if size >= batch_size:
+            compare(pending)
+            pending, size = [], 0
+    if pending:
+        compare(pending)
+
+    clusters = defaultdict(list)
+    for pk in list(parent):
+        clusters[find(pk)].append(pk)
+    return sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1), key=len, reverse=True)
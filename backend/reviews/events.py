@@ -0,0 +1,385 @@
+"""
+Live review events for open course and professor pages.
+
+Every committed review is published as a ``reviewAdded`` event on the
+channels ``course:<canonical code>`` and ``professor:<slug>``. The event carries the
+new review and the owners' updated averages, so a page can patch itself
+instead of re-fetching its whole GraphQL document. Pages listen through
+server-sent events at ``/events/reviews/`` (see reviews.views).
+
+Fan-out goes through a broker chosen by ``REVIEW_EVENTS_BACKEND``:
+
+* ``LocalBroker`` delivers within the process that wrote the review.
+  Enough for ``runserver``; the default only there (DEBUG).
+* ``CacheBroker`` also appends events to a short log in the shared cache
+  that every process polls once per ``REVIEW_EVENTS_POLL_INTERVAL``, so
+  reviews written by another worker, the web process or
+  ``process_review_queue`` reach subscribers of the events process. The
+  default everywhere else. Sequence numbers
+  come from the cache's ``incr``, which is atomic on Redis and Memcached;
+  on the file-based cache it runs under a lock file.
+
+Any class with ``subscribe``/``unsubscribe``/``publish``/``has_subscribers``
+can be plugged in the same way, e.g. one backed by Redis pub/sub.
+
+Each process serves at most ``REVIEW_EVENTS_MAX_STREAMS`` streams on WSGI
+threads (``REVIEW_EVENTS_MAX_ASYNC_STREAMS`` under ASGI); ``stream_slot()``
+hands out the places.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .codes import canonical_code
+from .models import Course, Professor
+
+logger = logging.getLogger(__name__)
+
+EVENT_NAME = 'reviewAdded'
+
+
+def course_channel(code):
+    return f"course:{canonical_code(code)}"
+
+
+def professor_channel(slug):
+    return f"professor:{slug}"
+
+
+class Subscription:
+    """One listener's bounded inbox; slow consumers drop events."""
+
+    def __init__(self, channels, loop=None, max_size=100):
+        self.channels = tuple(channels)
+        self._loop = loop
+        if loop is not None:
+            self._queue = asyncio.Queue(max_size)
+        else:
+            self._queue = queue.Queue(max_size)
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except (queue.Full, asyncio.QueueFull):
+            pass
+
+    def deliver(self, message):
+        """Called by the broker from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._put, message)
+        else:
+            self._put(message)
+
+    def get(self, timeout):
+        """Next message, or None after ``timeout`` seconds (blocking)."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        """Next message, or None after ``timeout`` seconds (async)."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process fan-out."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, loop=None):
+        subscription = Subscription(channels, loop=loop)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                listeners = self._subscribers.get(channel)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self._subscribers[channel]
+
+    def has_subscribers(self, channel):
+        return channel in self._subscribers
+
+    def publish(self, channel, message):
+        with self._lock:
+            listeners = list(self._subscribers.get(channel, ()))
+        for subscription in listeners:
+            subscription.deliver(message)
+        return len(listeners)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channels': len(self._subscribers),
+                'subscriptions': len({s for listeners in self._subscribers.values() for s in listeners}),
+            }
+
+
+class CacheBroker(LocalBroker):
+    """LocalBroker plus a shared event log that every process polls."""
+
+    SEQUENCE_KEY = 'review-events:seq'
+    EVENT_PREFIX = 'review-events:'
+
+    def __init__(self):
+        super().__init__()
+        self._cache = caches[getattr(settings, 'ENTITY_CACHE_ALIAS', 'entities')]
+        self._interval = getattr(settings, 'REVIEW_EVENTS_POLL_INTERVAL', 1.0)
+        self._poller = None
+        self._seen = None
+        self._waiting = None
+
+    def has_subscribers(self, channel):
+        # Listeners in other processes are unknown here.
+        return True
+
+    def _next_sequence(self):
+        if not isinstance(self._cache, FileBasedCache):
+            self._cache.add(self.SEQUENCE_KEY, 0, timeout=None)
+            return self._cache.incr(self.SEQUENCE_KEY)
+        # FileBasedCache.incr reads and rewrites a file; without the lock two
+        # processes can take the same number and one event is lost.
+        with open(os.path.join(self._cache._dir, 'review-events.lock'), 'a') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                self._cache.add(self.SEQUENCE_KEY, 0, timeout=None)
+                return self._cache.incr(self.SEQUENCE_KEY)
+            finally:
+                locks.unlock(lock_file)
+
+    def publish(self, channel, message):
+        sequence = self._next_sequence()
+        self._cache.set(f"{self.EVENT_PREFIX}{sequence}", (channel, message), timeout=max(60, self._interval * 10))
+        # Local subscribers get the event from the poller like everyone else,
+        # so it is delivered exactly once per process.
+        return 0
+
+    def subscribe(self, channels, loop=None):
+        self._start_poller()
+        return super().subscribe(channels, loop=loop)
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is not None and self._poller.is_alive():
+                return
+            self._seen = self._cache.get(self.SEQUENCE_KEY, 0)
+            self._poller = threading.Thread(target=self._poll, name='review-events-poller', daemon=True)
+            self._poller.start()
+
+    def poll(self):
+        """Deliver the events logged since the last poll to local subscribers."""
+        latest = self._cache.get(self.SEQUENCE_KEY, 0)
+        if latest < self._seen:
+            # The cache was cleared; start over from its counter.
+            self._seen = latest
+        keys = {n: f"{self.EVENT_PREFIX}{n}" for n in range(self._seen + 1, latest + 1)}
+        events = self._cache.get_many(keys.values()) if keys else {}
+        for n, key in keys.items():
+            if key in events:
+                LocalBroker.publish(self, *events[key])
+            elif self._waiting != n:
+                # The publisher took the number but has not written the
+                # event yet; give it one more interval before skipping it.
+                self._waiting = n
+                return
+            self._seen = n
+
+    def _poll(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Review event poll failed")
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'REVIEW_EVENTS_BACKEND', 'reviews.events.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def _review_payload(review, course, professor):
+    from graphql_relay import to_global_id
+
+    payload = {
+        'review': {
+            'id': to_global_id('ReviewType', review.pk),
+            'rating': review.rating,
+            'workload': review.workload,
+            'difficulty': review.difficulty,
+            'comment': review.comment,
+            'createdAt': review.created_at.isoformat() if review.created_at else None,
+            'course': {'code': course.code, 'title': course.title},
+            'professor': (
+                {'id': to_global_id('ProfessorType', professor.pk), 'name': professor.name, 'slug': professor.slug}
+                if professor else None
+            ),
+        },
+        'course': {
+            'code': course.code,
+            'reviewCount': course.review_count,
+            'avgRating': course.avg_rating,
+            'avgWorkload': course.avg_workload,
+            'avgDifficulty': course.avg_difficulty,
+        },
+        'professor': (
+            {'slug': professor.slug, 'reviewCount': professor.review_count, 'avgRating': professor.avg_rating}
+            if professor else None
+        ),
+    }
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def publish_reviews(reviews):
+    """Publish ``reviewAdded`` for committed reviews, with fresh aggregates."""
+    broker = get_broker()
+    reviews = [review for review in reviews if review.pk is not None]
+    if not reviews:
+        return 0
+
+    aggregate_fields = ('review_count', 'rating_sum', 'workload_sum', 'difficulty_sum')
+    courses = Course.objects.only('code', 'title', *aggregate_fields).in_bulk(
+        {review.course_id for review in reviews}
+    )
+    professor_ids = {review.professor_id for review in reviews if review.professor_id}
+    professors = Professor.objects.only('name', 'slug', *aggregate_fields).in_bulk(professor_ids)
+
+    published = 0
+    for review in reviews:
+        course = courses.get(review.course_id)
+        professor = professors.get(review.professor_id)
+        if course is None:
+            continue
+        channels = [course_channel(course.code)]
+        if professor is not None:
+            channels.append(professor_channel(professor.slug))
+        channels = [channel for channel in channels if broker.has_subscribers(channel)]
+        if not channels:
+            continue
+        message = _review_payload(review, course, professor)
+        for channel in channels:
+            broker.publish(channel, message)
+        published += 1
+    return published
+
+
+def publish_reviews_on_commit(reviews):
+    """Publish once the current transaction commits; never fail the write."""
+    def publish():
+        try:
+            publish_reviews(reviews)
+        except Exception:
+            logger.exception("Publishing review events failed")
+    transaction.on_commit(publish)
+
+
+class StreamSlot:
+    """A place among this process's open streams, freed by ``release()``."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._released = False
+
+    def release(self):
+        with _streams_lock:
+            if not self._released:
+                self._released = True
+                _open_streams[self.kind] -= 1
+
+
+_open_streams = {'sync': 0, 'async': 0}
+_streams_lock = threading.Lock()
+
+
+def stream_slot(asynchronous=False):
+    """
+    Claim a place for one more stream, or None when this process already
+    serves its limit: each WSGI stream holds a worker thread for up to
+    REVIEW_EVENTS_MAX_STREAM_SECONDS.
+    """
+    kind = 'async' if asynchronous else 'sync'
+    limit = settings.REVIEW_EVENTS_MAX_ASYNC_STREAMS if asynchronous else settings.REVIEW_EVENTS_MAX_STREAMS
+    with _streams_lock:
+        if _open_streams[kind] >= limit:
+            return None
+        _open_streams[kind] += 1
+    return StreamSlot(kind)
+
+
+def open_streams():
+    with _streams_lock:
+        return dict(_open_streams)
+
+
+def _format(message):
+    return f"event: {EVENT_NAME}\ndata: {message}\n\n"
+
+
+def _stream_settings():
+    return (
+        getattr(settings, 'REVIEW_EVENTS_KEEPALIVE_SECONDS', 15),
+        getattr(settings, 'REVIEW_EVENTS_MAX_STREAM_SECONDS', 300),
+    )
+
+
+def stream(channels):
+    """Blocking SSE stream for WSGI workers; ends after the max duration."""
+    keepalive, max_seconds = _stream_settings()
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    deadline = time.monotonic() + max_seconds
+    try:
+        # EventSource reconnects after the stream ends; tell it how soon.
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=min(keepalive, max(0.0, deadline - time.monotonic())))
+            yield ": keep-alive\n\n" if message is None else _format(message)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def astream(channels):
+    """SSE stream for ASGI servers; holds no thread while idle."""
+    keepalive, max_seconds = _stream_settings()
+    broker = get_broker()
+    subscription = broker.subscribe(channels, loop=asyncio.get_running_loop())
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            message = await subscription.aget(timeout=min(keepalive, max(0.0, deadline - time.monotonic())))
+            yield ": keep-alive\n\n" if message is None else _format(message)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,118 @@
+"""
+Streaming export of catalog and review data as NDJSON or CSV.
+
+Rows are read with ``.values().iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, so memory stays flat no matter how many
+reviews there are. Used by the ``export_data`` command and the ``/export/``
+endpoint.
+"""
+import csv
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Course, Department, Professor, Review
+
+EXPORT_MODELS = {
+    'departments': Department,
+    'courses': Course,
+    'professors': Professor,
+    'reviews': Review,
+}
+FORMATS = ('ndjson', 'csv')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime for incremental exports."""
+    if not value:
+        return None
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValueError(value)
+            since = datetime.combine(date, time.min)
+    except ValueError:
+        raise ExportError(f"Invalid since value: {value}")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def resolve_models(names):
+    """Return the export models for a list of names, in dependency order."""
+    if not names:
+        return list(EXPORT_MODELS.items())
+    unknown = [name for name in names if name not in EXPORT_MODELS]
+    if unknown:
+        raise ExportError(f"Unknown model(s): {', '.join(unknown)}")
+    return [(name, model) for name, model in EXPORT_MODELS.items() if name in names]
+
+
+def field_names(model):
+    # Binary columns (comment signatures) are derived and not JSON/CSV safe.
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.get_internal_type() != 'BinaryField'
+    ]
+
+
+def iter_rows(model, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    queryset = model.objects.order_by('pk')
+    if since is not None and hasattr(model, 'updated_at'):
+        queryset = queryset.filter(updated_at__gte=since)
+    return queryset.values(*field_names(model)).iterator(chunk_size=chunk_size)
+
+
+def ndjson_lines(models, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for name, model in models:
+        for row in iter_rows(model, since, chunk_size):
+            row['_model'] = name
+            yield encoder.encode(row) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value, encoder):
+    # JSON columns (keywords) are written as JSON, not as Python reprs.
+    if isinstance(value, (dict, list)):
+        return encoder.encode(value)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_lines(model, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    fields = field_names(model)
+    writer = csv.writer(_Echo())
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    yield writer.writerow(fields)
+    for row in iter_rows(model, since, chunk_size):
+        yield writer.writerow([_csv_value(row[field], encoder) for field in fields])
+
+
+def stream(names=None, fmt='ndjson', since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return an iterator of text lines for the requested models and format.
+    CSV supports a single model at a time since each has its own columns.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format: {fmt}")
+    models = resolve_models(names)
+    if fmt == 'csv':
+        if len(models) != 1:
+            raise ExportError("CSV export needs exactly one model")
+        return csv_lines(models[0][1], since, chunk_size)
+    return ndjson_lines(models, since, chunk_size)
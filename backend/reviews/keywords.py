@@ -0,0 +1,162 @@
+"""
+Keyword summaries of review comments ("what students say").
+
+``summarize`` finds the terms (words and two-word phrases) that set a
+course's or professor's reviews apart from the rest of its department:
+each term is weighted by how many of the entity's reviews use it
+(sublinear) times its inverse frequency among the department's courses
+(or professors). Terms used by fewer than ``REVIEW_KEYWORDS_MIN_REVIEWS``
+reviews are ignored, so one review cannot put words in everyone's mouth.
+
+The best ``REVIEW_KEYWORDS_TOP_K`` go to the entity's ``keywords`` column::
+
+    {"terms": [["group project", 7], ["curve", 4]], "reviews": 31, "updated": "..."}
+
+with the number of reviews using each term, and the review count and
+latest review change they were computed from. A run only summarizes
+entities whose count or latest change differs, though it reads the whole
+department of each for the baseline.
+
+NumPy and SciPy are imported by the summarizer only, not by the web workers.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Course, Professor, Review
+from .similarity import STOP_WORDS, TOKEN
+
+# Words that say nothing about one course or professor in particular
+REVIEW_STOP_WORDS = STOP_WORDS | frozenset('''
+    i me my we our you your he him his she her they them was were been being
+    have had do does did not no but so if then than very really just too lot
+    lots get got would could should can one much many more most some any all
+    about class classes professor prof lecture lectures quarter take took
+    taking taken there what when which who how out up make made even
+    because only well way thing things
+'''.split())
+
+
+def terms(comment):
+    """The set of words (three letters or more) and two-word phrases in ``comment``."""
+    words = TOKEN.findall((comment or '').lower())
+    found = {word for word in words if len(word) > 2 and word not in REVIEW_STOP_WORDS}
+    for first, second in zip(words, words[1:]):
+        if first not in REVIEW_STOP_WORDS and second not in REVIEW_STOP_WORDS:
+            found.add(f"{first} {second}")
+    return found
+
+
+def _pick(ranked, top_k):
+    """Best terms first, skipping any that repeats a word of one already picked."""
+    picked, used = [], set()
+    for term, count in ranked:
+        words = set(term.split())
+        if words & used:
+            continue
+        picked.append([term, count])
+        used |= words
+        if len(picked) == top_k:
+            break
+    return picked
+
+
+def _summarize_model(model, relation, full):
+    import numpy as np
+    from scipy import sparse
+
+    key = f"{relation}_id"
+    top_k = settings.REVIEW_KEYWORDS_TOP_K
+    min_reviews = settings.REVIEW_KEYWORDS_MIN_REVIEWS
+
+    rows = list(
+        model.objects.order_by('pk')
+        .annotate(count=Count('reviews'), latest=Max('reviews__updated_at'))
+        .values_list('pk', 'department_id', 'count', 'latest', 'keywords')
+    )
+    current = {pk: (count, latest.isoformat() if latest else None) for pk, _, count, latest, _ in rows}
+    dirty = {
+        pk for pk, _, _, _, stored in rows
+        if full or ((stored or {}).get('reviews', 0), (stored or {}).get('updated')) != current[pk]
+    }
+    if not dirty:
+        return 0
+
+    department_of = {pk: department_id for pk, department_id, _, _, _ in rows}
+    departments = {department_of[pk] for pk in dirty}
+    members = defaultdict(list)
+    for pk, department_id in department_of.items():
+        if department_id in departments:
+            members[department_id].append(pk)
+    index = {pk: row for row, pk in enumerate(pk for group in members.values() for pk in group)}
+
+    # One (entity, term) entry per review using the term; summing the
+    # duplicates gives the number of reviews per entity and term.
+    vocabulary, entity_rows, columns = {}, [], []
+    in_departments = Q(**{f"{relation}__department__in": [pk for pk in departments if pk is not None]})
+    if None in departments:
+        in_departments |= Q(**{f"{relation}__department__isnull": True, f"{key}__isnull": False})
+    comments = (
+        Review.objects.filter(in_departments).exclude(comment__isnull=True).exclude(comment='')
+        .order_by().values_list(key, 'comment')
+    )
+    for owner, comment in comments.iterator(chunk_size=2000):
+        row = index[owner]
+        for term in terms(comment):
+            entity_rows.append(row)
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+    counts = sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.int32), (entity_rows, columns)), shape=(len(index), len(vocabulary)),
+    )
+    counts.sum_duplicates()
+    names = np.array(sorted(vocabulary, key=vocabulary.get), dtype=object)
+
+    summaries = {}
+    for group in members.values():
+        block = counts[[index[pk] for pk in group]]
+        document_frequency = np.bincount(block.indices, minlength=len(vocabulary))
+        idf = np.log((1 + len(group)) / (1 + document_frequency)) + 1
+        for row, pk in enumerate(group):
+            if pk not in dirty:
+                continue
+            start, end = block.indptr[row], block.indptr[row + 1]
+            term_ids, used_by = block.indices[start:end], block.data[start:end]
+            keep = used_by >= min_reviews
+            term_ids, used_by = term_ids[keep], used_by[keep]
+            scores = (1 + np.log(used_by)) * idf[term_ids]
+            # Longer phrases win ties, so "group project" beats "group".
+            lengths = np.array([len(names[term_id]) for term_id in term_ids])
+            order = np.lexsort((-lengths, -scores))
+            ranked = ((names[term_ids[i]], int(used_by[i])) for i in order)
+            count, updated = current[pk]
+            summaries[pk] = {'terms': _pick(ranked, top_k), 'reviews': count, 'updated': updated}
+
+    now = timezone.now()
+    objects = [model(pk=pk, keywords=summaries[pk], updated_at=now) for pk in dirty]
+    with transaction.atomic():
+        # bulk_update skips auto_now; set updated_at so incremental exports
+        # include the new keywords.
+        model.objects.bulk_update(objects, ['keywords', 'updated_at'], batch_size=1000)
+    bump_version(model)
+    return len(objects)
+
+
+def summarize(full=False):
+    """
+    Summarize the courses and professors whose reviews changed (all of them
+    with ``full``). Returns ``{'courses', 'professors'}`` counts updated.
+    """
+    return {
+        'courses': _summarize_model(Course, 'course', full),
+        'professors': _summarize_model(Professor, 'professor', full),
+    }
+
+
+def top_terms(instance, first):
+    """``[(term, review_count), ...]`` of ``instance``, at most ``first``."""
+    first = max(0, min(first, settings.REVIEW_KEYWORDS_TOP_K))
+    return [tuple(term) for term in (instance.keywords or {}).get('terms', [])[:first]]
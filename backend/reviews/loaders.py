@@ -0,0 +1,52 @@
+"""
+Per-request lookups shared by every operation of a request.
+
+graphene-django passes the Django request as ``info.context``. ``for_context``
+attaches a ``RequestLoaders`` to it, so the fields of one operation and all
+operations of a batched POST look up each course and professor once per
+request instead of once per field. The view drops the loaders after a
+mutation so later operations of the batch see its writes.
+"""
+import threading
+
+from . import cache
+
+
+class RequestLoaders:
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def load(self, key, fetch):
+        """The memoized ``fetch()`` for ``key``."""
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = fetch()
+        with self._lock:
+            return self._values.setdefault(key, value)
+
+    def course(self, code):
+        return self.load(('course', code), lambda: cache.get_course(code))
+
+    def professor(self, id=None, slug=None):
+        return self.load(('professor', id, slug), lambda: cache.get_professor(id=id, slug=slug))
+
+
+def for_context(context):
+    loaders = getattr(context, 'graphql_loaders', None)
+    if loaders is None:
+        loaders = RequestLoaders()
+        try:
+            context.graphql_loaders = loaders
+        except AttributeError:
+            # Contexts that take no attributes (plain dicts in tests) skip the memo.
+            pass
+    return loaders
+
+
+def reset(context):
+    """Forget everything loaded so far, e.g. after a write."""
+    if getattr(context, 'graphql_loaders', None) is not None:
+        context.graphql_loaders = None
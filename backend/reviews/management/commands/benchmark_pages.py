@@ -0,0 +1,101 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from huskyden.operations import DETAIL_PAGES, STITCHED_DETAIL_PAGES
+from huskyden.schema import schema
+from reviews.cache import get_course
+from reviews.models import Professor, Review
+
+
+class Command(BaseCommand):
+    help = 'Compare SQL queries and latency of the detail page queries with the documents they replaced'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--code', help='Course code (default: the course reviewed most with one professor)')
+        parser.add_argument('--slug', help="Professor slug (default: the course's most reviewed professor)")
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def pick(self, code, slug):
+        """
+        The course code and professor to benchmark: the given ones, else the
+        course and professor with the most reviews together.
+        """
+        reviews = Review.objects.filter(professor__isnull=False)
+        professor = None
+        if slug:
+            professor = Professor.objects.filter(slug=slug).first()
+            if professor is None:
+                raise CommandError(f"No professor {slug!r}")
+            reviews = reviews.filter(professor=professor)
+        if code:
+            course = get_course(code)
+            if course is None:
+                raise CommandError(f"No course {code!r}")
+            code = course.code
+            reviews = reviews.filter(course=course)
+        if code and professor:
+            return code, professor
+
+        row = reviews.values('course__code', 'professor').annotate(n=Count('id')).order_by('-n').first()
+        if row is None:
+            if code:
+                raise CommandError(f"No professor has reviews of {code}")
+            if slug:
+                raise CommandError(f"{slug} has no reviews to benchmark against")
+            raise CommandError("No reviews with a professor to benchmark against")
+        return row['course__code'], professor or Professor.objects.get(pk=row['professor'])
+
+    def handle(self, *args, **options):
+        code, professor = self.pick(options['code'], options['slug'])
+
+        cases = [
+            ('GetCourse', STITCHED_DETAIL_PAGES['GetCourse'], {'code': code}, None),
+            ('CoursePage', DETAIL_PAGES['CoursePage'], {'code': code}, 'cold'),
+            ('CoursePage', DETAIL_PAGES['CoursePage'], {'code': code}, 'warm'),
+            ('GetProfessorBySlug', STITCHED_DETAIL_PAGES['GetProfessorBySlug'], {'slug': professor.slug}, None),
+            (
+                'ProfessorCoursePage', DETAIL_PAGES['ProfessorCoursePage'],
+                {'slug': professor.slug, 'courseCode': code}, 'cold',
+            ),
+            (
+                'ProfessorCoursePage', DETAIL_PAGES['ProfessorCoursePage'],
+                {'slug': professor.slug, 'courseCode': code}, 'warm',
+            ),
+        ]
+        factory = RequestFactory()
+
+        self.stdout.write(f"{code}, {professor.slug}")
+        header = f"{'operation':<21}{'page cache':>11}{'queries':>9}{'p50 ms':>9}{'p90 ms':>9}{'json B':>9}"
+        self.stdout.write(header)
+        for name, query, variables, page_cache in cases:
+            # A zero TTL expires every page as soon as it is stored.
+            with override_settings(**({'PAGE_CACHE_TTL': 0} if page_cache == 'cold' else {})):
+                def run():
+                    result = schema.execute(query, variables=variables, context_value=factory.post('/graphql/'))
+                    if result.errors:
+                        raise CommandError(f"{name}: {result.errors}")
+                    return result
+
+                # The first run fills the entity cache (and the page cache when warm).
+                result = run()
+                with CaptureQueriesContext(connection) as captured:
+                    run()
+                timings = []
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            size = len(json.dumps({'data': result.data}, separators=(',', ':')))
+            p90 = statistics.quantiles(timings, n=10)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(
+                f"{name:<21}{page_cache or '-':>11}{len(captured):>9}"
+                f"{statistics.median(timings):>9.2f}{p90:>9.2f}{size:>9}"
+            )
@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from huskyden.compression import brotli, compress
+from huskyden.operations import SEARCH_PAGE
+from huskyden.schema import schema
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _time(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = 'Measure bytes on the wire and serialization CPU for the search page queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        header = f"{'operation':<16}{'json B':>9}{'gzip B':>9}{'br B':>9}{'json us':>10}{'orjson us':>11}"
+        self.stdout.write(header)
+
+        for name, query in SEARCH_PAGE.items():
+            result = schema.execute(query)
+            if result.errors:
+                self.stderr.write(f"{name}: {result.errors}")
+                continue
+            payload = {'data': result.data}
+
+            def stdlib():
+                return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+            raw = stdlib()
+            gzip_size = len(compress(raw, 'gzip'))
+            br_size = len(compress(raw, 'br')) if brotli is not None else None
+            json_us = _time(stdlib, iterations)
+            orjson_us = _time(lambda: orjson.dumps(payload), iterations) if orjson is not None else None
+
+            self.stdout.write(
+                f"{name:<16}{len(raw):>9}{gzip_size:>9}"
+                f"{br_size if br_size is not None else '-':>9}"
+                f"{json_us:>10.1f}"
+                f"{f'{orjson_us:.1f}' if orjson_us is not None else '-':>11}"
+            )
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reviews import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write content-hashed JSON shards of the course/professor catalog for static hosting'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir', '-o',
+            default=settings.CATALOG_SNAPSHOT_DIR,
+            help='Directory to write index.json and departments/ into',
+        )
+        parser.add_argument('--full', action='store_true', help='Rebuild every shard')
+
+    def handle(self, *args, **options):
+        result = snapshot.build_snapshot(options['output_dir'], full=options['full'])
+        for path in result['built']:
+            self.stdout.write(f"built {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(result['built'])} shard(s) rebuilt, {len(result['unchanged'])} unchanged, "
+            f"{len(result['removed'])} removed in {options['output_dir']}"
+        ))
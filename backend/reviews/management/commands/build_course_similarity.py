@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import similarity
+
+
+class Command(BaseCommand):
+    help = 'Precompute each course\'s most similar courses (TF-IDF text plus rating profile)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every course, not only changed ones')
+        parser.add_argument('--block-size', type=int, default=256, help='Courses scored per batch')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        result = similarity.build(full=options['full'], block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['changed']} of {result['courses']} courses changed; "
+            f"updated neighbours of {result['updated']} courses in {time.perf_counter() - start:.2f}s"
+        ))
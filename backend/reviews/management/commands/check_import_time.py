@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What each kind of process imports before it can do any work.
+TARGETS = {
+    # django.setup() plus the URLconf, which system checks load for every command.
+    'command': (
+        "import django; django.setup(); "
+        "from django.urls import get_resolver; get_resolver().url_patterns"
+    ),
+    # A web worker after warm-up: the WSGI app, the GraphQL views and the schema.
+    'worker': (
+        "from huskyden.wsgi import application; "
+        "import huskyden.views, huskyden.schema"
+    ),
+}
+
+# Packages a target must not import. NumPy and SciPy are only for the
+# offline commands that import them themselves (build_course_similarity);
+# the GraphQL stack only for web workers.
+FORBIDDEN_MODULES = {
+    'command': ('numpy', 'scipy', 'graphene', 'graphene_django'),
+    'worker': ('scipy',),
+}
+
+
+def _run(args, code):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'huskyden.settings'))
+    result = subprocess.run(
+        [sys.executable, *args, '-c', code],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+    return result
+
+
+def forbidden_imports(target):
+    """The FORBIDDEN_MODULES of ``target`` that a fresh interpreter imports."""
+    names = FORBIDDEN_MODULES.get(target, ())
+    code = f"{TARGETS[target]}; import sys; print(' '.join(n for n in {names!r} if n in sys.modules))"
+    return _run([], code).stdout.split()
+
+
+def profile_imports(code):
+    """
+    Run ``code`` in a fresh interpreter under ``-X importtime`` and return
+    ``(total_ms, [(cumulative_ms, module), ...])`` for its top-level imports.
+    """
+    result = _run(['-X', 'importtime'], code)
+    total_us = 0
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        # Nested imports are indented; top-level ones have a single space.
+        if not name.startswith('  '):
+            top_level.append((int(cumulative_us) / 1000, name.strip()))
+    top_level.sort(reverse=True)
+    return total_us / 1000, top_level
+
+
+class Command(BaseCommand):
+    help = 'Profile startup imports with -X importtime and fail when a target imports FORBIDDEN_MODULES'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), action='append')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+        parser.add_argument('--runs', type=int, default=5, help='Report the fastest of N runs')
+
+    def handle(self, *args, **options):
+        failures = []
+        for target in options['target'] or sorted(TARGETS):
+            runs = [profile_imports(TARGETS[target]) for _ in range(max(1, options['runs']))]
+            total_ms, top_level = min(runs, key=lambda run: run[0])
+            self.stdout.write(f"{target}: {total_ms:.0f} ms of imports")
+            for cumulative_ms, name in top_level[:options['top']]:
+                self.stdout.write(f"  {cumulative_ms:8.1f} ms  {name}")
+
+            imported = forbidden_imports(target)
+            if imported:
+                failures.append(f"{target} imports {', '.join(imported)}")
+
+        if failures:
+            raise CommandError(f"Startup imports too much: {'; '.join(failures)}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import aliases
+
+
+class Command(BaseCommand):
+    help = 'Make course codes aliases of one course (cross-listings), merging codes that are courses of their own'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='The course the codes resolve to, e.g. "STAT 391"')
+        parser.add_argument('codes', nargs='*', help='Cross-listed codes, e.g. "CSE 312"')
+        parser.add_argument('--remove', action='store_true', help='Delete the given aliases instead')
+
+    def handle(self, *args, **options):
+        try:
+            if options['remove']:
+                for code in options['codes']:
+                    aliases.remove(code)
+                    self.stdout.write(f"Removed alias {code}")
+                return
+            for code, merged in aliases.cross_list(options['course'], options['codes']):
+                merged = f" (merged {merged} reviews)" if merged else ''
+                self.stdout.write(self.style.SUCCESS(f"{code} -> {options['course']}{merged}"))
+        except aliases.CrossListingError as error:
+            raise CommandError(str(error))
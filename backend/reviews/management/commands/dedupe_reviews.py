@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from reviews import duplicates
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = 'Sign unindexed review comments and report (or delete) near-duplicate reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--threshold', type=float, help='Defaults to REVIEW_DUPLICATE_THRESHOLD')
+        parser.add_argument(
+            '--reindex',
+            action='store_true',
+            help='Re-sign every review, e.g. after changing REVIEW_DUPLICATE_MIN_CHARS',
+        )
+        parser.add_argument('--show', type=int, default=20, help='Clusters to list')
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete every review of a cluster except the oldest',
+        )
+
+    def handle(self, *args, **options):
+        signed = duplicates.backfill(options['batch_size'], reindex=options['reindex'])
+        if signed:
+            self.stdout.write(f"Signed {signed} reviews")
+
+        clusters = duplicates.find_clusters(options['threshold'], options['batch_size'])
+        duplicate_count = sum(len(ids) - 1 for ids in clusters)
+        self.stdout.write(f"Found {len(clusters)} clusters with {duplicate_count} duplicate reviews")
+
+        comments = dict(
+            Review.objects.filter(pk__in=[ids[0] for ids in clusters[:options['show']]])
+            .values_list('pk', 'comment')
+        )
+        for ids in clusters[:options['show']]:
+            comment = (comments.get(ids[0]) or '').replace('\n', ' ')
+            shown = ', '.join(str(pk) for pk in ids[:10]) + (', ...' if len(ids) > 10 else '')
+            self.stdout.write(f"  {len(ids):5d} reviews [{shown}]: {comment[:60]}")
+
+        if options['delete'] and clusters:
+            doomed = [pk for ids in clusters for pk in ids[1:]]
+            deleted = 0
+            for start in range(0, len(doomed), options['batch_size']):
+                # Per-object delete signals keep the stored aggregates right.
+                deleted += Review.objects.filter(pk__in=doomed[start:start + options['batch_size']]).delete()[1].get('reviews.Review', 0)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} duplicate reviews"))
@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import export
+
+
+class Command(BaseCommand):
+    help = 'Stream departments, courses, professors and reviews as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            default='',
+            help=f"Comma-separated models to export ({', '.join(export.EXPORT_MODELS)}); default all",
+        )
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument(
+            '--since',
+            help='Only export rows updated at or after this ISO date/datetime',
+        )
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--output', '-o', default='-', help='Output file (default stdout)')
+
+    def handle(self, *args, **options):
+        names = [name for name in options['models'].split(',') if name]
+        try:
+            since = export.parse_since(options['since'])
+            lines = export.stream(names, options['format'], since, options['chunk_size'])
+        except export.ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output'] == '-':
+            out = sys.stdout
+            close = False
+        else:
+            out = open(options['output'], 'w', newline='', encoding='utf-8')
+            close = True
+
+        count = 0
+        try:
+            for line in lines:
+                out.write(line)
+                count += 1
+        finally:
+            if close:
+                out.close()
+
+        if close:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}"))
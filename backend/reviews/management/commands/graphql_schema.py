@@ -0,0 +1,5 @@
+# graphene_django is not an installed app (its models and checks would load
+# the GraphQL stack for every command), so its schema dump command is
+# re-exported here for the frontend's codegen:
+#   python manage.py graphql_schema --out schema.json
+from graphene_django.management.commands.graphql_schema import Command  # noqa: F401
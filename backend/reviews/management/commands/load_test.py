@@ -0,0 +1,108 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from huskyden.operations import FRONTEND_OPERATIONS, SEARCH_PAGE, STITCHED_DETAIL_PAGES
+
+OPERATIONS = {**FRONTEND_OPERATIONS, **STITCHED_DETAIL_PAGES}
+
+
+class Command(BaseCommand):
+    help = 'Send the frontend GraphQL documents to a running server and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/graphql/')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+        parser.add_argument(
+            '--operations',
+            default=','.join(SEARCH_PAGE),
+            help=f"Comma-separated operations ({', '.join(OPERATIONS)})",
+        )
+        parser.add_argument('--code', default='STAT 220', help='Course code for the course page operations')
+        parser.add_argument('--slug', default='', help='Professor slug for the professor page operations')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        names = [name for name in options['operations'].split(',') if name]
+        unknown = [name for name in names if name not in OPERATIONS]
+        if unknown:
+            raise CommandError(f"Unknown operation(s): {', '.join(unknown)}")
+
+        variables = {
+            'GetCourse': {'code': options['code']},
+            'GetProfessorBySlug': {'slug': options['slug']},
+            'CoursePage': {'code': options['code']},
+            'ProfessorCoursePage': {'slug': options['slug'], 'courseCode': options['code']},
+        }
+        bodies = [
+            json.dumps({
+                'query': OPERATIONS[name],
+                'operationName': name,
+                'variables': variables.get(name, {}),
+            }).encode('utf-8')
+            for name in names
+        ]
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def worker(offset):
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            own_latencies, own_errors = [], 0
+            i = offset
+            while time.perf_counter() < deadline:
+                body = bodies[i % len(bodies)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    connection.request('POST', url.path or '/', body, {
+                        'Content-Type': 'application/json',
+                        'Accept-Encoding': 'gzip',
+                    })
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        own_errors += 1
+                except (OSError, http.client.HTTPException):
+                    own_errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                    continue
+                own_latencies.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                errors.append(own_errors)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f"No successful requests ({sum(errors)} errors)")
+
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(
+            f"{len(latencies)} requests in {elapsed:.1f}s with {options['concurrency']} clients: "
+            f"{len(latencies) / elapsed:.1f} req/s, {sum(errors)} errors"
+        )
+        self.stdout.write(
+            f"latency ms: mean {statistics.mean(latencies) * 1000:.1f}, "
+            f"p50 {percentile(0.50):.1f}, p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}"
+        )
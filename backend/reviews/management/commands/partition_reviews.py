@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming academic-year partitions of reviews and archive expired ones (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild the review table as a partitioned table first (locks reviews while copying)',
+        )
+        parser.add_argument('--ahead', type=int, default=1, help='Future academic years to create')
+        parser.add_argument(
+            '--retain-years',
+            type=int,
+            default=settings.REVIEW_PARTITION_RETAIN_YEARS,
+            help='Archive academic years older than this many (defaults to REVIEW_PARTITION_RETAIN_YEARS)',
+        )
+        parser.add_argument('--archive-dir', help='Defaults to REVIEW_ARCHIVE_DIR')
+        parser.add_argument(
+            '--keep-detached',
+            action='store_true',
+            help='Leave archived partitions as standalone tables instead of dropping them',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                years = partitions.convert(ahead=options['ahead'])
+                self.stdout.write(f"Converted reviews into {len(years)} academic-year partitions")
+            for name in partitions.ensure_partitions(ahead=options['ahead']):
+                self.stdout.write(f"Created {name}")
+
+            if options['retain_years'] is None:
+                return
+            if options['retain_years'] < 1:
+                raise CommandError('--retain-years must keep at least the current academic year')
+            for year in partitions.expired_years(options['retain_years']):
+                path, rows = partitions.archive_partition(
+                    year, options['archive_dir'], drop=not options['keep_detached'],
+                )
+                self.stdout.write(f"Archived {rows} reviews of {year}-{year + 1} to {path}")
+        except partitions.PartitionError as error:
+            raise CommandError(str(error))
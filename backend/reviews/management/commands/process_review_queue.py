@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import queue
+
+
+class Command(BaseCommand):
+    help = 'Drain queued review submissions into the Review table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only print queue depth and age',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = queue.publish_stats()
+            self.stdout.write(
+                f"Depth: {stats['depth']}, oldest: {stats['oldest_age_seconds']}s, "
+                f"failed: {stats['failed']}"
+            )
+            return
+
+        total = 0
+        while True:
+            start = time.perf_counter()
+            processed = queue.process_batch(options['batch_size'])
+            elapsed = time.perf_counter() - start
+            total += processed
+
+            stats = queue.publish_stats(
+                last_batch=processed,
+                last_batch_seconds=round(elapsed, 3),
+                reviews_per_second=round(processed / elapsed, 1) if processed and elapsed else 0,
+            )
+            if processed:
+                self.stdout.write(
+                    f"Processed {processed} reviews in {elapsed:.3f}s "
+                    f"(depth {stats['depth']}, oldest {stats['oldest_age_seconds']}s)"
+                )
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} reviews"))
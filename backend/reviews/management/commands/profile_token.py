@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from huskyden import profiling
+
+
+class Command(BaseCommand):
+    help = 'Print an X-Profile header value that profiles GraphQL requests (valid PROFILE_TOKEN_MAX_AGE seconds)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"X-Profile: {profiling.make_token()}")
+        self.stderr.write(f"Valid for {settings.PROFILE_TOKEN_MAX_AGE} seconds")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from reviews import aggregates
+from reviews.cache import bump_version
+from reviews.models import Course, Professor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored review totals on every course and professor'
+
+    def handle(self, *args, **options):
+        aggregates.recompute()
+        bump_version(Course)
+        bump_version(Professor)
+        self.stdout.write(self.style.SUCCESS('Recomputed review aggregates'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from reviews.models import Department, Course, Professor, Review
+from reviews.codes import canonical_code
 
 
 class Command(BaseCommand):
@@ -254,8 +255,9 @@ class Command(BaseCommand):
         created_courses = []
         for course_data in all_courses:
             course, created = Course.objects.get_or_create(
-                code=course_data['code'],
+                canonical_code=canonical_code(course_data['code']),
                 defaults={
+                    'code': course_data['code'],
                     'title': course_data['title'],
                     'department': stat_dept,
                     'description': course_data['description']
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import keywords
+
+
+class Command(BaseCommand):
+    help = 'Store the most distinctive review comment terms of each course and professor'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Summarize every course and professor, not only those with new or edited reviews',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        result = keywords.summarize(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Summarized {result['courses']} courses and {result['professors']} professors "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from reviews.cache import shared_stats, warm
+
+
+class Command(BaseCommand):
+    help = 'Preload courses and professors into the shared entity cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only print hit-rate statistics reported by the workers',
+        )
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            count = warm()
+            self.stdout.write(self.style.SUCCESS(f'Cached {count} entities'))
+
+        stats = shared_stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else 'n/a'
+        self.stdout.write(
+            f"Lookups: {stats['lookups']} "
+            f"(local hits: {stats['local_hits']}, shared hits: {stats['shared_hits']}, "
+            f"misses: {stats['misses']}) - hit rate {hit_rate}"
+        )
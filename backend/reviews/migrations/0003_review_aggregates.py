@@ -0,0 +1,75 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Review = apps.get_model("reviews", "Review")
+    for model_name, key in (("Course", "course_id"), ("Professor", "professor_id")):
+        model = apps.get_model("reviews", model_name)
+        totals = (
+            Review.objects.exclude(**{key: None})
+            .values(key)
+            .annotate(
+                count=Count("id"),
+                rating=Sum("rating"),
+                workload=Sum("workload"),
+                difficulty=Sum("difficulty"),
+            )
+        )
+        for row in totals:
+            model.objects.filter(pk=row[key]).update(
+                review_count=row["count"],
+                rating_sum=row["rating"],
+                workload_sum=row["workload"],
+                difficulty_sum=row["difficulty"],
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0002_professor_slug_professor_reviews_pro_slug_daf0e2_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="workload_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="difficulty_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="professor",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="professor",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="professor",
+            name="workload_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="professor",
+            name="difficulty_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0004_pending_review"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="review",
+            name="comment_signature",
+            field=models.BinaryField(
+                blank=True,
+                editable=False,
+                help_text="MinHash signature of the comment (reviews.duplicates); empty for short comments",
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CommentBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.BigIntegerField()),
+                (
+                    "review",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="reviews.review",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["key", "review"], name="reviews_com_key_c45333_idx"),
+                    models.Index(fields=["review"], name="reviews_com_review__431dfe_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0005_comment_signatures"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseSimilarity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similarities",
+                        to="reviews.course",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbour_of",
+                        to="reviews.course",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["course", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("course", "rank"), name="unique_course_similarity_rank"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="CourseSimilarityState",
+            fields=[
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="reviews.course",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=16)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0006_course_similarity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="keywords",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Most distinctive comment terms and how many reviews use each (reviews.keywords)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="professor",
+            name="keywords",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Most distinctive comment terms and how many reviews use each (reviews.keywords)",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0008_review_keywords"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "operation",
+                    models.CharField(
+                        help_text="GraphQL operation name(s), '+'-joined for batches",
+                        max_length=200,
+                    ),
+                ),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[("header", "Signed header"), ("sample", "Random sample")],
+                        max_length=10,
+                    ),
+                ),
+                ("duration_ms", models.FloatField()),
+                ("query_count", models.PositiveIntegerField()),
+                ("sql_ms", models.FloatField(help_text="Time spent in SQL queries")),
+                ("sample_count", models.PositiveIntegerField()),
+                (
+                    "stacks",
+                    models.TextField(
+                        help_text="Sampled stacks in collapsed format (speedscope, flamegraph.pl)"
+                    ),
+                ),
+                (
+                    "queries",
+                    models.JSONField(
+                        default=list,
+                        help_text="The first PROFILE_MAX_QUERIES queries with their timings",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-duration_ms"],
+                "indexes": [
+                    models.Index(fields=["-duration_ms"], name="reviews_req_duratio_661022_idx"),
+                    models.Index(
+                        fields=["operation", "-duration_ms"],
+                        name="reviews_req_operati_bd5e9a_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
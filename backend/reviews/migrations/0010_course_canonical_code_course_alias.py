@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from reviews.codes import canonical_code
+
+
+def backfill_canonical_codes(apps, schema_editor):
+    Course = apps.get_model("reviews", "Course")
+    codes = defaultdict(list)
+    for pk, code in Course.objects.values_list("pk", "code"):
+        codes[canonical_code(code)].append(code)
+    clashes = [", ".join(sorted(group)) for group in codes.values() if len(group) > 1]
+    if clashes:
+        raise RuntimeError(
+            "These courses differ only in separators or case; merge or rename them first: "
+            + "; ".join(clashes)
+        )
+    for pk, code in Course.objects.values_list("pk", "code"):
+        Course.objects.filter(pk=pk).update(canonical_code=canonical_code(code))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0009_request_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="canonical_code",
+            field=models.CharField(editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_canonical_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="course",
+            name="canonical_code",
+            field=models.CharField(
+                editable=False,
+                help_text="The code without separators, upper-cased (reviews.codes); what lookups match",
+                max_length=20,
+                unique=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CourseAlias",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "code",
+                    models.CharField(help_text="Alias as written (e.g., CSE 312)", max_length=20),
+                ),
+                ("canonical_code", models.CharField(editable=False, max_length=20, unique=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aliases",
+                        to="reviews.course",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "course aliases",
+                "ordering": ["code"],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+import reviews.models
+
+
+def fill_tokens(apps, schema_editor):
+    PendingReview = apps.get_model('reviews', 'PendingReview')
+    rows = list(PendingReview.objects.only('pk'))
+    for row in rows:
+        row.token = reviews.models.pending_review_token()
+    PendingReview.objects.bulk_update(rows, ['token'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0010_course_canonical_code_course_alias"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pendingreview",
+            name="token",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(fill_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="pendingreview",
+            name="token",
+            field=models.CharField(
+                default=reviews.models.pending_review_token,
+                editable=False,
+                help_text="Unguessable handle the submitter polls the submission with",
+                max_length=32,
+                unique=True,
+            ),
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models
+import secrets
+
+from django.db import IntegrityError, models, transaction
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.utils.text import slugify
+
+from .codes import canonical_code
+from .slugs import next_free_slug
+
+# How often Professor.save() re-allocates a slug that a concurrent insert took
+SLUG_ALLOCATION_ATTEMPTS = 10
 
 
 class Department(models.Model):
@@ -15,9 +23,55 @@ class Department(models.Model):
         ordering = ['code']
 
 
-class Course(models.Model):
+class ReviewAggregates(models.Model):
+    """Running review totals, maintained by reviews.aggregates on every write"""
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    workload_sum = models.PositiveIntegerField(default=0, editable=False)
+    difficulty_sum = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def _average(self, total):
+        if self.review_count:
+            return round(total / self.review_count, 1)
+        return None
+
+    @property
+    def avg_rating(self):
+        """Average rating from the stored review totals"""
+        return self._average(self.rating_sum)
+
+    @property
+    def avg_workload(self):
+        """Average workload from the stored review totals"""
+        return self._average(self.workload_sum)
+
+    @property
+    def avg_difficulty(self):
+        """Average difficulty from the stored review totals"""
+        return self._average(self.difficulty_sum)
+
+
+class ReviewKeywords(models.Model):
+    """Distinctive terms of the review comments, written by summarize_reviews"""
+    keywords = models.JSONField(
+        default=dict, blank=True, editable=False,
+        help_text="Most distinctive comment terms and how many reviews use each (reviews.keywords)",
+    )
+
+    class Meta:
+        abstract = True
+
+
+class Course(ReviewAggregates, ReviewKeywords):
     """Represents a course at UW"""
     code = models.CharField(max_length=20, unique=True, help_text="Course code (e.g., CSE142)")
+    canonical_code = models.CharField(
+        max_length=20, unique=True, editable=False,
+        help_text="The code without separators, upper-cased (reviews.codes); what lookups match",
+    )
     title = models.CharField(max_length=200)
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='courses')
     description = models.TextField(blank=True, null=True)
@@ -27,29 +81,12 @@ class Course(models.Model):
     def __str__(self):
         return f"{self.code}: {self.title}"
     
-    @property
-    def avg_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return None
-    
-    @property
-    def avg_workload(self):
-        """Calculate average workload from reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.workload for r in reviews) / reviews.count(), 1)
-        return None
-    
-    @property
-    def avg_difficulty(self):
-        """Calculate average difficulty from reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.difficulty for r in reviews) / reviews.count(), 1)
-        return None
+    def save(self, *args, **kwargs):
+        self.canonical_code = canonical_code(self.code)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'code' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'canonical_code'}
+        return super().save(*args, **kwargs)
     
     class Meta:
         ordering = ['code']
@@ -59,7 +96,36 @@ class Course(models.Model):
         ]
 
 
-class Professor(models.Model):
+class CourseAlias(models.Model):
+    """
+    Another code that resolves to a course, e.g. the other department's code
+    of a cross-listed course. Reviews under either code go to the one course,
+    so they share its aggregates.
+    """
+    code = models.CharField(max_length=20, help_text="Alias as written (e.g., CSE 312)")
+    canonical_code = models.CharField(max_length=20, unique=True, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='aliases')
+
+    def __str__(self):
+        return f"{self.code} -> {self.course.code}"
+
+    def clean(self):
+        clash = Course.objects.filter(canonical_code=canonical_code(self.code)).first()
+        if clash is not None:
+            raise ValidationError(
+                {'code': f"{clash.code} is a course of its own; merge it with manage.py cross_list"}
+            )
+
+    def save(self, *args, **kwargs):
+        self.canonical_code = canonical_code(self.code)
+        return super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['code']
+        verbose_name_plural = 'course aliases'
+
+
+class Professor(ReviewAggregates, ReviewKeywords):
     """Represents a professor at UW"""
     name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True, help_text="URL-friendly version of name")
@@ -71,23 +137,20 @@ class Professor(models.Model):
         return self.name
     
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Professor.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
-    
-    @property
-    def avg_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return None
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = next_free_slug(Professor, self.name, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Another insert claimed the same slug first; allocate again.
+                taken = Professor.objects.filter(slug=self.slug).exists()
+                self.slug = ''
+                if not taken or attempt == SLUG_ALLOCATION_ATTEMPTS - 1:
+                    raise
     
     class Meta:
         ordering = ['name']
@@ -97,6 +160,21 @@ class Professor(models.Model):
         ]
 
 
+class ReviewQuerySet(models.QuerySet):
+    def created_between(self, start, end):
+        """
+        Reviews created in ``[start, end)``. Constant bounds on created_at let
+        PostgreSQL skip the academic-year partitions outside them
+        (reviews.partitions); queries without one scan every year.
+        """
+        return self.filter(created_at__gte=start, created_at__lt=end)
+
+    def in_academic_year(self, year):
+        from .partitions import year_bounds
+
+        return self.created_between(*year_bounds(year))
+
+
 class Review(models.Model):
     """Represents a review for a course and/or professor"""
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='reviews')
@@ -114,8 +192,14 @@ class Review(models.Model):
         help_text="Difficulty rating (1-5, 5 being hardest)"
     )
     comment = models.TextField(blank=True, null=True)
+    comment_signature = models.BinaryField(
+        null=True, blank=True, editable=False,
+        help_text="MinHash signature of the comment (reviews.duplicates); empty for short comments",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReviewQuerySet.as_manager()
     
     def __str__(self):
         prof_name = self.professor.name if self.professor else "Unknown"
@@ -128,3 +212,103 @@ class Review(models.Model):
             models.Index(fields=['professor']),
             models.Index(fields=['-created_at']),
         ]
+
+
+class CommentBucket(models.Model):
+    """One LSH band key of a review's comment signature"""
+    key = models.BigIntegerField()
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'review']),
+            models.Index(fields=['review']),
+        ]
+
+
+class CourseSimilarity(models.Model):
+    """A precomputed neighbour of a course, written by build_course_similarity"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='neighbour_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['course', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'rank'], name='unique_course_similarity_rank'),
+        ]
+
+
+class CourseSimilarityState(models.Model):
+    """Fingerprint of the inputs a course's neighbours were computed from"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    fingerprint = models.CharField(max_length=16)
+    computed_at = models.DateTimeField(auto_now=True)
+
+
+def pending_review_token():
+    return secrets.token_urlsafe(24)
+
+
+class PendingReview(models.Model):
+    """A validated review submission waiting in the write-behind queue"""
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    professor = models.ForeignKey(Professor, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    rating = models.IntegerField()
+    workload = models.IntegerField()
+    difficulty = models.IntegerField()
+    comment = models.TextField(blank=True, null=True)
+    token = models.CharField(
+        max_length=32, unique=True, default=pending_review_token, editable=False,
+        help_text="Unguessable handle the submitter polls the submission with",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    review = models.OneToOneField(Review, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Pending review #{self.pk} for course {self.course_id} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+
+class RequestProfile(models.Model):
+    """A profiled GraphQL request (huskyden.profiling)"""
+    TRIGGER_CHOICES = [
+        ('header', 'Signed header'),
+        ('sample', 'Random sample'),
+    ]
+
+    operation = models.CharField(max_length=200, help_text="GraphQL operation name(s), '+'-joined for batches")
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField(help_text="Time spent in SQL queries")
+    sample_count = models.PositiveIntegerField()
+    stacks = models.TextField(help_text="Sampled stacks in collapsed format (speedscope, flamegraph.pl)")
+    queries = models.JSONField(default=list, help_text="The first PROFILE_MAX_QUERIES queries with their timings")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-duration_ms']
+        indexes = [
+            models.Index(fields=['-duration_ms']),
+            models.Index(fields=['operation', '-duration_ms']),
+        ]
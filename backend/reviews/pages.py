@@ -0,0 +1,161 @@
+"""
+Purpose-built lookups for the course page and the professor-course page.
+
+``course_page`` and ``professor_course_page`` load everything their page
+shows with a fixed number of queries, however many reviews and professors
+are involved: the entity lookups (through the entity cache), one page of
+reviews, one GROUP BY for the per-professor (or per-course) averages, one
+query for those professors (courses) and, on the course page, one for the
+professors' most helpful reviews.
+
+Built pages are kept in the shared entity cache for ``PAGE_CACHE_TTL``
+seconds. Their keys embed the ``updated_at`` and review count of the
+page's own course (and professor), which every review write moves
+(reviews.aggregates), so a new review shows up at once while reviews of
+other courses leave the page cached. Names of the other professors or
+courses listed on a page can lag a rename by up to the TTL. Pages are
+built from the primary, like the entities in the entity cache: the key
+stamps come from the primary, and a page read from a lagging replica would
+be stored under them until the TTL runs out.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Avg, Case, Count, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .cache import get_course, get_professor
+from .models import Course, Professor, Review
+
+# Averages of one professor's reviews of one course
+TeachingStats = namedtuple(
+    'TeachingStats',
+    ['course', 'professor', 'review_count', 'avg_rating', 'avg_workload', 'avg_difficulty', 'most_helpful_review'],
+)
+CoursePage = namedtuple('CoursePage', ['course', 'reviews', 'has_more_reviews', 'professors'])
+ProfessorCoursePage = namedtuple(
+    'ProfessorCoursePage', ['professor', 'course', 'stats', 'reviews', 'has_more_reviews', 'other_courses'],
+)
+
+
+def _reviews_first(first):
+    return max(0, min(first, settings.PAGE_REVIEWS_MAX))
+
+
+def _cache_key(kind, first, *owners):
+    """A page key that changes whenever a review or field of ``owners`` changes."""
+    stamps = ':'.join(
+        f"{owner.pk}.{owner.review_count}.{int(owner.updated_at.timestamp() * 1_000_000)}" for owner in owners
+    )
+    return f"page:{kind}:{first}:{stamps}"
+
+
+def _cached(key, build):
+    cache = caches[settings.ENTITY_CACHE_ALIAS]
+    page = cache.get(key)
+    if page is None:
+        page = build()
+        cache.set(key, page, timeout=settings.PAGE_CACHE_TTL)
+    return page
+
+
+def _review_page(queryset, first):
+    """Newest ``first`` reviews and whether there are more."""
+    reviews = list(queryset.defer('comment_signature').order_by('-created_at', '-pk')[:first + 1])
+    return reviews[:first], len(reviews) > first
+
+
+def _stats(queryset, key):
+    """``{owner id: (count, avg rating, avg workload, avg difficulty)}`` grouped by ``key``."""
+    rows = (
+        queryset.exclude(**{f"{key}__isnull": True}).order_by().values(key)
+        .annotate(count=Count('id'), rating=Avg('rating'), workload=Avg('workload'), difficulty=Avg('difficulty'))
+    )
+    return {
+        row[key]: (row['count'], round(row['rating'], 1), round(row['workload'], 1), round(row['difficulty'], 1))
+        for row in rows
+    }
+
+
+def _most_helpful(course):
+    """Each professor's most helpful review of ``course``: the newest with a comment, else the newest."""
+    has_comment = Case(
+        When(Q(comment__isnull=True) | Q(comment=''), then=Value(1)), default=Value(0), output_field=IntegerField(),
+    )
+    reviews = (
+        Review.objects.using(DEFAULT_DB_ALIAS).filter(course=course, professor__isnull=False)
+        .defer('comment_signature')
+        .annotate(position=Window(
+            RowNumber(), partition_by=[F('professor_id')], order_by=[has_comment.asc(), F('created_at').desc()],
+        ))
+        .filter(position=1)
+    )
+    return {review.professor_id: review for review in reviews}
+
+
+def course_page(code, reviews_first=20):
+    """The CoursePage of ``code`` (any spelling or alias), or None."""
+    course = get_course(code)
+    if course is None:
+        return None
+    first = _reviews_first(reviews_first)
+
+    def build():
+        course_reviews = Review.objects.using(DEFAULT_DB_ALIAS).filter(course=course)
+        reviews, has_more = _review_page(course_reviews.select_related('professor__department'), first)
+        for review in reviews:
+            review.course = course
+
+        stats = _stats(course_reviews, 'professor_id')
+        professors = Professor.objects.using(DEFAULT_DB_ALIAS).select_related('department').in_bulk(list(stats))
+        helpful = _most_helpful(course) if stats else {}
+        teaching = [
+            TeachingStats(course, professors[pk], *values, most_helpful_review=helpful.get(pk))
+            for pk, values in stats.items() if pk in professors
+        ]
+        for entry in teaching:
+            if entry.most_helpful_review is not None:
+                entry.most_helpful_review.course = course
+                entry.most_helpful_review.professor = entry.professor
+        teaching.sort(key=lambda entry: (-entry.review_count, entry.professor.name))
+        return CoursePage(course, reviews, has_more, teaching)
+
+    return _cached(_cache_key('course', first, course), build)
+
+
+def professor_course_page(slug, course_code, reviews_first=20):
+    """
+    The ProfessorCoursePage of one professor's reviews of one course, or
+    None when either does not exist.
+    """
+    professor = get_professor(slug=slug)
+    course = get_course(course_code)
+    if professor is None or course is None:
+        return None
+    first = _reviews_first(reviews_first)
+
+    def build():
+        professor_reviews = Review.objects.using(DEFAULT_DB_ALIAS).filter(professor=professor)
+        reviews, has_more = _review_page(professor_reviews.filter(course=course), first)
+        for review in reviews:
+            review.course, review.professor = course, professor
+
+        stats = _stats(professor_reviews, 'course_id')
+        courses = (
+            Course.objects.using(DEFAULT_DB_ALIAS).select_related('department')
+            .in_bulk([pk for pk in stats if pk != course.pk])
+        )
+        this = stats.get(course.pk, (0, None, None, None))
+        others = [
+            TeachingStats(courses[pk], professor, *values, most_helpful_review=None)
+            for pk, values in stats.items() if pk in courses
+        ]
+        others.sort(key=lambda entry: entry.course.code)
+        return ProfessorCoursePage(
+            professor, course, TeachingStats(course, professor, *this, most_helpful_review=None),
+            reviews, has_more, others,
+        )
+
+    return _cached(_cache_key('professor-course', first, professor, course), build)
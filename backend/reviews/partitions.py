@@ -0,0 +1,297 @@
+"""
+PostgreSQL range partitioning of reviews by academic year.
+
+``convert`` turns ``reviews_review`` into a table partitioned on
+``created_at``, with one partition per academic year (``reviews_review_ay2024``
+holds reviews from July 2024 to June 2025, see
+``REVIEW_ACADEMIC_YEAR_START_MONTH``) and a default partition that catches
+anything outside them. The indexes on ``course``, ``professor`` and
+``created_at`` become per-partition indexes, so the ones new reviews touch
+stay the size of one year and autovacuum works on one year at a time.
+
+``ensure_partitions`` creates upcoming years ahead of time and
+``archive_partition`` writes an old year to gzipped NDJSON, detaches it and
+drops it. Both are run by the ``partition_reviews`` command.
+
+The table's primary key becomes ``(id, created_at)``, as PostgreSQL requires
+the partition key in every unique constraint. Django keeps treating ``id``
+as the primary key (ids still come from one sequence). With no unique ``id``
+left to reference, ``convert`` drops the foreign key constraints of the
+tables pointing at reviews (comment buckets, pending reviews); the ORM still
+cascades deletes. Databases that are never converted keep them.
+
+Only queries bounded on ``created_at`` skip partitions, as archiving does
+through ``Review.objects.created_between``. The site's own queries look
+reviews up by course or professor without such a bound, so they probe the
+``course``/``professor`` index of every year; what partitioning buys them is
+small per-year indexes and vacuums, and cheap archiving of old years.
+"""
+import gzip
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from . import aggregates
+from .cache import bump_version
+from .export import field_names
+from .models import CommentBucket, Course, PendingReview, Professor, Review
+
+TABLE = Review._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf'^{TABLE}_ay(\d{{4}})$')
+
+
+class PartitionError(Exception):
+    pass
+
+
+def academic_year(moment):
+    """The academic year (by its starting calendar year) ``moment`` falls in."""
+    start_month = settings.REVIEW_ACADEMIC_YEAR_START_MONTH
+    return moment.year if moment.month >= start_month else moment.year - 1
+
+
+def year_bounds(year):
+    """``[start, end)`` of academic year ``year`` in UTC."""
+    start_month = settings.REVIEW_ACADEMIC_YEAR_START_MONTH
+    return (
+        datetime(year, start_month, 1, tzinfo=dt_timezone.utc),
+        datetime(year + 1, start_month, 1, tzinfo=dt_timezone.utc),
+    )
+
+
+def partition_name(year):
+    return f"{TABLE}_ay{year}"
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _require_postgresql():
+    if connection.vendor != 'postgresql':
+        raise PartitionError("Review partitioning requires PostgreSQL")
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """``{year: partition name}`` of the attached academic-year partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return {int(match.group(1)): name for name in names if (match := PARTITION_NAME.match(name))}
+
+
+def _create_partition(cursor, year):
+    start, end = year_bounds(year)
+    cursor.execute(
+        f"CREATE TABLE {_quote(partition_name(year))} PARTITION OF {_quote(TABLE)} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def convert(ahead=1):
+    """
+    Rebuild ``reviews_review`` as a partitioned table, copying every row.
+    Holds an exclusive lock on reviews for the duration; run it in a
+    maintenance window.
+    """
+    _require_postgresql()
+    if is_partitioned():
+        raise PartitionError(f"{TABLE} is already partitioned")
+
+    legacy = f"{TABLE}_legacy"
+    sequence = f"{TABLE}_id_seq"
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Deferred foreign key checks still pending from earlier writes in
+        # the transaction would block the ALTER TABLEs below.
+        connection.check_constraints()
+        cursor.execute(f"LOCK TABLE {_quote(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s))",
+            [TABLE, TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+            "WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        referencing = cursor.fetchall()
+        cursor.execute(
+            f"SELECT MIN(created_at), COALESCE(MAX(id), 0) FROM {_quote(TABLE)}"
+        )
+        oldest, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {_quote(TABLE)} RENAME TO {_quote(legacy)}")
+        for name, table in referencing:
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {_quote(name)}")
+
+        # Identity columns need PostgreSQL 17 on partitioned tables; use a
+        # plain sequence owned by the column instead.
+        cursor.execute(f"ALTER TABLE {_quote(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {_quote(sequence)}")
+        cursor.execute("SELECT setval(%s, %s, %s)", [sequence, max(max_id, 1), max_id > 0])
+        cursor.execute(
+            f"CREATE TABLE {_quote(TABLE)} (LIKE {_quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(
+            f"ALTER TABLE {_quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)"
+        )
+        cursor.execute(f"ALTER SEQUENCE {_quote(sequence)} OWNED BY {_quote(TABLE)}.id")
+        cursor.execute(f"ALTER TABLE {_quote(TABLE)} ADD PRIMARY KEY (id, created_at)")
+
+        current = academic_year(timezone.now())
+        first = academic_year(oldest) if oldest else current
+        for year in range(first, current + ahead + 1):
+            _create_partition(cursor, year)
+        cursor.execute(f"CREATE TABLE {_quote(DEFAULT_PARTITION)} PARTITION OF {_quote(TABLE)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {_quote(TABLE)} SELECT * FROM {_quote(legacy)}")
+        cursor.execute(f"DROP TABLE {_quote(legacy)}")
+
+        # Recreate the indexes and foreign keys under their old names; they
+        # cascade to every partition. The definitions were read before the
+        # rename, so they already name the new table.
+        for name, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {_quote(TABLE)} ADD CONSTRAINT {_quote(name)} {definition}")
+    return partitions()
+
+
+def ensure_partitions(ahead=1):
+    """
+    Create the partitions of the current and the next ``ahead`` academic
+    years. Rows that already landed in the default partition move into
+    the new partition. Returns the names created.
+    """
+    _require_postgresql()
+    if not is_partitioned():
+        raise PartitionError(f"{TABLE} is not partitioned; run partition_reviews --convert first")
+
+    existing = partitions()
+    current = academic_year(timezone.now())
+    created = []
+    for year in range(current, current + ahead + 1):
+        if year in existing:
+            continue
+        start, end = year_bounds(year)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {_quote(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s)",
+                [start, end],
+            )
+            stranded = cursor.fetchone()[0]
+            if stranded:
+                cursor.execute(f"ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(DEFAULT_PARTITION)}")
+            _create_partition(cursor, year)
+            if stranded:
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {_quote(DEFAULT_PARTITION)} "
+                    f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                    f"INSERT INTO {_quote(TABLE)} SELECT * FROM moved",
+                    [start, end],
+                )
+                cursor.execute(
+                    f"ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(DEFAULT_PARTITION)} DEFAULT"
+                )
+        created.append(partition_name(year))
+    return created
+
+
+def archive_path(year, archive_dir=None):
+    return Path(archive_dir or settings.REVIEW_ARCHIVE_DIR) / f"reviews-ay{year}.ndjson.gz"
+
+
+def archive_partition(year, archive_dir=None, drop=True, chunk_size=2000):
+    """
+    Write academic year ``year`` to gzipped NDJSON (the export format),
+    detach its partition and remove what referenced its reviews: comment
+    buckets, pending-review links and their share of the stored aggregates.
+    The partition table is dropped unless ``drop`` is False. Returns
+    ``(path, row_count)``.
+    """
+    _require_postgresql()
+    name = partitions().get(year)
+    if name is None:
+        raise PartitionError(f"No partition for academic year {year}")
+
+    path = archive_path(year, archive_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    start, end = year_bounds(year)
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    rows = 0
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Readers carry on; writes to this year wait until it is detached.
+            cursor.execute(f"LOCK TABLE {_quote(name)} IN SHARE MODE")
+        try:
+            with gzip.open(tmp, 'wt', encoding='utf-8') as archive:
+                queryset = Review.objects.created_between(start, end).order_by('pk').values(*field_names(Review))
+                for row in queryset.iterator(chunk_size=chunk_size):
+                    row['_model'] = 'reviews'
+                    archive.write(encoder.encode(row) + '\n')
+                    rows += 1
+            os.replace(tmp, path)
+        except BaseException:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(name)}")
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT array_agg(DISTINCT course_id), array_agg(DISTINCT professor_id) FROM {_quote(name)}"
+            )
+            course_ids, professor_ids = cursor.fetchone()
+        archived = RawSQL(f"SELECT id FROM {_quote(name)}", [])
+        CommentBucket.objects.filter(review__in=archived).delete()
+        PendingReview.objects.filter(review__in=archived).update(review=None)
+        aggregates.recompute(
+            course_ids=set(course_ids or ()), professor_ids={pk for pk in professor_ids or () if pk},
+        )
+        transaction.on_commit(lambda: [bump_version(model) for model in (Review, Course, Professor)])
+
+    if drop:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {_quote(name)}")
+    return path, rows
+
+
+def expired_years(retain_years):
+    """Attached academic years older than the newest ``retain_years``."""
+    current = academic_year(timezone.now())
+    return sorted(year for year in partitions() if year <= current - retain_years)
@@ -0,0 +1,161 @@
+"""
+Write-behind queue for review submissions.
+
+With ``REVIEW_INGEST_MODE = 'async'`` the mutations validate a submission,
+store it as a PendingReview row (the outbox) and return right away. The
+``process_review_queue`` command drains the outbox in batches: one bulk
+insert, coalesced aggregate updates and the outbox status change share a
+transaction, so a crashed worker leaves its batch pending and the next run
+picks it up again (at-least-once delivery).
+
+The worker publishes the queue depth after every batch and every idle poll.
+Submissions are only queued while that report is fresher than
+``REVIEW_QUEUE_STATS_MAX_AGE`` seconds and under ``REVIEW_QUEUE_MAX_DEPTH``;
+with no worker reporting, they are written directly.
+
+Submitters poll ``pendingReview(token)`` with the random token the mutation
+returned, not the row id.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import PendingReview, Review
+from .submission import check_batch_size, create_reviews, prepare_reviews, save_reviews
+
+STATS_KEY = 'review-queue-stats'
+
+
+def _stats_cache():
+    return caches[getattr(settings, 'ENTITY_CACHE_ALIAS', 'entities')]
+
+
+def async_enabled():
+    """True when submissions should be queued rather than written directly."""
+    if getattr(settings, 'REVIEW_INGEST_MODE', 'sync') != 'async':
+        return False
+    stats = _stats_cache().get(STATS_KEY) or {}
+    # A stale report means no worker is draining the queue.
+    if time.time() - stats.get('updated_at', 0) > settings.REVIEW_QUEUE_STATS_MAX_AGE:
+        return False
+    # Backpressure: past the depth limit, writers slow down to the worker's pace.
+    return stats.get('depth', 0) < getattr(settings, 'REVIEW_QUEUE_MAX_DEPTH', 10000)
+
+
+def enqueue(reviews):
+    """Store unsaved, validated reviews in the outbox and return their tokens."""
+    pending = PendingReview.objects.bulk_create([
+        PendingReview(
+            course=review.course,
+            professor=review.professor,
+            rating=review.rating,
+            workload=review.workload,
+            difficulty=review.difficulty,
+            comment=review.comment,
+        )
+        for review in reviews
+    ])
+    return [row.token for row in pending]
+
+
+def submit(inputs):
+    """
+    Validate ``inputs`` and either queue them or write them directly.
+    Returns ``(reviews, pending_tokens, errors)``; exactly one of the first two
+    is non-empty on success.
+    """
+    if not async_enabled():
+        reviews, errors = create_reviews(inputs)
+        return reviews, [], errors
+
+    errors = check_batch_size(inputs)
+    if errors:
+        return [], [], errors
+    reviews, errors = prepare_reviews(inputs)
+    if errors:
+        return [], [], errors
+    return [], enqueue(reviews), []
+
+
+def _claim(batch_size):
+    queryset = PendingReview.objects.filter(status=PendingReview.STATUS_PENDING).order_by('id')
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    return list(queryset[:batch_size])
+
+
+def _to_review(row):
+    return Review(
+        course_id=row.course_id,
+        professor_id=row.professor_id,
+        rating=row.rating,
+        workload=row.workload,
+        difficulty=row.difficulty,
+        comment=row.comment,
+    )
+
+
+def _mark_done(rows, reviews):
+    now = timezone.now()
+    for row, review in zip(rows, reviews):
+        row.status = PendingReview.STATUS_DONE
+        row.review_id = review.pk
+        row.processed_at = now
+        row.attempts += 1
+    PendingReview.objects.bulk_update(rows, ['status', 'review', 'processed_at', 'attempts'])
+
+
+def _process_one_by_one(rows):
+    """Fallback when a batch fails: isolate the rows that cannot be written."""
+    max_attempts = getattr(settings, 'REVIEW_QUEUE_MAX_ATTEMPTS', 5)
+    done = 0
+    for row in rows:
+        try:
+            with transaction.atomic():
+                review = _to_review(row)
+                save_reviews([review])
+                _mark_done([row], [review])
+            done += 1
+        except DatabaseError as e:
+            row.attempts += 1
+            row.last_error = str(e)
+            if row.attempts >= max_attempts:
+                row.status = PendingReview.STATUS_FAILED
+            row.save(update_fields=['attempts', 'last_error', 'status'])
+    return done
+
+
+def process_batch(batch_size=500):
+    """Move up to ``batch_size`` pending submissions into Review. Returns the count."""
+    with transaction.atomic():
+        rows = _claim(batch_size)
+        if not rows:
+            return 0
+        reviews = [_to_review(row) for row in rows]
+        try:
+            with transaction.atomic():
+                save_reviews(reviews)
+                _mark_done(rows, reviews)
+            return len(rows)
+        except DatabaseError:
+            return _process_one_by_one(rows)
+
+
+def queue_stats():
+    """Depth and age of the outbox, as reported to the mutations."""
+    pending = PendingReview.objects.filter(status=PendingReview.STATUS_PENDING)
+    oldest = pending.order_by('id').values_list('created_at', flat=True).first()
+    return {
+        'depth': pending.count(),
+        'oldest_age_seconds': round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0,
+        'failed': PendingReview.objects.filter(status=PendingReview.STATUS_FAILED).count(),
+    }
+
+
+def publish_stats(**extra):
+    stats = dict(queue_stats(), updated_at=time.time(), **extra)
+    _stats_cache().set(STATS_KEY, stats, timeout=None)
+    return stats
@@ -1,6 +1,36 @@
+from collections import namedtuple
+
 import graphene
 from graphene_django import DjangoObjectType, DjangoConnectionField
-from .models import Course, Professor, Review, Department
+from django.conf import settings
+
+from .models import Course, CourseAlias, CourseSimilarity, Professor, Review, Department, PendingReview
+from . import keywords, loaders, pages, queue
+from .selections import optimize, prefetched
+
+
+# HTTP cache hints for GET queries (see huskyden.http_cache), keyed by
+# GraphQL type name or "Type.field". ``max_age`` is in seconds and the
+# smallest hint an operation touches wins. ``models`` lists tables a
+# computed field reads besides the type's own model, so writes to them
+# change the ETag.
+CacheHint = namedtuple('CacheHint', ['max_age', 'models'], defaults=[()])
+
+CACHE_HINTS = {
+    'DepartmentType': CacheHint(max_age=3600),
+    'CourseType': CacheHint(max_age=300),
+    'CourseType.avgRating': CacheHint(max_age=60, models=(Review,)),
+    'CourseType.avgWorkload': CacheHint(max_age=60, models=(Review,)),
+    'CourseType.avgDifficulty': CacheHint(max_age=60, models=(Review,)),
+    'CourseType.similarCourses': CacheHint(max_age=300, models=(CourseSimilarity,)),
+    'CourseAliasType': CacheHint(max_age=300),
+    'ProfessorType': CacheHint(max_age=300),
+    'ProfessorType.avgRating': CacheHint(max_age=60, models=(Review,)),
+    'ReviewType': CacheHint(max_age=60),
+    'TeachingStatsType': CacheHint(max_age=60, models=(Review,)),
+    'CoursePageType': CacheHint(max_age=60, models=(Review,)),
+    'ProfessorCoursePageType': CacheHint(max_age=60, models=(Review,)),
+}
 
 
 class DepartmentType(DjangoObjectType):
@@ -10,24 +40,56 @@ class DepartmentType(DjangoObjectType):
         interfaces = (graphene.relay.Node,)
 
 
+class CourseAliasType(DjangoObjectType):
+    class Meta:
+        model = CourseAlias
+        fields = ("code",)
+
+
+class KeywordType(graphene.ObjectType):
+    term = graphene.String()
+    review_count = graphene.Int(description="Reviews whose comment uses the term")
+
+
+def keywords_field():
+    return graphene.List(
+        KeywordType,
+        first=graphene.Int(default_value=5),
+        description="Most distinctive terms of the review comments (computed by summarize_reviews)",
+    )
+
+
 class CourseType(DjangoObjectType):
     avg_rating = graphene.Float()
     avg_workload = graphene.Float()
     avg_difficulty = graphene.Float()
     reviews = graphene.List(lambda: ReviewType)
+    similar_courses = graphene.List(
+        lambda: CourseType,
+        first=graphene.Int(default_value=5),
+        description="Most similar courses, best first (precomputed by build_course_similarity)",
+    )
+    keywords = keywords_field()
     
     class Meta:
         model = Course
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
-        filter_fields = {
-            "code": ["exact", "icontains"],
-            "title": ["icontains"],
-            "department__code": ["exact"],
-        }
     
     def resolve_reviews(self, info):
-        return self.reviews.all()
+        if prefetched(self, 'reviews'):
+            return self.reviews.all()
+        # The related manager sets review.course from the course_id column.
+        return optimize(self.reviews.all(), info, required=('course',))
+    
+    def resolve_similar_courses(self, info, first=5):
+        # An explicit null gets the default too.
+        first = max(0, min(5 if first is None else first, settings.COURSE_SIMILARITY_TOP_K))
+        queryset = Course.objects.filter(neighbour_of__course=self.pk).order_by('neighbour_of__rank')
+        return optimize(queryset, info)[:first]
+    
+    def resolve_keywords(self, info, first=5):
+        return [KeywordType(term=term, review_count=count) for term, count in keywords.top_terms(self, first)]
     
     def resolve_avg_rating(self, info):
         return self.avg_rating
@@ -42,32 +104,65 @@ class CourseType(DjangoObjectType):
 class ProfessorType(DjangoObjectType):
     avg_rating = graphene.Float()
     reviews = graphene.List(lambda: ReviewType)
+    keywords = keywords_field()
     
     class Meta:
         model = Professor
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
-        filter_fields = {
-            "name": ["icontains"],
-            "department__code": ["exact"],
-        }
     
     def resolve_avg_rating(self, info):
         return self.avg_rating
     
     def resolve_reviews(self, info):
-        return self.reviews.all()
+        if prefetched(self, 'reviews'):
+            return self.reviews.all()
+        return optimize(self.reviews.all(), info, required=('professor',))
+    
+    def resolve_keywords(self, info, first=5):
+        return [KeywordType(term=term, review_count=count) for term, count in keywords.top_terms(self, first)]
 
 
 class ReviewType(DjangoObjectType):
     class Meta:
         model = Review
-        fields = "__all__"
+        exclude = ("comment_signature",)
         interfaces = (graphene.relay.Node,)
-        filter_fields = {
-            "course__code": ["exact"],
-            "professor__id": ["exact"],
-        }
+
+
+class TeachingStatsType(graphene.ObjectType):
+    """One professor's reviews of one course"""
+    course = graphene.Field(CourseType)
+    professor = graphene.Field(ProfessorType)
+    review_count = graphene.Int()
+    avg_rating = graphene.Float()
+    avg_workload = graphene.Float()
+    avg_difficulty = graphene.Float()
+    most_helpful_review = graphene.Field(
+        ReviewType, description="Newest review with a comment (course pages only)",
+    )
+
+
+class CoursePageType(graphene.ObjectType):
+    course = graphene.Field(CourseType)
+    reviews = graphene.List(ReviewType, description="Newest reviews, reviewsFirst of them")
+    has_more_reviews = graphene.Boolean()
+    professors = graphene.List(TeachingStatsType, description="Professors reviewed for the course, most reviews first")
+
+
+class ProfessorCoursePageType(graphene.ObjectType):
+    professor = graphene.Field(ProfessorType)
+    course = graphene.Field(CourseType)
+    stats = graphene.Field(TeachingStatsType, description="The professor's reviews of this course")
+    reviews = graphene.List(ReviewType, description="Newest reviews of the course by the professor")
+    has_more_reviews = graphene.Boolean()
+    other_courses = graphene.List(TeachingStatsType, description="The professor's other reviewed courses")
+
+
+class PendingReviewType(DjangoObjectType):
+    class Meta:
+        model = PendingReview
+        fields = ("token", "status", "review", "last_error", "created_at", "processed_at")
 
 
 class CreateReviewInput(graphene.InputObjectType):
@@ -84,47 +179,39 @@ class CreateReview(graphene.Mutation):
         input = CreateReviewInput(required=True)
     
     review = graphene.Field(ReviewType)
+    pending_token = graphene.String(
+        description="Set instead of review when the submission was queued; poll pendingReview with it",
+    )
     success = graphene.Boolean()
     errors = graphene.List(graphene.String)
     
     def mutate(self, info, input):
-        errors = []
-        
-        try:
-            course = Course.objects.get(code=input.course_code)
-        except Course.DoesNotExist:
-            errors.append(f"Course {input.course_code} not found")
-            return CreateReview(success=False, errors=errors, review=None)
-        
-        professor = None
-        if input.professor_id:
-            try:
-                professor = Professor.objects.get(id=input.professor_id)
-            except Professor.DoesNotExist:
-                errors.append(f"Professor with id {input.professor_id} not found")
-                return CreateReview(success=False, errors=errors, review=None)
-        
-        # Validate rating values
-        if not (1 <= input.rating <= 5):
-            errors.append("Rating must be between 1 and 5")
-        if not (1 <= input.workload <= 5):
-            errors.append("Workload must be between 1 and 5")
-        if not (1 <= input.difficulty <= 5):
-            errors.append("Difficulty must be between 1 and 5")
-        
+        reviews, pending_tokens, errors = queue.submit([input])
         if errors:
             return CreateReview(success=False, errors=errors, review=None)
-        
-        review = Review.objects.create(
-            course=course,
-            professor=professor,
-            rating=input.rating,
-            workload=input.workload,
-            difficulty=input.difficulty,
-            comment=input.comment or "",
-        )
-        
-        return CreateReview(success=True, errors=[], review=review)
+        if pending_tokens:
+            return CreateReview(success=True, errors=[], review=None, pending_token=pending_tokens[0])
+        return CreateReview(success=True, errors=[], review=reviews[0])
+
+
+class CreateReviews(graphene.Mutation):
+    """Create several reviews in one transaction; all or nothing."""
+
+    class Arguments:
+        inputs = graphene.List(graphene.NonNull(CreateReviewInput), required=True)
+
+    reviews = graphene.List(ReviewType)
+    pending_tokens = graphene.List(
+        graphene.String, description="Set instead of reviews when the submissions were queued",
+    )
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+
+    def mutate(self, info, inputs):
+        reviews, pending_tokens, errors = queue.submit(inputs)
+        if errors:
+            return CreateReviews(success=False, errors=errors, reviews=[], pending_tokens=[])
+        return CreateReviews(success=True, errors=[], reviews=reviews, pending_tokens=pending_tokens)
 
 
 class Query(graphene.ObjectType):
@@ -142,39 +229,48 @@ class Query(graphene.ObjectType):
     # Department queries
     departments = DjangoConnectionField(DepartmentType)
     
+    # Page queries: everything one page shows, in a fixed number of SQL queries
+    course_page = graphene.Field(
+        CoursePageType, code=graphene.String(required=True), reviews_first=graphene.Int(default_value=20),
+    )
+    professor_course_page = graphene.Field(
+        ProfessorCoursePageType,
+        slug=graphene.String(required=True),
+        course_code=graphene.String(required=True),
+        reviews_first=graphene.Int(default_value=20),
+    )
+    
+    # Queued review submissions
+    pending_review = graphene.Field(PendingReviewType, token=graphene.String(required=True))
+    
     def resolve_course(self, info, code):
-        try:
-            return Course.objects.get(code=code)
-        except Course.DoesNotExist:
-            return None
+        return loaders.for_context(info.context).course(code)
     
     def resolve_courses(self, info, **kwargs):
-        return Course.objects.all()
+        return optimize(Course.objects.all(), info)
     
     def resolve_professor(self, info, id=None, slug=None):
-        try:
-            if slug:
-                return Professor.objects.get(slug=slug)
-            elif id:
-                return Professor.objects.get(id=id)
-            else:
-                return None
-        except Professor.DoesNotExist:
-            return None
+        return loaders.for_context(info.context).professor(id=id, slug=slug)
     
     def resolve_professors(self, info, **kwargs):
-        return Professor.objects.all()
+        return optimize(Professor.objects.all(), info)
     
     def resolve_reviews(self, info, **kwargs):
-        return Review.objects.all()
+        return optimize(Review.objects.all(), info)
     
     def resolve_departments(self, info, **kwargs):
-        return Department.objects.all()
+        return optimize(Department.objects.all(), info)
+    
+    def resolve_course_page(self, info, code, reviews_first=20):
+        return pages.course_page(code, reviews_first)
+    
+    def resolve_professor_course_page(self, info, slug, course_code, reviews_first=20):
+        return pages.professor_course_page(slug, course_code, reviews_first)
+    
+    def resolve_pending_review(self, info, token):
+        return PendingReview.objects.filter(token=token).first()
 
 
 class Mutation(graphene.ObjectType):
     create_review = CreateReview.Field()
-
-
-schema = graphene.Schema(query=Query, mutation=Mutation)
-
+    create_reviews = CreateReviews.Field()
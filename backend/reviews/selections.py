@@ -0,0 +1,151 @@
+"""
+Query-aware column selection for the GraphQL resolvers.
+
+``optimize(queryset, info)`` walks the fields the client selected and
+narrows the queryset to them: plain columns go to ``.only()``, forward
+foreign keys to ``select_related`` (with their own columns) and list fields
+backed by a reverse relation to a ``Prefetch`` that is optimized the same
+way. A listing that does not ask for ``description`` or ``comment`` never
+reads them.
+
+A selected field that maps to neither a model field nor an entry in
+``FIELD_COLUMNS`` leaves that model's columns unrestricted, so a new
+computed field can only cost performance, never correctness.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+# Model columns read by computed fields, keyed like reviews.schema.CACHE_HINTS
+FIELD_COLUMNS = {
+    'CourseType.avgRating': ('review_count', 'rating_sum'),
+    'CourseType.avgWorkload': ('review_count', 'workload_sum'),
+    'CourseType.avgDifficulty': ('review_count', 'difficulty_sum'),
+    'ProfessorType.avgRating': ('review_count', 'rating_sum'),
+}
+
+
+def _fields(selection_set, info):
+    """FieldNodes of a selection set, with fragments flattened."""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _fields(selection.selection_set, info)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _fields(fragment.selection_set, info)
+
+
+def _children(field_nodes, name, info):
+    return [node for parent in field_nodes for node in _fields(parent.selection_set, info) if node.name.value == name]
+
+
+@lru_cache(maxsize=None)
+def _python_names(graphene_type):
+    """GraphQL field name -> attribute name for a graphene object type."""
+    return {
+        getattr(field, 'name', None) or to_camel_case(attr): attr
+        for attr, field in graphene_type._meta.fields.items()
+    }
+
+
+def _graphene_type(graphql_type):
+    return getattr(get_named_type(graphql_type), 'graphene_type', None)
+
+
+class Plan:
+    def __init__(self):
+        self.only = set()
+        self.complete = True
+        self.select_related = set()
+        self.prefetch = []
+
+
+def _plan(graphql_type, field_nodes, info, plan, prefix=''):
+    """Add the columns and relations ``field_nodes`` need to ``plan``."""
+    graphene_type = _graphene_type(graphql_type)
+    model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+    if model is None:
+        plan.complete = False
+        return
+
+    names = _python_names(graphene_type)
+    object_type = get_named_type(graphql_type)
+    own_columns, complete = set(), True
+
+    for node in {node.name.value: node for parent in field_nodes for node in _fields(parent.selection_set, info)}.values():
+        name = node.name.value
+        if name.startswith('__') or name == 'id':
+            continue
+        columns = FIELD_COLUMNS.get(f"{object_type.name}.{name}")
+        if columns is not None:
+            own_columns.update(columns)
+            continue
+
+        try:
+            field = model._meta.get_field(names.get(name, name))
+        except FieldDoesNotExist:
+            complete = False
+            continue
+
+        nested_type = object_type.fields[name].type
+        nested_nodes = _children(field_nodes, name, info)
+        if field.many_to_one or (field.one_to_one and field.concrete):
+            own_columns.add(field.name)
+            plan.select_related.add(prefix + field.name)
+            _plan(nested_type, nested_nodes, info, plan, f"{prefix}{field.name}__")
+        elif field.one_to_many or field.many_to_many or field.one_to_one:
+            if 'edges' in getattr(get_named_type(nested_type), 'fields', {}):
+                # Connections page with their own query; nothing to prefetch.
+                continue
+            # Prefetching matches related rows on their foreign key column.
+            required = (field.field.name,) if field.one_to_many else ()
+            related = optimize(field.related_model.objects.all(), info, nested_type, nested_nodes, required)
+            plan.prefetch.append(Prefetch(prefix + field.get_accessor_name(), queryset=related))
+        elif field.concrete:
+            own_columns.add(field.name)
+        else:
+            complete = False
+
+    if complete:
+        plan.only.update(prefix + column for column in own_columns)
+    elif not prefix:
+        plan.complete = False
+
+
+def optimize(queryset, info, graphql_type=None, field_nodes=None, required=()):
+    """
+    Narrow ``queryset`` to the columns and relations selected under the
+    field being resolved, plus the ``required`` columns. Connection fields
+    are unwrapped to their nodes.
+    """
+    graphql_type = graphql_type or info.return_type
+    field_nodes = field_nodes if field_nodes is not None else info.field_nodes
+
+    named = get_named_type(graphql_type)
+    if 'edges' in getattr(named, 'fields', {}):
+        field_nodes = _children(_children(field_nodes, 'edges', info), 'node', info)
+        graphql_type = named.fields['edges'].type
+        graphql_type = get_named_type(graphql_type).fields['node'].type
+
+    plan = Plan()
+    _plan(graphql_type, field_nodes, info, plan)
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*plan.prefetch)
+    if plan.complete:
+        queryset = queryset.only('pk', *sorted(plan.only | set(required)))
+    return queryset
+
+
+def prefetched(instance, accessor):
+    """True if ``instance.<accessor>.all()`` will be served from a prefetch."""
+    return accessor in getattr(instance, '_prefetched_objects_cache', {})
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import aggregates, duplicates, events
+from .cache import bump_version
+from .models import Course, CourseAlias, Department, Professor, Review
+
+
+def bump_versions_on_commit(*models):
+    """Invalidate cached lookups once the current transaction commits."""
+    def bump():
+        for model in models:
+            bump_version(model)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Professor)
+@receiver(post_delete, sender=Professor)
+@receiver(post_save, sender=CourseAlias)
+@receiver(post_delete, sender=CourseAlias)
+def bump_entity_version(sender, **kwargs):
+    """Invalidate cached lookups for the model that was written."""
+    if sender is Department:
+        # Cached courses and professors carry their department along.
+        bump_versions_on_commit(Department, Course, Professor)
+    else:
+        bump_versions_on_commit(sender)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_owners(sender, instance, **kwargs):
+    duplicates.sign(instance)
+    if instance.pk and not instance._state.adding:
+        instance._previous_owners = (
+            Review.objects.filter(pk=instance.pk).values_list('course_id', 'professor_id').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_aggregates_on_save(sender, instance, created, **kwargs):
+    duplicates.index_reviews([instance], replace=not created)
+    if created:
+        aggregates.apply_reviews([instance])
+        events.publish_reviews_on_commit([instance])
+    else:
+        previous = getattr(instance, '_previous_owners', None) or (None, None)
+        aggregates.recompute(
+            course_ids={instance.course_id, previous[0]},
+            professor_ids={instance.professor_id, previous[1]},
+        )
+    # Stored totals live on cached courses and professors.
+    bump_versions_on_commit(Review, Course, Professor)
+
+
+@receiver(post_delete, sender=Review)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    aggregates.apply_reviews([instance], sign=-1)
+    bump_versions_on_commit(Review, Course, Professor)
@@ -0,0 +1,227 @@
+"""
+Precomputed "similar courses".
+
+``build`` scores every pair of courses by the cosine similarity of their
+TF-IDF vectors (title, description and department code) blended with how
+close their average rating, workload and difficulty are, and stores each
+course's ``COURSE_SIMILARITY_TOP_K`` best neighbours in ``CourseSimilarity``.
+Pages read them with one indexed query; nothing is computed per request.
+
+Scores are computed ``block_size`` courses at a time against the whole
+catalog, so memory stays at ``block_size x courses`` floats. A course is
+recomputed only when its fingerprint (text, department and rounded
+averages) changes; the other courses then merge the changed courses into
+their lists instead of being recomputed. IDF weights drift slightly
+between incremental runs, so run with ``--full`` now and then.
+
+NumPy and SciPy are imported by the build only, not by the web workers.
+"""
+import hashlib
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_version
+from .models import Course, CourseSimilarity, CourseSimilarityState
+
+TOKEN = re.compile(r'[a-z][a-z0-9]+')
+STOP_WORDS = frozenset('''
+    a an and are as at be by for from has in into is it its of on or that the
+    their this to with will students course courses topics include including
+    introduction intro offered credit credits prerequisite prerequisites
+    also may other use using via
+'''.split())
+# Title words say more about a course than description words
+TITLE_WEIGHT = 2
+
+
+def tokens(course):
+    words = Counter()
+    for word in TOKEN.findall((course.title or '').lower()):
+        if word not in STOP_WORDS:
+            words[word] += TITLE_WEIGHT
+    for word in TOKEN.findall((course.description or '').lower()):
+        if word not in STOP_WORDS:
+            words[word] += 1
+    words[f"dept:{course.department.code.lower()}"] += 1
+    return words
+
+
+def profile(course):
+    """Averages scaled to 0-1, or None for a course without reviews."""
+    if not course.review_count:
+        return None
+    return [(course.avg_rating - 1) / 4, (course.avg_workload - 1) / 4, (course.avg_difficulty - 1) / 4]
+
+
+def fingerprint(course):
+    parts = [
+        course.title, course.description, course.department_id,
+        course.avg_rating, course.avg_workload, course.avg_difficulty,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def vectorize(courses):
+    """
+    ``(tfidf, profiles, has_profile)``: L2-normalized sparse TF-IDF rows
+    (sublinear term frequency, terms used by at least two courses) and the
+    rating profiles as an ``n x 3`` array with its presence mask.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary, rows, columns, values = {}, [], [], []
+    for row, course in enumerate(courses):
+        for term, count in tokens(course).items():
+            rows.append(row)
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+            values.append(1 + math.log(count))
+
+    n = len(courses)
+    tfidf = sparse.csr_matrix(
+        (np.array(values, dtype=np.float32), (rows, columns)), shape=(n, len(vocabulary)),
+    )
+    document_frequency = np.bincount(np.array(columns, dtype=np.int64), minlength=len(vocabulary))
+    idf = np.log((1 + n) / (1 + document_frequency)) + 1
+    # A term in a single course cannot make two courses similar.
+    idf[document_frequency < 2] = 0
+    tfidf = tfidf.multiply(idf.astype(np.float32)).tocsr()
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    tfidf = sparse.diags((1 / norms).astype(np.float32)) @ tfidf
+
+    profiles = [profile(course) for course in courses]
+    has_profile = np.array([p is not None for p in profiles])
+    profiles = np.array([p or [0, 0, 0] for p in profiles], dtype=np.float32).reshape(n, 3)
+    return tfidf.tocsr(), profiles, has_profile
+
+
+def block_scores(vectors, rows):
+    """Dense ``len(rows) x n`` similarity scores of ``rows`` to every course."""
+    import numpy as np
+
+    tfidf, profiles, has_profile = vectors
+    text = (tfidf[rows] @ tfidf.T).toarray()
+    distance = np.sqrt(((profiles[rows, None, :] - profiles[None, :, :]) ** 2).sum(axis=2)) / math.sqrt(3)
+    weight = settings.COURSE_SIMILARITY_PROFILE_WEIGHT
+    both = has_profile[rows, None] & has_profile[None, :]
+    scores = np.where(both, (1 - weight) * text + weight * (1 - distance), text)
+    # Rating profiles alone do not make courses related.
+    scores[text <= 0] = 0
+    scores[np.arange(len(rows)), rows] = 0
+    return scores
+
+
+def top_neighbours(scores, top_k):
+    """``[(column, score), ...]`` best first for each row of ``scores``."""
+    import numpy as np
+
+    minimum = settings.COURSE_SIMILARITY_MIN_SCORE
+    k = min(top_k, scores.shape[1] - 1)
+    if k <= 0:
+        return [[] for _ in range(scores.shape[0])]
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    result = []
+    for row, columns in enumerate(candidates):
+        ordered = columns[np.argsort(-scores[row, columns], kind='stable')]
+        result.append([(int(column), float(scores[row, column])) for column in ordered if scores[row, column] >= minimum])
+    return result
+
+
+def _write(lists, states):
+    with transaction.atomic():
+        CourseSimilarity.objects.filter(course_id__in=list(lists)).delete()
+        CourseSimilarity.objects.bulk_create([
+            CourseSimilarity(course_id=course_id, similar_id=similar_id, rank=rank, score=round(score, 4))
+            for course_id, neighbours in lists.items()
+            for rank, (similar_id, score) in enumerate(neighbours)
+        ], batch_size=2000)
+        CourseSimilarityState.objects.filter(course_id__in=list(states)).delete()
+        CourseSimilarityState.objects.bulk_create(
+            [CourseSimilarityState(course_id=course_id, fingerprint=value) for course_id, value in states.items()],
+            batch_size=2000,
+        )
+
+
+def build(full=False, block_size=256):
+    """
+    Recompute neighbours of changed courses (every course with ``full``) and
+    merge them into the other courses' lists. Returns
+    ``{'courses', 'changed', 'updated'}`` counts.
+    """
+    import numpy as np
+
+    top_k = settings.COURSE_SIMILARITY_TOP_K
+    courses = list(
+        Course.objects.select_related('department')
+        .only('title', 'description', 'department__code', 'review_count', 'rating_sum', 'workload_sum', 'difficulty_sum')
+        .order_by('pk')
+    )
+    pks = [course.pk for course in courses]
+    fingerprints = {course.pk: fingerprint(course) for course in courses}
+    stored = {} if full else dict(CourseSimilarityState.objects.values_list('course_id', 'fingerprint'))
+    changed = [row for row, pk in enumerate(pks) if stored.get(pk) != fingerprints[pk]]
+    if not changed:
+        return {'courses': len(courses), 'changed': 0, 'updated': 0}
+
+    vectors = vectorize(courses)
+    changed_pks = {pks[row] for row in changed}
+
+    # The current lists of unchanged courses and the score a changed course
+    # has to beat to enter them (0 while a list has room).
+    existing = defaultdict(list)
+    if not full:
+        for course_id, similar_id, score in (
+            CourseSimilarity.objects.exclude(course_id__in=changed_pks)
+            .order_by('course_id', 'rank').values_list('course_id', 'similar_id', 'score')
+        ):
+            existing[course_id].append((similar_id, score))
+    entry_score = np.array([
+        existing[pk][-1][1] if len(existing[pk]) >= top_k else 0.0 for pk in pks
+    ], dtype=np.float32)
+
+    lists = {}
+    offers = defaultdict(list)
+    for start in range(0, len(changed), block_size):
+        rows = changed[start:start + block_size]
+        scores = block_scores(vectors, rows)
+        for row, neighbours in zip(rows, top_neighbours(scores, top_k)):
+            lists[pks[row]] = [(pks[column], score) for column, score in neighbours]
+        if not full:
+            # Similarity is symmetric: column j of a changed row is the
+            # changed course's score as a neighbour of course j.
+            minimum = settings.COURSE_SIMILARITY_MIN_SCORE
+            qualifies = (scores >= np.maximum(entry_score, minimum)[None, :]) & (scores > 0)
+            for block_row, column in zip(*np.nonzero(qualifies)):
+                offers[pks[column]].append((pks[rows[block_row]], float(scores[block_row, column])))
+
+    if not full:
+        recompute = []
+        for row, pk in enumerate(pks):
+            if pk in changed_pks:
+                continue
+            current = existing.get(pk, [])
+            kept = [(similar_id, score) for similar_id, score in current if similar_id not in changed_pks]
+            if len(kept) == len(current) and not offers.get(pk):
+                continue
+            if len(current) >= top_k and len(kept) + len(offers.get(pk, ())) < top_k:
+                # A changed course dropped out of a full list; the course that
+                # would replace it is unknown, so score this course again.
+                recompute.append(row)
+                continue
+            merged = sorted(kept + offers.get(pk, []), key=lambda item: -item[1])[:top_k]
+            if merged != current:
+                lists[pk] = merged
+        for start in range(0, len(recompute), block_size):
+            rows = recompute[start:start + block_size]
+            for row, neighbours in zip(rows, top_neighbours(block_scores(vectors, rows), top_k)):
+                lists[pks[row]] = [(pks[column], score) for column, score in neighbours]
+
+    _write(lists, {pk: fingerprints[pk] for pk in changed_pks})
+    bump_version(CourseSimilarity)
+    return {'courses': len(courses), 'changed': len(changed_pks), 'updated': len(lists)}
@@ -0,0 +1,59 @@
+"""
+Unique slug allocation for Professor.
+
+Instead of probing ``slug``, ``slug-1``, ``slug-2``... one query per
+candidate, the next free suffix is read in a single aggregate over the
+``slug`` index: every existing slug that is ``base`` or ``base-<n>``
+contributes its suffix and the allocator takes ``max + 1``. Suffixes longer
+than ``MAX_SUFFIX_DIGITS`` are ignored so the cast cannot overflow.
+"""
+import re
+
+from django.db.models import BigIntegerField, Case, Max, Q, Value, When
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+FALLBACK_SLUG = 'professor'
+MAX_SUFFIX_DIGITS = 9
+
+
+def base_slug(name, max_length=200):
+    # Leave room for a "-<n>" suffix within the column length.
+    return (slugify(name) or FALLBACK_SLUG)[:max_length - 8].strip('-') or FALLBACK_SLUG
+
+
+def _taken_suffix(model, base, exclude_pk=None):
+    """
+    Highest suffix in use for ``base``: None if the base is free, 0 if only
+    the bare base is taken, n if ``base-n`` is the largest taken slug. The
+    row ``exclude_pk`` (the one being saved) does not count.
+    """
+    suffix_pattern = rf'^{re.escape(base)}-[0-9]{{1,{MAX_SUFFIX_DIGITS}}}$'
+    queryset = model.objects.filter(slug__startswith=base)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return (
+        queryset
+        .filter(Q(slug=base) | Q(slug__regex=suffix_pattern))
+        .aggregate(
+            taken=Max(
+                Case(
+                    When(slug=base, then=Value(0)),
+                    default=Cast(Substr('slug', len(base) + 2), BigIntegerField()),
+                    output_field=BigIntegerField(),
+                )
+            )
+        )['taken']
+    )
+
+
+def _with_suffix(base, suffix):
+    return base if suffix == 0 else f"{base}-{suffix}"
+
+
+def next_free_slug(model, name, exclude_pk=None):
+    """Return an unused slug for ``name`` using one query."""
+    base = base_slug(name)
+    taken = _taken_suffix(model, base, exclude_pk)
+    return base if taken is None else _with_suffix(base, taken + 1)
+
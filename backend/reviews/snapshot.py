@@ -0,0 +1,244 @@
+"""
+Static catalog snapshot for the search page.
+
+``build_catalog_snapshot`` writes one JSON shard per department (its courses
+and professors with their review averages) and an ``index.json`` listing
+every department with counts, averages and the path of its shard. Shard
+names carry a hash of their content, so a CDN or Next.js can cache them
+forever; only ``index.json`` needs a short TTL.
+
+A department's shard is rebuilt only when its fingerprint changes: the
+newest ``updated_at`` of its courses, professors and their reviews plus the
+row counts and review totals, which also move when something is deleted.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Course, Department, Professor, Review
+
+INDEX_NAME = 'index.json'
+SHARD_DIR = 'departments'
+UNASSIGNED = '_unassigned'
+SNAPSHOT_VERSION = 1
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+def _write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _averages(owner):
+    return {
+        'avgRating': owner.avg_rating,
+        'avgWorkload': owner.avg_workload,
+        'avgDifficulty': owner.avg_difficulty,
+    }
+
+
+def _empty_state():
+    return {'watermark': None, 'courses': 0, 'professors': 0, 'course_reviews': 0, 'professor_reviews': 0}
+
+
+def department_states():
+    """
+    Fingerprint inputs per department id (None for professors without a
+    department), read with four grouped queries.
+    """
+    states = {}
+
+    def state(department_id):
+        return states.setdefault(department_id, _empty_state())
+
+    def advance(entry, updated_at):
+        if updated_at is not None and (entry['watermark'] is None or updated_at > entry['watermark']):
+            entry['watermark'] = updated_at
+
+    for row in Course.objects.values('department_id').annotate(
+        latest=Max('updated_at'), rows=Count('id'), reviews=Sum('review_count'),
+    ).order_by():
+        entry = state(row['department_id'])
+        entry['courses'] = row['rows']
+        entry['course_reviews'] = row['reviews'] or 0
+        advance(entry, row['latest'])
+
+    for row in Professor.objects.values('department_id').annotate(
+        latest=Max('updated_at'), rows=Count('id'), reviews=Sum('review_count'),
+    ).order_by():
+        entry = state(row['department_id'])
+        entry['professors'] = row['rows']
+        entry['professor_reviews'] = row['reviews'] or 0
+        advance(entry, row['latest'])
+
+    # A review changes its course's and its professor's averages, which may
+    # live in different departments.
+    reviews = {
+        'course__department_id': Review.objects.all(),
+        'professor__department_id': Review.objects.filter(professor__isnull=False),
+    }
+    for key, queryset in reviews.items():
+        for row in queryset.values(key).annotate(latest=Max('updated_at')).order_by():
+            if row[key] in states:
+                advance(states[row[key]], row['latest'])
+
+    return states
+
+
+def department_fingerprint(department, state):
+    parts = [
+        department.code if department else None,
+        department.name if department else None,
+        state['watermark'].isoformat() if state['watermark'] else None,
+        state['courses'], state['professors'],
+        state['course_reviews'], state['professor_reviews'],
+    ]
+    return hashlib.sha256(_dumps(parts)).hexdigest()[:16]
+
+
+def build_shard(department):
+    """The shard payload for ``department`` (None: unassigned professors)."""
+    aggregate_fields = ('review_count', 'rating_sum', 'workload_sum', 'difficulty_sum')
+    courses = (
+        Course.objects.filter(department=department)
+        .only('code', 'title', *aggregate_fields)
+        .order_by('code')
+        if department else Course.objects.none()
+    )
+    professors = (
+        Professor.objects.filter(department=department) if department
+        else Professor.objects.filter(department__isnull=True)
+    ).only('name', 'slug', *aggregate_fields).order_by('name')
+
+    return {
+        'department': {'code': department.code, 'name': department.name} if department else None,
+        'courses': [
+            {'code': course.code, 'title': course.title, 'reviewCount': course.review_count, **_averages(course)}
+            for course in courses
+        ],
+        'professors': [
+            {
+                'name': professor.name,
+                'slug': professor.slug,
+                'reviewCount': professor.review_count,
+                'avgRating': professor.avg_rating,
+            }
+            for professor in professors
+        ],
+    }
+
+
+def _index_entry(department, shard, state, fingerprint, path):
+    courses = shard['courses']
+    review_count = sum(course['reviewCount'] for course in courses)
+
+    def average(key):
+        # Weighted by each course's review count, like the stored totals.
+        weighted = [(course[key], course['reviewCount']) for course in courses if course[key] is not None]
+        total = sum(count for _, count in weighted)
+        return round(sum(value * count for value, count in weighted) / total, 1) if total else None
+
+    return {
+        'code': department.code if department else None,
+        'name': department.name if department else None,
+        'courseCount': len(courses),
+        'professorCount': len(shard['professors']),
+        'reviewCount': review_count,
+        'avgRating': average('avgRating'),
+        'avgWorkload': average('avgWorkload'),
+        'avgDifficulty': average('avgDifficulty'),
+        'shard': path,
+        'fingerprint': fingerprint,
+        'watermark': state['watermark'].isoformat() if state['watermark'] else None,
+    }
+
+
+def read_index(output_dir):
+    try:
+        return json.loads((Path(output_dir) / INDEX_NAME).read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def build_snapshot(output_dir, full=False):
+    """
+    Write changed shards and the index under ``output_dir``. Returns
+    ``{'built': [...], 'unchanged': [...], 'removed': [...]}`` of shard paths.
+    """
+    output_dir = Path(output_dir)
+    previous = read_index(output_dir) or {}
+    previous_entries = {
+        entry['code']: entry for entry in previous.get('departments', [])
+        if previous.get('version') == SNAPSHOT_VERSION
+    }
+
+    states = department_states()
+    departments = {department.pk: department for department in Department.objects.all()}
+    keys = sorted(departments, key=lambda pk: departments[pk].code)
+    if states.get(None, {}).get('professors'):
+        keys.append(None)
+
+    entries, built, unchanged = [], [], []
+    for pk in keys:
+        department = departments.get(pk)
+        state = states.get(pk) or _empty_state()
+        code = department.code if department else None
+        fingerprint = department_fingerprint(department, state)
+        old = previous_entries.get(code)
+
+        if not full and old and old.get('fingerprint') == fingerprint and (output_dir / old['shard']).exists():
+            entries.append(old)
+            unchanged.append(old['shard'])
+            continue
+
+        shard = build_shard(department)
+        content = _dumps(shard)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        path = f"{SHARD_DIR}/{code or UNASSIGNED}.{digest}.json"
+        if not (output_dir / path).exists():
+            _write_atomic(output_dir / path, content)
+        entries.append(_index_entry(department, shard, state, fingerprint, path))
+        built.append(path)
+
+    current = {entry['shard'] for entry in entries}
+    if built or set(previous_entries) != {entry['code'] for entry in entries}:
+        _write_atomic(output_dir / INDEX_NAME, _dumps({
+            'version': SNAPSHOT_VERSION,
+            'generatedAt': timezone.now().isoformat(),
+            'totals': {
+                'departments': sum(1 for entry in entries if entry['code'] is not None),
+                'courses': sum(entry['courseCount'] for entry in entries),
+                'professors': sum(entry['professorCount'] for entry in entries),
+                'reviews': sum(entry['reviewCount'] for entry in entries),
+            },
+            'departments': entries,
+        }))
+
+    # Keep the previous generation for clients that still hold the old
+    # index; delete anything older.
+    keep = current | {entry['shard'] for entry in previous_entries.values()}
+    removed = []
+    shard_dir = output_dir / SHARD_DIR
+    if shard_dir.exists():
+        for path in shard_dir.glob('*.json'):
+            relative = f"{SHARD_DIR}/{path.name}"
+            if relative not in keep:
+                path.unlink()
+                removed.append(relative)
+
+    return {'built': built, 'unchanged': unchanged, 'removed': removed}
@@ -0,0 +1,133 @@
+"""
+Write path for new reviews.
+
+Input is validated before anything touches the database, course and
+professor ids come from the entity cache, and the insert plus the stored
+aggregate updates run in a single transaction.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from . import aggregates, cache, duplicates, events
+from .models import Course, Professor, Review
+from .signals import bump_versions_on_commit
+
+RATING_FIELDS = (
+    ('rating', 'Rating'),
+    ('workload', 'Workload'),
+    ('difficulty', 'Difficulty'),
+)
+
+
+def validate_input(input):
+    """Return the range errors for one CreateReviewInput without any queries."""
+    errors = []
+    for field, label in RATING_FIELDS:
+        value = getattr(input, field)
+        if value is None or not (1 <= value <= 5):
+            errors.append(f"{label} must be between 1 and 5")
+    return errors
+
+
+def resolve_owners(input):
+    """Look up the course and professor for an input through the entity cache."""
+    course = cache.get_course(input.course_code)
+    if course is None:
+        return None, None, [f"Course {input.course_code} not found"]
+
+    professor = None
+    if input.professor_id:
+        professor = cache.get_professor(id=input.professor_id)
+        if professor is None:
+            return None, None, [f"Professor with id {input.professor_id} not found"]
+    return course, professor, []
+
+
+def build_review(input, course, professor):
+    return Review(
+        course=course,
+        professor=professor,
+        rating=input.rating,
+        workload=input.workload,
+        difficulty=input.difficulty,
+        comment=input.comment or "",
+    )
+
+
+def check_duplicate(review, batch):
+    """
+    Sign ``review`` and return an error if its comment nearly duplicates a
+    stored review or an earlier review in ``batch``.
+    """
+    packed = duplicates.sign(review)
+    if not packed or not getattr(settings, 'REVIEW_DUPLICATE_CHECK', True):
+        return []
+    threshold = settings.REVIEW_DUPLICATE_THRESHOLD
+    scores = duplicates.similarities(packed, [other.comment_signature for other in batch])
+    for position, score in enumerate(scores):
+        if score >= threshold:
+            return [f"Comment is a near-duplicate of inputs[{position}]"]
+    match = duplicates.find_duplicate(packed, threshold)
+    if match:
+        from graphql_relay import to_global_id
+
+        return [f"Comment is a near-duplicate of review {to_global_id('ReviewType', match[0])}"]
+    return []
+
+
+def prepare_reviews(inputs):
+    """
+    Validate and resolve a list of inputs. Returns unsaved reviews and a list
+    of errors; when more than one input is given, errors are prefixed with
+    the index of the offending input.
+    """
+    prefix = len(inputs) > 1
+    reviews, errors = [], []
+    for index, input in enumerate(inputs):
+        input_errors = validate_input(input)
+        if not input_errors:
+            course, professor, input_errors = resolve_owners(input)
+        if not input_errors:
+            review = build_review(input, course, professor)
+            input_errors = check_duplicate(review, reviews)
+        if input_errors:
+            errors.extend(f"inputs[{index}]: {e}" if prefix else e for e in input_errors)
+            continue
+        reviews.append(review)
+    return reviews, errors
+
+
+def save_reviews(reviews):
+    """Insert reviews and update the stored aggregates atomically."""
+    for review in reviews:
+        if review.comment_signature is None:
+            duplicates.sign(review)
+    with transaction.atomic():
+        Review.objects.bulk_create(reviews)
+        duplicates.index_reviews(reviews)
+        aggregates.apply_reviews(reviews)
+        bump_versions_on_commit(Review, Course, Professor)
+        events.publish_reviews_on_commit(reviews)
+    return reviews
+
+
+def check_batch_size(inputs):
+    max_batch = getattr(settings, 'REVIEW_BATCH_MAX', 100)
+    if len(inputs) > max_batch:
+        return [f"At most {max_batch} reviews can be submitted at once"]
+    return []
+
+
+def create_reviews(inputs):
+    """
+    Create every review in ``inputs`` or none of them. Returns the saved
+    reviews and a list of errors.
+    """
+    errors = check_batch_size(inputs)
+    if errors:
+        return [], errors
+
+    reviews, errors = prepare_reviews(inputs)
+    if errors:
+        return [], errors
+    return save_reviews(reviews), []
@@ -1,3 +1,1330 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import DatabaseError, close_old_connections, connection, connections
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from huskyden import compression, db, http_cache, profiling, ratelimit, routers
+from huskyden.operations import DETAIL_PAGES, STITCHED_DETAIL_PAGES
+from huskyden.schema import schema
+
+from . import aliases, cache, duplicates, events, export, keywords, pages, partitions, queue, similarity, slugs, snapshot
+from .admin import EstimatedCountPaginator
+from .codes import canonical_code
+from .management.commands import check_import_time
+from .models import CommentBucket, Course, CourseAlias, CourseSimilarity, Department, PendingReview, Professor, RequestProfile, Review
+from .views import review_events
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'entities': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-entities'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES, RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=['testserver'])
+class HuskyDenTestCase(TestCase):
+    """Starts every test with empty caches, so entries never leak between tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Every GraphQL request is logged at INFO; keep the test output readable.
+        for name in ('huskyden.views', 'django.request'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        caches['entities'].clear()
+        cache.entity_cache.clear_local()
+        cache.forget_versions()
+        http_cache._local_queries.clear()
+
+    def make_course(self, code='CSE 142', title='Computer Programming I', department=None):
+        if department is None:
+            department, _ = Department.objects.get_or_create(code=code.split()[0], defaults={'name': 'Department'})
+        return Course.objects.create(code=code, title=title, department=department)
+
+    def graphql(self, query, variables=None, **extra):
+        payload = {'query': query, 'variables': variables or {}, **extra}
+        response = self.client.post('/graphql/', json.dumps(payload), content_type='application/json')
+        return response.json()
+
+    def make_review(self, course, professor=None, rating=4, workload=3, difficulty=3, comment=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Review.objects.create(
+                course=course, professor=professor, rating=rating, workload=workload,
+                difficulty=difficulty, comment=comment,
+            )
+
+
+class EntityCacheTests(HuskyDenTestCase):
+    def test_save_invalidates_cached_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = self.make_course()
+        self.assertEqual(cache.get_course('CSE 142').title, 'Computer Programming I')
+
+        course.title = 'Intro to Programming'
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertEqual(cache.get_course('CSE 142').title, 'Intro to Programming')
+
+    def test_lookups_are_served_from_the_cache(self):
+        self.make_course()
+        cache.get_course('CSE 142')
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_course('cse142').code, 'CSE 142')
+
+    def test_culled_version_comes_back_higher(self):
+        before = cache.bump_version(Course)
+        caches['entities'].delete(cache.version_key(Course))
+        with override_settings(ENTITY_CACHE_VERSION_TTL=0):
+            self.assertGreater(cache.get_version(Course), before)
+
+    @override_settings(ENTITY_CACHE_VERSION_TTL=60)
+    def test_versions_are_reread_after_ttl(self):
+        version = cache.get_version(Course)
+        caches['entities'].set(cache.version_key(Course), version + 10)
+        self.assertEqual(cache.get_version(Course), version)
+        with override_settings(ENTITY_CACHE_VERSION_TTL=0):
+            self.assertEqual(cache.get_version(Course), version + 10)
+
+    def test_own_bumps_apply_at_once(self):
+        version = cache.get_version(Course)
+        self.assertEqual(cache.bump_version(Course), version + 1)
+        self.assertEqual(cache.get_version(Course), version + 1)
+
+    @override_settings(ENTITY_CACHE_NEGATIVE_SIZE=4)
+    def test_missing_codes_do_not_evict_real_entries(self):
+        self.make_course()
+        cache.get_course('CSE 142')
+        for number in range(20):
+            self.assertIsNone(cache.get_course(f'NOPE {number}'))
+        self.assertLessEqual(len(cache.entity_cache._negative), 4)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(cache.get_course('CSE 142'))
+        entity_keys = [key for key in caches['entities']._cache if 'NOPE' in key]
+        self.assertEqual(entity_keys, [])
+
+    def test_missing_code_is_found_once_created(self):
+        self.assertIsNone(cache.get_course('CSE 142'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get_course('CSE 142'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_course()
+        self.assertIsNotNone(cache.get_course('CSE 142'))
+
+
+class HttpCacheTests(HuskyDenTestCase):
+    QUERY = '{ course(code: "CSE 142") { code title avgRating } }'
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+
+    def get(self, **params):
+        headers = params.pop('headers', {})
+        return self.client.get('/graphql/', params, headers=headers)
+
+    def extensions(self, query):
+        return json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': http_cache.query_hash(query)}})
+
+    def test_get_carries_etag_and_cache_control(self):
+        response = self.get(query=self.QUERY)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_conditional_get_is_not_modified(self):
+        etag = self.get(query=self.QUERY)['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(query=self.QUERY, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.get(query=self.QUERY)['ETag']
+        self.make_review(self.course)
+        response = self.get(query=self.QUERY, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_hash_asks_for_the_query(self):
+        response = self.get(extensions=self.extensions(self.QUERY))
+        self.assertEqual(response.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+
+    def test_registered_query_is_served_by_hash(self):
+        self.graphql(self.QUERY, extensions=json.loads(self.extensions(self.QUERY)))
+        response = self.get(extensions=self.extensions(self.QUERY))
+        self.assertEqual(response.json()['data']['course']['code'], 'CSE 142')
+
+    def test_mismatched_hash_is_rejected(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': '0' * 64}}
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': self.QUERY, 'extensions': extensions}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_query_is_not_stored(self):
+        query = '{ noSuchField }'
+        result = self.graphql(query, extensions=json.loads(self.extensions(query)))
+        self.assertIn('errors', result)
+        response = self.get(extensions=self.extensions(query))
+        self.assertEqual(response.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+
+    @override_settings(PERSISTED_QUERY_MAX_BYTES=16)
+    def test_oversized_query_is_executed_but_not_stored(self):
+        result = self.graphql(self.QUERY, extensions=json.loads(self.extensions(self.QUERY)))
+        self.assertEqual(result['data']['course']['code'], 'CSE 142')
+        response = self.get(extensions=self.extensions(self.QUERY))
+        self.assertEqual(response.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+
+    @override_settings(PERSISTED_QUERY_LOCAL_SIZE=2)
+    def test_registrations_are_bounded_and_expire(self):
+        for number in range(5):
+            http_cache.register_persisted_query(f'query Q{number} {{ __typename }}')
+        self.assertEqual(len(http_cache._local_queries), 2)
+        shared = caches['entities']
+        digest = http_cache.query_hash('query Q0 { __typename }')
+        key = shared.make_key(http_cache.PERSISTED_QUERY_PREFIX + digest)
+        self.assertIsNotNone(shared._expire_info[key])
+
+
+class CompressionTests(HuskyDenTestCase):
+    QUERY = '{ courses { edges { node { code title description } } } }'
+
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(code='CSE', name='Computer Science')
+        for number in range(20):
+            Course.objects.create(
+                code=f'CSE {100 + number}', title=f'Course {number}', department=department,
+                description='An introduction to programming and computation. ' * 3,
+            )
+
+    def get(self, query=None, **headers):
+        return self.client.get('/graphql/', {'query': query or self.QUERY}, headers=headers)
+
+    def test_large_responses_are_compressed_when_accepted(self):
+        identity = self.get()
+        response = self.get(accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_identity_is_served_without_accept_encoding(self):
+        response = self.get()
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_refused_and_unavailable_encodings_are_not_used(self):
+        self.assertFalse(self.get(accept_encoding='gzip;q=0, identity').has_header('Content-Encoding'))
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertFalse(self.get(accept_encoding='br').has_header('Content-Encoding'))
+
+    def test_brotli_is_preferred_when_installed(self):
+        request = RequestFactory().get('/graphql/', headers={'accept-encoding': 'gzip, br'})
+        with mock.patch.object(compression, 'brotli', object()):
+            self.assertEqual(compression.negotiate_encoding(request), 'br')
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(compression.negotiate_encoding(request), 'gzip')
+
+    def test_bodies_below_the_threshold_stay_uncompressed(self):
+        size = len(self.get().content)
+        with override_settings(GRAPHQL_COMPRESSION_MIN_BYTES=size + 1):
+            self.assertFalse(self.get(accept_encoding='gzip').has_header('Content-Encoding'))
+        with override_settings(GRAPHQL_COMPRESSION_MIN_BYTES=size):
+            self.assertEqual(self.get(accept_encoding='gzip')['Content-Encoding'], 'gzip')
+        small = self.get('{ course(code: "CSE 100") { code } }', accept_encoding='gzip')
+        self.assertLess(len(small.content), settings.GRAPHQL_COMPRESSION_MIN_BYTES)
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_compressed_etag_revalidates_against_its_identity_tag(self):
+        identity_etag = self.get()['ETag']
+        etag = self.get(accept_encoding='gzip')['ETag']
+        self.assertEqual(etag, identity_etag[:-1] + '-gzip"')
+        with self.assertNumQueries(0):
+            response = self.get(accept_encoding='gzip', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class ExportTests(HuskyDenTestCase):
+    def test_since_includes_rows_whose_totals_changed(self):
+        course = self.make_course()
+        professor = Professor.objects.create(name='Ada Lovelace')
+        since = timezone.now()
+        self.make_review(course, professor)
+        rows = list(export.ndjson_lines(export.resolve_models(['courses', 'professors']), since=since))
+        self.assertEqual(
+            [(json.loads(row)['_model'], json.loads(row)['review_count']) for row in rows],
+            [('courses', 1), ('professors', 1)],
+        )
+
+    def test_csv_writes_json_columns_as_json(self):
+        course = self.make_course()
+        Course.objects.filter(pk=course.pk).update(keywords={'terms': [['group project', 2]], 'reviews': 2})
+        header, row = csv.reader(export.csv_lines(Course))
+        self.assertEqual(json.loads(row[header.index('keywords')])['terms'], [['group project', 2]])
+
+
+class KeywordTests(HuskyDenTestCase):
+    def test_terms_are_words_and_phrases_without_stop_words(self):
+        self.assertEqual(
+            keywords.terms('The group project was GREAT, really'),
+            {'group', 'project', 'great', 'group project'},
+        )
+        self.assertEqual(keywords.terms(None), set())
+
+    def test_pick_skips_terms_repeating_a_picked_word(self):
+        ranked = [('group project', 7), ('group', 6), ('project', 5), ('curve', 4), ('exams', 3)]
+        self.assertEqual(keywords._pick(ranked, 2), [['group project', 7], ['curve', 4]])
+
+    @override_settings(REVIEW_KEYWORDS_MIN_REVIEWS=2)
+    def test_summarize_only_revisits_changed_entities(self):
+        cse142, cse143 = self.make_course(), self.make_course('CSE 143', 'Computer Programming II')
+        for comment in ('Weekly quizzes kept me honest', 'Weekly quizzes and huge curve', 'Huge curve'):
+            self.make_review(cse142, comment=comment)
+        self.make_review(cse143, comment='Recursion homework everywhere')
+        self.assertEqual(keywords.summarize(), {'courses': 2, 'professors': 0})
+        cse142.refresh_from_db()
+        self.assertEqual(keywords.top_terms(cse142, 5), [('weekly quizzes', 2), ('huge curve', 2)])
+        self.assertEqual(keywords.summarize(), {'courses': 0, 'professors': 0})
+
+        self.make_review(cse143, comment='Recursion homework again')
+        stamp = Course.objects.get(pk=cse143.pk).updated_at
+        self.assertEqual(keywords.summarize(), {'courses': 1, 'professors': 0})
+        cse143.refresh_from_db()
+        self.assertEqual(keywords.top_terms(cse143, 5), [('recursion homework', 2)])
+        self.assertGreater(cse143.updated_at, stamp)
+        self.assertEqual(keywords.summarize(full=True)['courses'], 2)
+
+
+CREATE_REVIEWS = """
+    mutation CreateReviews($inputs: [CreateReviewInput!]!) {
+      createReviews(inputs: $inputs) { success errors pendingTokens reviews { id } }
+    }
+"""
+PENDING_REVIEW = 'query Pending($token: String!) { pendingReview(token: $token) { status review { id } } }'
+
+
+class CreateReviewsTests(HuskyDenTestCase):
+    COMMENT = 'The weekly projects were long but taught me how to structure real programs.'
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+        self.make_review(self.course, rating=2, comment='Existing review')
+
+    def submit(self, *inputs):
+        inputs = [
+            {'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2, **input} for input in inputs
+        ]
+        return self.graphql(CREATE_REVIEWS, {'inputs': inputs})['data']['createReviews']
+
+    def assertNothingSaved(self):
+        self.assertEqual(Review.objects.count(), 1)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.review_count, self.course.rating_sum), (1, 2))
+
+    def test_valid_batches_are_saved_together(self):
+        result = self.submit({'comment': 'first'}, {'comment': 'second'})
+        self.assertEqual((result['success'], len(result['reviews'])), (True, 2))
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.review_count, self.course.rating_sum), (3, 10))
+
+    def test_one_invalid_input_saves_nothing(self):
+        result = self.submit({'comment': 'fine'}, {'rating': 6})
+        self.assertFalse(result['success'])
+        self.assertEqual(result['errors'], ['inputs[1]: Rating must be between 1 and 5'])
+        self.assertNothingSaved()
+
+    def test_one_duplicate_input_saves_nothing(self):
+        result = self.submit({'comment': self.COMMENT}, {'comment': self.COMMENT.upper()})
+        self.assertFalse(result['success'])
+        self.assertEqual(result['errors'], ['inputs[1]: Comment is a near-duplicate of inputs[0]'])
+        self.assertNothingSaved()
+
+    @override_settings(REVIEW_BATCH_MAX=2)
+    def test_batches_over_the_limit_are_rejected(self):
+        result = self.submit({}, {}, {})
+        self.assertFalse(result['success'])
+        self.assertEqual(result['errors'], ['At most 2 reviews can be submitted at once'])
+        self.assertNothingSaved()
+
+
+@override_settings(REVIEW_INGEST_MODE='async')
+class ReviewQueueTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+        queue.publish_stats()
+
+    def submit(self, *comments):
+        inputs = [
+            {'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2, 'comment': comment}
+            for comment in comments
+        ]
+        return self.graphql(CREATE_REVIEWS, {'inputs': inputs})['data']['createReviews']
+
+    def test_submissions_are_queued_and_polled_by_token(self):
+        tokens = self.submit('first', 'second')['pendingTokens']
+        self.assertEqual(len(tokens), 2)
+        self.assertFalse(Review.objects.exists())
+        pending = self.graphql(PENDING_REVIEW, {'token': tokens[0]})['data']['pendingReview']
+        self.assertEqual(pending['status'], 'PENDING')
+
+        self.assertEqual(queue.process_batch(), 2)
+        self.assertEqual(Review.objects.count(), 2)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.review_count, 2)
+        pending = self.graphql(PENDING_REVIEW, {'token': tokens[0]})['data']['pendingReview']
+        self.assertEqual(pending['status'], 'DONE')
+        self.assertIsNotNone(pending['review'])
+
+    def test_ids_do_not_find_submissions(self):
+        self.submit('first')
+        row = PendingReview.objects.get()
+        self.assertIsNone(self.graphql(PENDING_REVIEW, {'token': str(row.pk)})['data']['pendingReview'])
+
+    def test_claim_takes_the_oldest_pending_rows(self):
+        self.submit('first', 'second', 'third')
+        self.assertEqual(queue.process_batch(batch_size=2), 2)
+        self.assertEqual(
+            list(PendingReview.objects.values_list('comment', 'status')),
+            [('first', 'done'), ('second', 'done'), ('third', 'pending')],
+        )
+
+    @override_settings(REVIEW_QUEUE_MAX_ATTEMPTS=2)
+    def test_failing_rows_are_retried_then_failed(self):
+        self.submit('good', 'bad')
+        save_reviews = queue.save_reviews
+
+        def flaky(reviews):
+            if any(review.comment == 'bad' for review in reviews):
+                raise DatabaseError('boom')
+            return save_reviews(reviews)
+
+        with mock.patch.object(queue, 'save_reviews', side_effect=flaky):
+            self.assertEqual(queue.process_batch(), 1)
+            bad = PendingReview.objects.get(comment='bad')
+            self.assertEqual((bad.status, bad.attempts, bad.last_error), ('pending', 1, 'boom'))
+            self.assertEqual(queue.process_batch(), 0)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('failed', 2))
+        self.assertEqual(list(Review.objects.values_list('comment', flat=True)), ['good'])
+
+    def test_stale_worker_report_writes_directly(self):
+        stats = caches['entities'].get(queue.STATS_KEY)
+        stats['updated_at'] -= 3600
+        caches['entities'].set(queue.STATS_KEY, stats)
+        result = self.submit('first')
+        self.assertEqual(result['pendingTokens'], [])
+        self.assertEqual(len(result['reviews']), 1)
+
+    def test_missing_worker_report_writes_directly(self):
+        caches['entities'].delete(queue.STATS_KEY)
+        self.assertFalse(queue.async_enabled())
+
+    @override_settings(REVIEW_QUEUE_MAX_DEPTH=1)
+    def test_deep_queue_writes_directly(self):
+        self.submit('first')
+        queue.publish_stats()
+        self.assertFalse(queue.async_enabled())
+
+
+class SlugTests(HuskyDenTestCase):
+    def test_same_names_get_numbered_slugs(self):
+        created = [Professor.objects.create(name='Ada Lovelace').slug for _ in range(3)]
+        self.assertEqual(created, ['ada-lovelace', 'ada-lovelace-1', 'ada-lovelace-2'])
+
+    def test_slug_taken_by_a_concurrent_transaction_is_reallocated(self):
+        allocate = slugs.next_free_slug
+        raced = []
+
+        def allocate_then_lose_the_race(model, name, exclude_pk=None):
+            slug = allocate(model, name, exclude_pk)
+            if not raced:
+                # The other transaction inserts between allocation and insert.
+                raced.append(Professor.objects.create(name=name, slug=slug))
+            return slug
+
+        with mock.patch('reviews.models.next_free_slug', side_effect=allocate_then_lose_the_race):
+            professor = Professor.objects.create(name='Ada Lovelace')
+        self.assertEqual(professor.slug, 'ada-lovelace-1')
+        self.assertEqual(
+            sorted(Professor.objects.values_list('slug', flat=True)), ['ada-lovelace', 'ada-lovelace-1'],
+        )
+
+    def test_resave_keeps_its_own_suffix(self):
+        Professor.objects.create(name='Ada Lovelace')
+        professor = Professor.objects.create(name='Ada Lovelace')
+        professor.slug = ''
+        professor.save()
+        self.assertEqual(professor.slug, 'ada-lovelace-1')
+
+    def test_long_digit_runs_are_ignored(self):
+        Professor.objects.create(name='Ada Lovelace')
+        Professor.objects.create(name='Ada Lovelace', slug='ada-lovelace-' + '9' * 30)
+        self.assertEqual(Professor.objects.create(name='Ada Lovelace').slug, 'ada-lovelace-1')
+
+
+class ConcurrentSlugTests(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("in-memory SQLite test databases do not take concurrent writers")
+
+    def test_threads_saving_the_same_name_get_distinct_slugs(self):
+        barrier = threading.Barrier(4)
+        created, errors = [], []
+
+        def work():
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    created.append(Professor.objects.create(name='Ada Lovelace').slug)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(created), 20)
+        self.assertEqual(len(set(created)), 20)
+
+
+class DatabaseTuningTests(HuskyDenTestCase):
+    def test_sqlite_uses_wal_and_immediate_transactions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': f'{directory}/tuned.sqlite3',
+                'OPTIONS': dict(settings.SQLITE_OPTIONS),
+            }})
+            tuned = handler['default']
+            try:
+                with tuned.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertGreater(cursor.fetchone()[0], 0)
+                self.assertEqual(tuned.transaction_mode, 'IMMEDIATE')
+            finally:
+                tuned.close()
+
+    def test_pool_stats_report_saturation(self):
+        pool = mock.Mock(max_size=10)
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 1, 'requests_waiting': 2}
+        pooled = mock.MagicMock()
+        pooled.__iter__.return_value = iter(['default'])
+        pooled.settings = {'default': {'OPTIONS': {'pool': settings.DB_POOL_OPTIONS}}}
+        pooled.__getitem__.return_value = mock.Mock(pool=pool)
+        with mock.patch.object(db, 'connections', pooled):
+            stats = db.pool_stats()['default']
+        self.assertEqual((stats['in_use'], stats['saturation'], stats['requests_waiting']), (3, 0.3, 2))
+
+    @override_settings(METRICS_API_TOKEN='secret')
+    def test_metrics_need_staff_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        response = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json()['db_pools'])
+
+
+COURSE_TITLE = 'query CourseTitle($code: String!) { course(code: $code) { title } }'
+
+
+class ReplicaRoutingTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_course()
+        self.replica_reads = []
+        use_replica = routers.use_replica
+
+        @contextmanager
+        def recording(enabled=True, request=None):
+            self.replica_reads.append(enabled)
+            with use_replica(enabled, request):
+                yield
+
+        patcher = mock.patch.object(routers, 'use_replica', recording)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, query, variables, **headers):
+        return self.client.post(
+            '/graphql/', json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json', headers=headers,
+        )
+
+    def test_write_pins_the_client_to_the_primary(self):
+        inputs = [{'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2}]
+        response = self.post(CREATE_REVIEWS, {'inputs': inputs})
+        until = response[routers.STICKY_HEADER]
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE].value, until)
+
+        self.client.cookies.clear()
+        self.post(COURSE_TITLE, {'code': 'CSE 142'}, **{routers.STICKY_HEADER: until})
+        self.post(COURSE_TITLE, {'code': 'CSE 142'})
+        self.assertEqual(self.replica_reads, [False, False, True])
+
+    def test_sticky_window_expires(self):
+        request = RequestFactory().get('/graphql/', headers={routers.STICKY_HEADER: f"{time.time() + 5:.3f}"})
+        self.assertTrue(routers.is_sticky(request))
+        with mock.patch.object(routers.time, 'time', return_value=time.time() + 10):
+            self.assertFalse(routers.is_sticky(request))
+        self.assertFalse(routers.is_sticky(RequestFactory().get('/graphql/', headers={routers.STICKY_HEADER: 'soon'})))
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_only_bodies_read_from_the_primary_are_tagged(self):
+        # The "replica" mirrors the primary, so reads still find the rows.
+        with mock.patch.object(routers, '_is_healthy', return_value=True):
+            replica = self.client.get('/graphql/', {'query': COURSE_TITLE, 'variables': '{"code": "CSE 142"}'})
+            primary = self.client.get(
+                '/graphql/', {'query': COURSE_TITLE, 'variables': '{"code": "CSE 142"}'},
+                headers={routers.STICKY_HEADER: f"{time.time() + 5:.3f}"},
+            )
+        self.assertEqual(replica.status_code, 200)
+        self.assertFalse(replica.has_header('ETag'))
+        self.assertTrue(primary['ETag'])
+        self.assertEqual(self.replica_reads, [True, False])
+
+    @override_settings(REPLICA_DATABASES=['replica1', 'replica2', 'replica3'])
+    def test_one_replica_serves_the_whole_request(self):
+        router, request = routers.ReplicaRouter(), RequestFactory().get('/graphql/')
+        with mock.patch.object(routers, '_is_healthy', return_value=True):
+            with routers.use_replica(True, request):
+                aliases = {router.db_for_read(Course) for _ in range(20)}
+            with routers.use_replica(True, request):
+                aliases.add(router.db_for_read(Professor))
+        self.assertEqual(aliases, {request.replica_alias})
+        with routers.use_replica(False, request):
+            self.assertEqual(router.db_for_read(Course), 'default')
+
+
+class StartupImportTests(HuskyDenTestCase):
+    def test_commands_do_not_import_the_heavy_stack(self):
+        self.assertEqual(check_import_time.forbidden_imports('command'), [])
+
+    def test_workers_do_not_import_scipy(self):
+        self.assertEqual(check_import_time.forbidden_imports('worker'), [])
+
+
+class SnapshotTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+        self.other = self.make_course('MATH 124', 'Calculus I')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = Path(directory.name)
+
+    def files(self):
+        return {path.relative_to(self.output).as_posix(): path.stat().st_mtime_ns for path in self.output.rglob('*.json')}
+
+    def test_shards_are_named_by_content_and_fingerprinted(self):
+        result = snapshot.build_snapshot(self.output)
+        index = snapshot.read_index(self.output)
+        self.assertEqual([entry['code'] for entry in index['departments']], ['CSE', 'MATH'])
+        for entry in index['departments']:
+            content = (self.output / entry['shard']).read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            self.assertEqual(entry['shard'], f"departments/{entry['code']}.{digest}.json")
+            self.assertEqual(len(entry['fingerprint']), 16)
+        self.assertEqual(result['built'], [entry['shard'] for entry in index['departments']])
+
+    def test_unchanged_rebuild_rewrites_nothing(self):
+        snapshot.build_snapshot(self.output)
+        before = self.files()
+        result = snapshot.build_snapshot(self.output)
+        self.assertEqual((result['built'], result['removed']), ([], []))
+        self.assertEqual(len(result['unchanged']), 2)
+        self.assertEqual(self.files(), before)
+
+    def test_only_changed_departments_are_rebuilt(self):
+        snapshot.build_snapshot(self.output)
+        first = snapshot.read_index(self.output)
+        self.make_review(self.other, rating=5)
+        result = snapshot.build_snapshot(self.output)
+        shards = {entry['code']: entry['shard'] for entry in first['departments']}
+        self.assertEqual(result['unchanged'], [shards['CSE']])
+        self.assertEqual(len(result['built']), 1)
+        self.assertNotEqual(result['built'][0], shards['MATH'])
+        # The previous generation stays for clients holding the old index.
+        self.assertTrue((self.output / shards['MATH']).exists())
+
+
+class SelectionTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(code='CSE', name='Computer Science')
+        for number in range(3):
+            course = self.make_course(f'CSE {142 + number}', department=department)
+            self.make_review(course, rating=number + 2, comment='A long comment nobody asked for')
+
+    def run_query(self, query, queries):
+        with CaptureQueriesContext(connection) as context:
+            result = self.graphql(query)
+        self.assertNotIn('errors', result)
+        sql = [captured['sql'] for captured in context.captured_queries]
+        self.assertEqual(len(sql), queries, sql)
+        return result['data'], sql
+
+    def test_listing_joins_departments_and_prefetches_reviews(self):
+        data, (_, courses, reviews) = self.run_query(
+            '{ courses { edges { node { code department { name } reviews { rating } } } } }', 3,
+        )
+        self.assertEqual(
+            [(edge['node']['department']['name'], edge['node']['reviews']) for edge in data['courses']['edges']],
+            [('Computer Science', [{'rating': rating}]) for rating in (2, 3, 4)],
+        )
+        self.assertIn('JOIN "reviews_department"', courses)
+        self.assertIn('"reviews_department"."name"', courses)
+        self.assertNotIn('"description"', courses)
+        self.assertNotIn('"comment"', reviews)
+        self.assertIn('"reviews_review"."course_id" IN', reviews)
+
+    def test_fragments_and_aliases_are_planned_like_fields(self):
+        _, (_, courses) = self.run_query(
+            '{ courses { edges { node { ...Listing heading: title } } } } '
+            'fragment Listing on CourseType { code department { code } }', 2,
+        )
+        for column in ('"reviews_course"."title"', '"reviews_course"."code"', '"reviews_department"."code"'):
+            self.assertIn(column, courses)
+        self.assertNotIn('"reviews_department"."name"', courses)
+        self.assertNotIn('"description"', courses)
+
+
+@override_settings(REVIEW_EVENTS_BACKEND='reviews.events.LocalBroker', REVIEW_EVENTS_KEEPALIVE_SECONDS=0.05)
+class ReviewEventTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+        events._broker = None
+        self.addCleanup(setattr, events, '_broker', None)
+        # Closing a stream sends request_finished, which would otherwise
+        # close the test's database connection. Streams are opened on the
+        # view itself: the test client reconnects the receiver after requests.
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    def open(self, code='CSE 142'):
+        response = review_events(RequestFactory().get('/events/reviews/', {'courseCode': code}))
+        if response.status_code == 200:
+            self.addCleanup(response.close)
+        return response
+
+    def test_new_reviews_reach_open_streams(self):
+        response = self.open('cse142')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        self.make_review(self.course, rating=5, comment='Loved it')
+
+        event = next(chunks).decode()
+        self.assertTrue(event.startswith('event: reviewAdded\ndata: '))
+        payload = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(payload['review']['comment'], 'Loved it')
+        self.assertEqual((payload['course']['reviewCount'], payload['course']['avgRating']), (1, 5.0))
+        self.assertEqual(next(chunks), b': keep-alive\n\n')
+
+    @override_settings(REVIEW_EVENTS_MAX_STREAMS=1)
+    def test_streams_past_the_limit_are_told_to_retry(self):
+        first = self.open()
+        busy = self.open()
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy['Retry-After'], '30')
+        self.assertEqual(busy.content, b'retry: 30000\n\n')
+
+        first.close()
+        self.assertEqual(self.open().status_code, 200)
+        self.assertEqual(events.open_streams()['sync'], 1)
+
+
+@override_settings(REVIEW_EVENTS_BACKEND='reviews.events.CacheBroker')
+class CacheBrokerTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = events.CacheBroker()
+        self.broker._seen = 0
+        self.received = self.broker.subscribe(['course:CSE142'])
+        self.broker._poller = mock.Mock(is_alive=lambda: True)
+
+    def test_events_are_delivered_in_order_once(self):
+        self.broker.publish('course:CSE142', 'one')
+        self.broker.publish('course:MATH124', 'other')
+        self.broker.publish('course:CSE142', 'two')
+        self.broker.poll()
+        self.broker.poll()
+        self.assertEqual([self.received.get(0), self.received.get(0), self.received.get(0)], ['one', 'two', None])
+
+    def test_numbers_taken_before_the_event_is_written_are_waited_for(self):
+        self.broker._next_sequence()
+        self.broker.publish('course:CSE142', 'later')
+        self.broker.poll()
+        self.assertIsNone(self.received.get(0))
+        self.broker.poll()
+        self.assertEqual(self.received.get(0), 'later')
+
+    def test_file_cache_sequence_numbers_are_unique_across_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_caches = {**TEST_CACHES, 'entities': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+            }}
+            with override_settings(CACHES=file_caches):
+                taken = []
+
+                def take():
+                    # One broker per thread, each with its own cache client, like separate workers.
+                    broker = events.CacheBroker()
+                    taken.extend(broker._next_sequence() for _ in range(25))
+
+                threads = [threading.Thread(target=take) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(sorted(taken), list(range(1, 101)))
+
+
+class RateLimitTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        ratelimit._limiters.clear()
+        self.addCleanup(ratelimit._limiters.clear)
+        self.make_course()
+
+    def writes(self, query, variables=None):
+        return ratelimit.query_cost(schema.graphql_schema, query, variables)[1]
+
+    def submit(self, count):
+        inputs = [
+            {'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2, 'comment': f'review {n}'}
+            for n in range(count)
+        ]
+        return self.client.post(
+            '/graphql/', json.dumps({'query': CREATE_REVIEWS, 'variables': {'inputs': inputs}}),
+            content_type='application/json',
+        )
+
+    def test_batches_cost_one_token_per_input(self):
+        inputs = [{'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2}] * 3
+        self.assertEqual(self.writes(CREATE_REVIEWS, {'inputs': inputs}), 3)
+        inline = 'mutation { createReviews(inputs: [{courseCode: "A", rating: 1, workload: 1, difficulty: 1}, ' \
+                 '{courseCode: "B", rating: 1, workload: 1, difficulty: 1}]) { success } }'
+        self.assertEqual(self.writes(inline), 2)
+        single = 'mutation { createReview(input: {courseCode: "A", rating: 1, workload: 1, difficulty: 1}) { success } }'
+        self.assertEqual(self.writes(single), 1)
+        with override_settings(REVIEW_BATCH_MAX=5):
+            self.assertEqual(self.writes(CREATE_REVIEWS, {'inputs': inputs * 3}), 5)
+
+    def test_default_mutation_burst_fits_a_full_batch(self):
+        self.assertGreaterEqual(settings.RATE_LIMITS['mutation'][1], settings.REVIEW_BATCH_MAX)
+
+    @override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'query': (100, 1000), 'mutation': (0.01, 5)})
+    def test_batches_draw_down_the_mutation_bucket(self):
+        self.assertEqual(self.submit(3).status_code, 200)
+        limited = self.submit(3)
+        self.assertEqual(limited.status_code, 429)
+        self.assertIn('Retry-After', limited)
+        self.assertEqual(self.submit(2).status_code, 200)
+        self.assertEqual(Review.objects.count(), 5)
+
+    @override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'query': (0.01, 20), 'mutation': (0.01, 5)})
+    def test_refused_requests_spend_no_write_tokens(self):
+        request = RequestFactory().post('/graphql/')
+        key = ratelimit.client_key(request)
+        inputs = {'inputs': [{'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2}] * 5}
+        expensive = '{ courses { edges { node { code } } } }'
+        with self.assertRaises(ratelimit.QueryTooExpensive):
+            ratelimit.check(request, schema.graphql_schema, CREATE_REVIEWS, expensive, variables=[inputs, None])
+
+        ratelimit.limiter('query').consume(key, 20)
+        wait = ratelimit.check(request, schema.graphql_schema, CREATE_REVIEWS, variables=[inputs])
+        self.assertGreater(wait, 0)
+        # Neither refusal kept a write: all five remain.
+        self.assertEqual(ratelimit.limiter('mutation').consume(key, 5), 0)
+
+    def key(self, **meta):
+        request = RequestFactory().get(
+            '/graphql/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='198.51.100.7, 203.0.113.9', **meta,
+        )
+        return ratelimit.client_key(request)
+
+    @override_settings(RATE_LIMIT_PROXY_COUNT=None)
+    def test_railway_defaults_to_one_proxy(self):
+        self.assertEqual(self.key(), 'ip:10.0.0.2')
+        with mock.patch.dict(os.environ, {'RAILWAY_ENVIRONMENT': 'production'}):
+            self.assertEqual(self.key(), 'ip:203.0.113.9')
+            with override_settings(RATE_LIMIT_PROXY_COUNT=0):
+                self.assertEqual(self.key(), 'ip:10.0.0.2')
+            with override_settings(RATE_LIMIT_PROXY_COUNT=2):
+                self.assertEqual(self.key(), 'ip:198.51.100.7')
+
+
+class AdminTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        course = self.make_course()
+        for rating in (5, 5, 5, 3, 1):
+            self.make_review(course, rating=rating)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', None))
+
+    def changelist(self, **params):
+        response = self.client.get('/admin/reviews/review/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_review_list_renders_with_score_filters(self):
+        self.assertEqual(self.changelist().result_count, 5)
+        filtered = self.changelist(rating='5', workload='3')
+        self.assertEqual(filtered.result_count, 3)
+        self.assertEqual({review.rating for review in filtered.result_list}, {5})
+        self.assertEqual(
+            [choice['display'] for choice in filtered.filter_specs[0].choices(filtered)],
+            ['All', '1', '2', '3', '4', '5'],
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite has no planner estimate to fall back on")
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_paginator_counts_exactly_without_estimates(self):
+        self.assertEqual(EstimatedCountPaginator(Review.objects.all(), 10).count, 5)
+        self.assertEqual(EstimatedCountPaginator(Review.objects.filter(rating=5), 10).count, 3)
+        self.assertEqual(self.changelist(rating='5').result_count, 3)
+
+
+SIMILAR_COURSES = 'query Similar($code: String!, $first: Int) { course(code: $code) { similarCourses(first: $first) { code } } }'
+
+
+class SimilarityTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        cse = Department.objects.create(code='CSE', name='Computer Science')
+        engl = Department.objects.create(code='ENGL', name='English')
+        catalog = [
+            (cse, 'CSE 332', 'Data Structures and Algorithms', 'Sorting, graph algorithms, balanced trees and hashing.'),
+            (cse, 'CSE 421', 'Design of Algorithms', 'Graph algorithms, sorting lower bounds and balanced trees.'),
+            (cse, 'CSE 333', 'Systems Programming', 'Processes, memory, networking and the C language.'),
+            (engl, 'ENGL 111', 'Composition: Poetry', 'Reading and writing poems in verse.'),
+            (engl, 'ENGL 281', 'Creative Writing', 'Writing stories and poems in verse.'),
+        ]
+        for department, code, title, description in catalog:
+            Course.objects.create(code=code, title=title, description=description, department=department)
+
+    def similar(self, code, first=None):
+        result = self.graphql(SIMILAR_COURSES, {'code': code, 'first': first})
+        return [course['code'] for course in result['data']['course']['similarCourses']]
+
+    def test_similar_courses_are_ranked_best_first(self):
+        self.assertEqual(similarity.build(), {'courses': 5, 'changed': 5, 'updated': 5})
+        self.assertEqual(self.similar('CSE 332')[:2], ['CSE 421', 'CSE 333'])
+        self.assertEqual(self.similar('ENGL 111'), ['ENGL 281'])
+        scores = list(CourseSimilarity.objects.filter(course__code='CSE 332').values_list('score', flat=True))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_unchanged_courses_are_skipped_on_a_rerun(self):
+        similarity.build()
+        self.assertEqual(similarity.build(), {'courses': 5, 'changed': 0, 'updated': 0})
+        Course.objects.filter(code='CSE 333').update(title='Systems Programming in C')
+        self.assertEqual(similarity.build()['changed'], 1)
+        self.assertEqual(similarity.build(full=True)['changed'], 5)
+
+    @override_settings(COURSE_SIMILARITY_TOP_K=1)
+    def test_first_is_clamped_to_the_stored_neighbours(self):
+        similarity.build()
+        self.assertEqual(self.similar('CSE 332', first=50), ['CSE 421'])
+        self.assertEqual(self.similar('CSE 332', first=-1), [])
+
+
+class BatchTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        ratelimit._limiters.clear()
+        self.addCleanup(ratelimit._limiters.clear)
+        self.make_course()
+
+    def batch(self, *operations):
+        return self.client.post('/graphql/', json.dumps(list(operations)), content_type='application/json')
+
+    def create(self, count):
+        inputs = [{'courseCode': 'CSE 142', 'rating': 4, 'workload': 3, 'difficulty': 2}] * count
+        return {'query': CREATE_REVIEWS, 'variables': {'inputs': inputs}}
+
+    def title(self):
+        return {'query': COURSE_TITLE, 'variables': {'code': 'CSE 142'}}
+
+    def test_mixed_batch_answers_each_operation_in_order(self):
+        response = self.batch(self.create(1), self.title())
+        self.assertEqual(response.status_code, 200)
+        created, title = response.json()
+        self.assertTrue(created['data']['createReviews']['success'])
+        self.assertEqual(title['data']['course']['title'], 'Computer Programming I')
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_failing_operation_leaves_the_others_alone(self):
+        response = self.batch(self.title(), {'query': '{ noSuchField }'}, self.create(1))
+        title, failed, created = response.json()
+        self.assertEqual(title['data']['course']['title'], 'Computer Programming I')
+        self.assertIn('noSuchField', failed['errors'][0]['message'])
+        self.assertTrue(created['data']['createReviews']['success'])
+        self.assertEqual(Review.objects.count(), 1)
+
+    @override_settings(GRAPHQL_BATCH_MAX_OPERATIONS=2)
+    def test_batches_over_the_operation_limit_are_rejected(self):
+        response = self.batch(self.title(), self.title(), self.title())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'], 'A batch must hold 1 to 2 operations')
+        self.assertEqual(self.batch().status_code, 400)
+
+    @override_settings(GRAPHQL_BATCH_MAX_COST=50)
+    def test_batches_over_the_cost_limit_are_rejected(self):
+        listing = {'query': '{ courses { edges { node { code } } } }'}
+        response = self.batch(listing, self.title())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('split the batch', response.json()['errors'][0]['message'])
+
+    @override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'query': (100, 1000), 'mutation': (0.01, 5)})
+    def test_mutations_of_a_batch_are_charged_together(self):
+        self.assertEqual(self.batch(self.create(2), self.create(2)).status_code, 200)
+        limited = self.batch(self.create(1), self.create(1))
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(Review.objects.count(), 4)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.batch(self.create(3), self.create(3)).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Review partitioning requires PostgreSQL")
+class PartitionTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.current = partitions.academic_year(timezone.now())
+        self.course = self.make_course()
+        self.professor = Professor.objects.create(name='Ada Lovelace')
+        self.old = self.review_in(self.current - 3, rating=1)
+        self.review_in(self.current - 1, rating=3)
+        self.review_in(self.current, rating=5)
+        CommentBucket.objects.create(key=7, review=self.old)
+        self.pending = PendingReview.objects.create(
+            course=self.course, rating=1, workload=1, difficulty=1, status=PendingReview.STATUS_DONE, review=self.old,
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = directory.name
+
+    def review_in(self, year, rating=4):
+        review = self.make_review(self.course, self.professor, rating=rating)
+        created_at = partitions.year_bounds(year)[0] + timedelta(days=30)
+        Review.objects.filter(pk=review.pk).update(created_at=created_at)
+        review.created_at = created_at
+        return review
+
+    def rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def references_to_reviews(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+                [partitions.TABLE],
+            )
+            return cursor.fetchone()[0]
+
+    def test_convert_splits_reviews_by_academic_year(self):
+        self.assertGreater(self.references_to_reviews(), 0)
+        years = partitions.convert(ahead=1)
+
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(sorted(years), list(range(self.current - 3, self.current + 2)))
+        self.assertEqual(
+            [self.rows(years[year]) for year in sorted(years)], [1, 0, 1, 1, 0],
+        )
+        self.assertEqual(self.references_to_reviews(), 0)
+        self.assertEqual(Review.objects.count(), 3)
+
+        # New reviews keep drawing ids from the same sequence.
+        newest = self.make_review(self.course)
+        self.assertGreater(newest.pk, max(Review.objects.exclude(pk=newest.pk).values_list('pk', flat=True)))
+        self.assertEqual(self.rows(years[self.current]), 2)
+        year = Review.objects.in_academic_year(self.current - 1)
+        self.assertEqual(list(year.values_list('rating', flat=True)), [3])
+
+    def test_ensure_moves_stranded_rows_out_of_the_default_partition(self):
+        partitions.convert(ahead=0)
+        self.assertEqual(partitions.ensure_partitions(ahead=0), [])
+        self.review_in(self.current + 2)
+        self.assertEqual(self.rows(partitions.DEFAULT_PARTITION), 1)
+
+        created = partitions.ensure_partitions(ahead=2)
+        self.assertEqual(created, [partitions.partition_name(self.current + 1), partitions.partition_name(self.current + 2)])
+        self.assertEqual(self.rows(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(self.rows(partitions.partition_name(self.current + 2)), 1)
+        self.assertEqual(Review.objects.count(), 4)
+
+    def test_archive_writes_the_year_and_drops_what_referenced_it(self):
+        partitions.convert(ahead=1)
+        self.assertEqual(partitions.expired_years(retain_years=2), [self.current - 3, self.current - 2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            path, rows = partitions.archive_partition(self.current - 3, self.archive_dir)
+        self.assertEqual(rows, 1)
+        with gzip.open(path, 'rt') as archive:
+            archived = [json.loads(line) for line in archive]
+        self.assertEqual([(row['id'], row['rating'], row['_model']) for row in archived], [(self.old.pk, 1, 'reviews')])
+
+        self.assertNotIn(self.current - 3, partitions.partitions())
+        self.assertFalse(Review.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(CommentBucket.objects.exists())
+        self.pending.refresh_from_db()
+        self.assertIsNone(self.pending.review_id)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.review_count, self.course.rating_sum), (2, 8))
+
+    def test_other_databases_are_refused(self):
+        with mock.patch.object(partitions.connection, 'vendor', 'sqlite'):
+            with self.assertRaises(partitions.PartitionError):
+                partitions.convert()
+
+
+class DuplicateTests(HuskyDenTestCase):
+    COMMENT = 'The weekly problem sets were long but the lectures explained every proof clearly.'
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course()
+
+    def decoy(self, key):
+        review = self.make_review(self.course, comment='Entirely different words about the midterm exam format.')
+        CommentBucket.objects.create(key=key, review=review)
+        return review
+
+    @mock.patch.object(duplicates, 'MAX_CANDIDATES', 2)
+    def test_candidates_sharing_most_bands_are_kept(self):
+        duplicates._candidates_sql.cache_clear()
+        self.addCleanup(duplicates._candidates_sql.cache_clear)
+        packed = duplicates.signature(self.COMMENT)
+        key = duplicates.band_keys(packed)[0]
+        older = [self.decoy(key) for _ in range(2)]
+        original = self.make_review(self.course, comment=self.COMMENT)
+        newer = [self.decoy(key) for _ in range(2)]
+
+        match = duplicates.find_duplicate(packed, threshold=0.9)
+        self.assertEqual(match, (original.pk, 1.0))
+        self.assertNotIn(match[0], [review.pk for review in older + newer])
+
+
+class ProfilingTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_course()
+
+    def post(self, payload, **headers):
+        return self.client.post('/graphql/', json.dumps(payload), content_type='application/json', headers=headers)
+
+    def profiled(self, **headers):
+        return self.post({'query': COURSE_TITLE, 'variables': {'code': 'CSE 142'}}, **headers)
+
+    def test_signed_header_stores_a_profile(self):
+        response = self.profiled(**{'X-Profile': profiling.make_token()})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.operation, profile.trigger), ('CourseTitle', 'header'))
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn('reviews_course', profile.queries[0]['sql'])
+
+    def test_unsigned_or_expired_headers_are_ignored(self):
+        self.assertNotIn('X-Profile-Id', self.profiled(**{'X-Profile': 'profile'}))
+        with override_settings(PROFILE_TOKEN_MAX_AGE=-1):
+            self.assertNotIn('X-Profile-Id', self.profiled(**{'X-Profile': profiling.make_token()}))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_batches_are_named_after_their_operations(self):
+        response = self.post([
+            {'query': COURSE_TITLE, 'variables': {'code': 'CSE 142'}},
+            {'query': '{ departments(first: 1) { edges { node { code } } } }'},
+        ])
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.operation, profile.trigger), ('CourseTitle+anonymous', 'sample'))
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        token = profiling.make_token()
+        ids = [int(self.profiled(**{'X-Profile': token})['X-Profile-Id']) for _ in range(3)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list('pk', flat=True)), ids[1:])
+
+
+COURSE_CODE = 'query Course($code: String!) { course(code: $code) { code canonicalCode reviewCount } }'
+COURSE_PAGE_CODE = 'query Page($code: String!) { coursePage(code: $code, reviewsFirst: 0) { course { code } } }'
+
+
+class CourseCodeTests(HuskyDenTestCase):
+    def course(self, code):
+        return self.graphql(COURSE_CODE, {'code': code})['data']['course']
+
+    def cross_list(self, primary, *codes):
+        with self.captureOnCommitCallbacks(execute=True):
+            return aliases.cross_list(primary, codes)
+
+    def test_canonical_code_drops_case_and_separators(self):
+        self.assertEqual([canonical_code(code) for code in ('stat 220', 'STAT-220', ' Stat220 ')], ['STAT220'] * 3)
+        self.assertEqual(self.make_course('STAT 220').canonical_code, 'STAT220')
+
+    def test_any_spelling_finds_the_course(self):
+        self.make_course()
+        for code in ('CSE 142', 'cse142', 'Cse-142'):
+            self.assertEqual(self.course(code)['code'], 'CSE 142')
+        self.assertIsNone(self.course('CSE 143'))
+
+    def test_cross_listed_codes_resolve_to_the_course(self):
+        stat = self.make_course('STAT 394', 'Probability I')
+        math = self.make_course('MATH 394', 'Probability I')
+        self.make_review(stat)
+        self.make_review(math)
+        self.assertEqual(self.course('math394')['code'], 'MATH 394')
+
+        self.assertEqual(self.cross_list('STAT 394', 'MATH 394'), [('MATH 394', 1)])
+        self.assertFalse(Course.objects.filter(pk=math.pk).exists())
+        self.assertEqual(self.course('math 394'), {'code': 'STAT 394', 'canonicalCode': 'STAT394', 'reviewCount': 2})
+        # The course page redirects to the code it gets back.
+        page = self.graphql(COURSE_PAGE_CODE, {'code': 'MATH 394'})['data']['coursePage']
+        self.assertEqual(page['course']['code'], 'STAT 394')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            aliases.remove('math-394')
+        self.assertIsNone(self.course('MATH 394'))
+
+    def test_merged_reviews_show_up_in_incremental_exports(self):
+        self.make_course('STAT 394', 'Probability I')
+        review = self.make_review(self.make_course('MATH 394', 'Probability I'))
+        since = timezone.now()
+        self.cross_list('STAT 394', 'MATH 394')
+        rows = [json.loads(line) for line in export.ndjson_lines(export.resolve_models(['reviews']), since=since)]
+        self.assertEqual([(row['id'], row['course_id']) for row in rows], [(review.pk, Course.objects.get(code='STAT 394').pk)])
+
+    def test_reviews_under_an_alias_go_to_the_course(self):
+        self.make_course('STAT 394', 'Probability I')
+        self.cross_list('STAT 394', 'MATH 394')
+        inputs = [{'courseCode': 'math 394', 'rating': 5, 'workload': 3, 'difficulty': 2}]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.graphql(CREATE_REVIEWS, {'inputs': inputs})['data']['createReviews']
+        self.assertTrue(result['success'])
+        self.assertEqual(Review.objects.get().course.code, 'STAT 394')
+
+    def test_codes_of_existing_courses_cannot_be_aliases(self):
+        stat = self.make_course('STAT 394', 'Probability I')
+        self.make_course('MATH 394', 'Probability I')
+        with self.assertRaises(ValidationError):
+            CourseAlias(code='math394', course=stat).full_clean()
+        with self.assertRaises(aliases.CrossListingError):
+            self.cross_list('STAT 394', 'stat-394')
+        with self.assertRaises(aliases.CrossListingError):
+            self.cross_list('CSE 999', 'MATH 394')
+
+
+class DetailPageTests(HuskyDenTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cse142, self.cse143 = self.make_course(), self.make_course('CSE 143', 'Computer Programming II')
+        self.ada = Professor.objects.create(name='Ada Lovelace')
+        self.alan = Professor.objects.create(name='Alan Turing')
+        for course, professor, rating, comment in [
+            (self.cse142, self.ada, 5, 'Clear lectures'),
+            (self.cse142, self.ada, 3, ''),
+            (self.cse142, self.alan, 4, 'Hard exams'),
+            (self.cse142, self.alan, 2, 'Too fast'),
+            (self.cse142, None, 1, 'No professor listed'),
+            (self.cse143, self.ada, 4, 'Great follow-up'),
+        ]:
+            self.make_review(course, professor, rating=rating, workload=rating, difficulty=6 - rating, comment=comment)
+
+    def run_query(self, name, operations, variables):
+        result = self.graphql(operations[name], variables)
+        self.assertNotIn('errors', result)
+        return result['data']
+
+    @staticmethod
+    def averages(reviews):
+        return [round(sum(review[field] for review in reviews) / len(reviews), 1)
+                for field in ('rating', 'workload', 'difficulty')]
+
+    def test_course_page_matches_the_course_with_all_its_reviews(self):
+        page = self.run_query('CoursePage', DETAIL_PAGES, {'code': 'CSE 142'})['coursePage']
+        stitched = self.run_query('GetCourse', STITCHED_DETAIL_PAGES, {'code': 'CSE 142'})['course']
+        reviews = stitched.pop('reviews')
+        self.assertEqual(page['course'], stitched)
+
+        expected = []
+        for professor in (self.ada, self.alan):
+            own = [review for review in reviews if (review['professor'] or {}).get('slug') == professor.slug]
+            newest = sorted(own, key=lambda review: review['createdAt'], reverse=True)
+            helpful = next((review for review in newest if review['comment']), newest[0])
+            expected.append((professor.name, len(own), *self.averages(own), helpful['id']))
+        self.assertEqual(sorted(
+            (entry['professor']['name'], entry['reviewCount'], entry['avgRating'], entry['avgWorkload'],
+             entry['avgDifficulty'], entry['mostHelpfulReview']['id'])
+            for entry in page['professors']
+        ), expected)
+
+    def test_professor_course_page_matches_the_professor_with_all_reviews(self):
+        variables = {'slug': self.ada.slug, 'courseCode': 'cse142'}
+        page = self.run_query('ProfessorCoursePage', DETAIL_PAGES, variables)['professorCoursePage']
+        stitched = self.run_query('GetProfessorBySlug', STITCHED_DETAIL_PAGES, {'slug': self.ada.slug})['professor']
+        reviews = [review for review in stitched.pop('reviews') if review['course']['code'] == 'CSE 142']
+        self.assertEqual(page['professor'], stitched)
+        self.assertEqual(page['course'], reviews[0]['course'])
+        self.assertEqual(
+            page['stats'],
+            dict(zip(('reviewCount', 'avgRating', 'avgWorkload', 'avgDifficulty'), [len(reviews), *self.averages(reviews)])),
+        )
+        self.assertEqual(page['reviews'], [{k: v for k, v in review.items() if k != 'course'} for review in reviews])
+        self.assertFalse(page['hasMoreReviews'])
+
+    def test_pages_stay_cached_until_their_own_course_changes(self):
+        first = pages.course_page('CSE 142')
+        with self.assertNumQueries(0):
+            pages.course_page('CSE 142')
+
+        self.make_review(self.cse143, self.alan, comment='Other course')
+        with self.assertNumQueries(1):  # the course itself, not the page
+            self.assertEqual(pages.course_page('CSE 142').reviews, first.reviews)
+
+        self.make_review(self.cse142, self.alan, rating=5, comment='Changed my mind')
+        page = pages.course_page('CSE 142')
+        alan = next(entry for entry in page.professors if entry.professor == self.alan)
+        self.assertEqual((alan.review_count, alan.most_helpful_review.comment), (3, 'Changed my mind'))
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_pages_are_built_from_the_primary(self):
+        # 'replica1' is not a configured database: any read routed to it fails.
+        with mock.patch.object(routers, '_is_healthy', return_value=True), routers.use_replica():
+            course = pages.course_page('CSE 142')
+            professor_course = pages.professor_course_page(self.ada.slug, 'CSE 142')
+        self.assertEqual(len(course.reviews), 5)
+        self.assertEqual([entry.course for entry in professor_course.other_courses], [self.cse143])
@@ -1,3 +1,81 @@
-from django.shortcuts import render
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from huskyden.access import staff_or_bearer_token
+
+from . import cache, events, export
+
+
+@require_GET
+def export_data(request):
+    """
+    Stream departments, courses, professors and reviews as NDJSON or CSV.
+
+    Query parameters: ``models`` (comma separated, default all), ``format``
+    (``ndjson`` or ``csv``) and ``since`` (ISO date/datetime, compared with
+    ``updated_at`` for incremental exports).
+    """
+    if not staff_or_bearer_token(request, settings.EXPORT_API_TOKEN):
+        return HttpResponseForbidden("Export requires staff access or an API token")
+
+    names = [name for name in request.GET.get('models', '').split(',') if name]
+    fmt = request.GET.get('format', 'ndjson')
+    try:
+        since = export.parse_since(request.GET.get('since'))
+        lines = export.stream(names, fmt, since)
+    except export.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="huskyden-export.{fmt}"'
+    return response
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """An SSE response that gives its stream slot back when it is closed."""
+
+    def __init__(self, streaming_content, slot):
+        super().__init__(streaming_content, content_type='text/event-stream')
+        self.slot = slot
+        self['Cache-Control'] = 'no-cache'
+        self['X-Accel-Buffering'] = 'no'
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.slot.release()
+
+
+@require_GET
+def review_events(request):
+    """
+    Server-sent ``reviewAdded`` events for ``courseCode`` and/or
+    ``professorSlug``. Each event's data is the new review plus the updated
+    averages of its course and professor (see reviews.events).
+    """
+    channels = []
+    if request.GET.get('courseCode'):
+        # Aliases of cross-listed courses listen on the course's channel.
+        course = cache.get_course(request.GET['courseCode'].strip())
+        channels.append(events.course_channel(course.code if course else request.GET['courseCode'].strip()))
+    if request.GET.get('professorSlug'):
+        channels.append(events.professor_channel(request.GET['professorSlug'].strip()))
+    if not channels:
+        return HttpResponseBadRequest("Provide courseCode or professorSlug")
+
+    # Under ASGI the stream waits on the event loop; under WSGI it holds a
+    # worker thread until REVIEW_EVENTS_MAX_STREAM_SECONDS, then the browser
+    # reconnects. Past the per-process limit, clients are told to come back.
+    asynchronous = isinstance(request, ASGIRequest)
+    slot = events.stream_slot(asynchronous)
+    if slot is None:
+        retry = settings.REVIEW_EVENTS_BUSY_RETRY_SECONDS
+        response = HttpResponse(f"retry: {retry * 1000}\n\n", status=503, content_type='text/event-stream')
+        response['Retry-After'] = str(retry)
+        return response
+    stream = events.astream(channels) if asynchronous else events.stream(channels)
+    return EventStreamResponse(stream, slot)
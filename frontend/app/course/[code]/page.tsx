@@ -1,9 +1,10 @@
 'use client';
 
 import { useState, useEffect } from 'react';
-import { useParams } from 'next/navigation';
+import { useParams, useRouter } from 'next/navigation';
 import Link from 'next/link';
 import { graphqlClient } from '@/lib/graphql';
+import { subscribeToReviews } from '@/lib/reviewEvents';
 import { gql } from 'graphql-request';
 
 interface Review {
@@ -12,11 +13,6 @@ interface Review {
   workload: number;
   difficulty: number;
   comment: string;
-  professor: {
-    id: string;
-    name: string;
-    slug: string;
-  } | null;
   createdAt: string;
 }
 
@@ -32,7 +28,6 @@ interface Course {
   avgRating: number | null;
   avgWorkload: number | null;
   avgDifficulty: number | null;
-  reviews: Review[];
 }
 
 interface ProfessorStats {
@@ -46,39 +41,58 @@ interface ProfessorStats {
   mostHelpfulReview: Review | null;
 }
 
-const GET_COURSE = gql`
-  query GetCourse($code: String!) {
-    course(code: $code) {
-      id
-      code
-      title
-      description
-      department {
+// The course and its per-professor stats in one request; the averages are
+// computed by the server instead of from every review of the course.
+const COURSE_PAGE = gql`
+  query CoursePage($code: String!) {
+    coursePage(code: $code, reviewsFirst: 0) {
+      course {
+        id
         code
-        name
+        title
+        description
+        department {
+          code
+          name
+        }
+        avgRating
+        avgWorkload
+        avgDifficulty
       }
-      avgRating
-      avgWorkload
-      avgDifficulty
-      reviews {
-        id
-        rating
-        workload
-        difficulty
-        comment
+      professors {
         professor {
           id
           name
           slug
         }
-        createdAt
+        reviewCount
+        avgRating
+        avgWorkload
+        avgDifficulty
+        mostHelpfulReview {
+          id
+          rating
+          workload
+          difficulty
+          comment
+          createdAt
+        }
       }
     }
   }
 `;
 
+const sortByLastName = (stats: ProfessorStats[]): ProfessorStats[] => {
+  return [...stats].sort((a, b) => {
+    const aLastName = a.name.split(' ').pop() || '';
+    const bLastName = b.name.split(' ').pop() || '';
+    return aLastName.localeCompare(bLastName);
+  });
+};
+
 export default function CoursePage() {
   const params = useParams();
+  const router = useRouter();
   // Decode URL-encoded course code (e.g., "STAT%20220" -> "STAT 220")
   // useParams already decodes, but we'll ensure it's decoded properly
   const rawCode = params.code as string;
@@ -92,34 +106,91 @@ export default function CoursePage() {
   }
   code = code.trim();
   const [course, setCourse] = useState<Course | null>(null);
+  const [professorStats, setProfessorStats] = useState<ProfessorStats[]>([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchCourse();
   }, [code]);
 
+  // Apply new reviews as they are posted instead of re-fetching the course
+  useEffect(() => {
+    return subscribeToReviews({ courseCode: code }, (event) => {
+      setCourse((current) => current && {
+        ...current,
+        avgRating: event.course.avgRating,
+        avgWorkload: event.course.avgWorkload,
+        avgDifficulty: event.course.avgDifficulty,
+      });
+      const professor = event.review.professor;
+      if (!professor) return;
+      const review: Review = {
+        id: event.review.id,
+        rating: event.review.rating,
+        workload: event.review.workload,
+        difficulty: event.review.difficulty,
+        comment: event.review.comment ?? '',
+        createdAt: event.review.createdAt,
+      };
+      setProfessorStats((current) => {
+        const existing = current.find((prof) => prof.id === professor.id);
+        if (existing?.mostHelpfulReview?.id === review.id) {
+          return current;
+        }
+        const count = existing ? existing.numReviews : 0;
+        const average = (value: number, added: number) => (value * count + added) / (count + 1);
+        const updated: ProfessorStats = {
+          id: professor.id,
+          name: professor.name,
+          slug: professor.slug || professor.id,
+          numReviews: count + 1,
+          avgRating: average(existing?.avgRating ?? 0, review.rating),
+          avgWorkload: average(existing?.avgWorkload ?? 0, review.workload),
+          avgDifficulty: average(existing?.avgDifficulty ?? 0, review.difficulty),
+          // The newest review with a comment is the most helpful one
+          mostHelpfulReview: review.comment || !existing?.mostHelpfulReview ? review : existing.mostHelpfulReview,
+        };
+        return sortByLastName([...current.filter((prof) => prof.id !== professor.id), updated]);
+      });
+    });
+  }, [code]);
+
   const fetchCourse = async () => {
     try {
       setLoading(true);
-      console.log('Fetching course with code:', code);
       // Ensure code is properly decoded and trimmed
       const decodedCode = decodeURIComponent(code).trim();
-      console.log('Decoded code:', decodedCode);
       
-      const data: any = await graphqlClient.request(GET_COURSE, { code: decodedCode });
-      console.log('GraphQL response:', data);
+      const data: any = await graphqlClient.request(COURSE_PAGE, { code: decodedCode });
       
-      if (data && data.course) {
-        setCourse(data.course);
+      if (data && data.coursePage) {
+        const canonical = data.coursePage.course.code;
+        if (canonical !== decodedCode) {
+          // Reached through a cross-listed alias or another spelling
+          // ("stat220"); show the course under its own code.
+          router.replace(`/course/${encodeURIComponent(canonical)}`);
+        }
+        setCourse(data.coursePage.course);
+        setProfessorStats(sortByLastName(data.coursePage.professors.map((entry: any) => ({
+          id: entry.professor.id,
+          name: entry.professor.name,
+          slug: entry.professor.slug || entry.professor.id,
+          numReviews: entry.reviewCount,
+          avgRating: entry.avgRating,
+          avgWorkload: entry.avgWorkload,
+          avgDifficulty: entry.avgDifficulty,
+          mostHelpfulReview: entry.mostHelpfulReview,
+        }))));
       } else {
         console.error('Course not found in response for code:', decodedCode);
-        console.error('Response data:', data);
         setCourse(null);
+        setProfessorStats([]);
       }
     } catch (error: any) {
       console.error('Error fetching course:', error);
       console.error('Error details:', error.response?.errors || error.message);
       setCourse(null);
+      setProfessorStats([]);
     } finally {
       setLoading(false);
     }
@@ -129,64 +200,6 @@ export default function CoursePage() {
     return '★'.repeat(rating) + '☆'.repeat(5 - rating);
   };
 
-  // Process reviews to get professor statistics
-  const getProfessorStats = (): ProfessorStats[] => {
-    if (!course || !course.reviews) return [];
-    
-    const professorMap = new Map<string, {
-      id: string;
-      name: string;
-      slug: string;
-      reviews: Review[];
-    }>();
-
-    // Group reviews by professor
-    course.reviews.forEach((review) => {
-      if (review.professor) {
-        const profId = review.professor.id;
-        if (!professorMap.has(profId)) {
-          professorMap.set(profId, {
-            id: profId,
-            name: review.professor.name,
-            slug: review.professor.slug || profId,
-            reviews: [],
-          });
-        }
-        professorMap.get(profId)!.reviews.push(review);
-      }
-    });
-
-    // Calculate stats for each professor
-    const stats: ProfessorStats[] = Array.from(professorMap.values()).map((prof) => {
-      const reviews = prof.reviews;
-      const numReviews = reviews.length;
-      const avgRating = reviews.reduce((sum, r) => sum + r.rating, 0) / numReviews;
-      const avgWorkload = reviews.reduce((sum, r) => sum + r.workload, 0) / numReviews;
-      const avgDifficulty = reviews.reduce((sum, r) => sum + r.difficulty, 0) / numReviews;
-      
-      // Find most helpful review (highest rating, or first one with comment)
-      const mostHelpfulReview = reviews.find(r => r.comment && r.comment.length > 0) || reviews[0] || null;
-
-      return {
-        id: prof.id,
-        name: prof.name,
-        slug: prof.slug,
-        numReviews,
-        avgRating,
-        avgWorkload,
-        avgDifficulty,
-        mostHelpfulReview,
-      };
-    });
-
-    // Sort by last name (default)
-    return stats.sort((a, b) => {
-      const aLastName = a.name.split(' ').pop() || '';
-      const bLastName = b.name.split(' ').pop() || '';
-      return aLastName.localeCompare(bLastName);
-    });
-  };
-
   const getRatingColor = (rating: number | null): string => {
     if (rating === null || rating === undefined || isNaN(rating)) return '#898989'; // Gray for N/A
     if (rating >= 4.5) return '#1D830D'; // Green
@@ -273,8 +286,6 @@ export default function CoursePage() {
         </div>
         
         {(() => {
-          const professorStats = getProfessorStats();
-          
           if (professorStats.length === 0) {
             return (
               <p style={{ color: '#6b7280' }}>No professors found for this course yet.</p>
@@ -12,11 +12,6 @@ interface Review {
   workload: number;
   difficulty: number;
   comment: string;
-  course: {
-    id: string;
-    code: string;
-    title: string;
-  };
   createdAt: string;
 }
 
@@ -29,33 +24,61 @@ interface Professor {
     name: string;
   } | null;
   avgRating: number | null;
+}
+
+interface CourseStats {
+  reviewCount: number;
+  avgRating: number | null;
+  avgWorkload: number | null;
+  avgDifficulty: number | null;
+}
+
+interface PageData {
+  professor: Professor;
+  course: {
+    id: string;
+    code: string;
+    title: string;
+  };
+  stats: CourseStats;
   reviews: Review[];
+  hasMoreReviews: boolean;
 }
 
-const GET_PROFESSOR_BY_SLUG = gql`
-  query GetProfessorBySlug($slug: String!) {
-    professor(slug: $slug) {
-      id
-      name
-      slug
-      department {
-        code
+// Only this course's reviews and stats, not the professor's whole history
+const PROFESSOR_COURSE_PAGE = gql`
+  query ProfessorCoursePage($slug: String!, $courseCode: String!) {
+    professorCoursePage(slug: $slug, courseCode: $courseCode, reviewsFirst: 20) {
+      professor {
+        id
         name
+        slug
+        department {
+          code
+          name
+        }
+        avgRating
+      }
+      course {
+        id
+        code
+        title
+      }
+      stats {
+        reviewCount
+        avgRating
+        avgWorkload
+        avgDifficulty
       }
-      avgRating
       reviews {
         id
         rating
         workload
         difficulty
         comment
-        course {
-          id
-          code
-          title
-        }
         createdAt
       }
+      hasMoreReviews
     }
   }
 `;
@@ -65,26 +88,26 @@ function ProfessorCourseContent() {
   const slug = params.slug as string;
   const courseCode = decodeURIComponent(params.courseCode as string);
   
-  const [professor, setProfessor] = useState<Professor | null>(null);
+  const [page, setPage] = useState<PageData | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchProfessor();
-  }, [slug]);
+  }, [slug, courseCode]);
 
   const fetchProfessor = async () => {
     try {
       setLoading(true);
-      const data: any = await graphqlClient.request(GET_PROFESSOR_BY_SLUG, { slug });
+      const data: any = await graphqlClient.request(PROFESSOR_COURSE_PAGE, { slug, courseCode });
       
-      if (data && data.professor) {
-        setProfessor(data.professor);
+      if (data && data.professorCoursePage) {
+        setPage(data.professorCoursePage);
       } else {
-        setProfessor(null);
+        setPage(null);
       }
     } catch (error: any) {
       console.error('Error fetching professor:', error);
-      setProfessor(null);
+      setPage(null);
     } finally {
       setLoading(false);
     }
@@ -102,20 +125,15 @@ function ProfessorCourseContent() {
     return '#D32F2F';
   };
 
-  // Filter reviews by course
-  const courseReviews = professor?.reviews.filter(review => 
-    review.course.code === courseCode
-  ) || [];
-
-  // Calculate course-specific stats
-  const courseStats = courseReviews.length > 0 ? {
-    avgRating: courseReviews.reduce((sum, r) => sum + r.rating, 0) / courseReviews.length,
-    avgWorkload: courseReviews.reduce((sum, r) => sum + r.workload, 0) / courseReviews.length,
-    avgDifficulty: courseReviews.reduce((sum, r) => sum + r.difficulty, 0) / courseReviews.length,
+  const professor = page?.professor ?? null;
+  const courseReviews = page?.reviews ?? [];
+  const reviewCount = page?.stats.reviewCount ?? 0;
+  const courseStats = page && reviewCount > 0 ? {
+    avgRating: page.stats.avgRating ?? 0,
+    avgWorkload: page.stats.avgWorkload ?? 0,
+    avgDifficulty: page.stats.avgDifficulty ?? 0,
   } : null;
-
-  // Get course info from first review
-  const courseInfo = courseReviews.length > 0 ? courseReviews[0].course : null;
+  const courseInfo = page?.course ?? null;
 
   if (loading) {
     return (
@@ -172,7 +190,7 @@ function ProfessorCourseContent() {
                 <p className="text-2xl font-bold" style={{ color: '#4b2e83' }}>
                   {courseStats.avgRating.toFixed(1)}
                 </p>
-                <p className="text-xs text-gray-500 mt-1">Based on {courseReviews.length} {courseReviews.length === 1 ? 'review' : 'reviews'}</p>
+                <p className="text-xs text-gray-500 mt-1">Based on {reviewCount} {reviewCount === 1 ? 'review' : 'reviews'}</p>
               </div>
               <div className="rounded-lg p-4" style={{ backgroundColor: '#f5f3e9' }}>
                 <p className="text-sm text-gray-600 mb-1">Average Workload</p>
@@ -254,7 +272,7 @@ function ProfessorCourseContent() {
 
       <div className="mb-6">
         <h2 className="text-2xl font-bold text-gray-900 mb-4">
-          Reviews ({courseReviews.length})
+          Reviews ({reviewCount})
         </h2>
         {courseReviews.length === 0 ? (
           <p className="text-gray-500">
@@ -289,6 +307,11 @@ function ProfessorCourseContent() {
                 )}
               </div>
             ))}
+            {page?.hasMoreReviews && (
+              <p className="text-sm text-gray-500">
+                Showing the {courseReviews.length} most recent of {reviewCount} reviews.
+              </p>
+            )}
           </div>
         )}
       </div>
@@ -132,11 +132,15 @@ function SearchPageContent() {
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [coursesData, professorsData, departmentsData]: any = await Promise.all([
-        graphqlClient.request(GET_COURSES),
-        graphqlClient.request(GET_PROFESSORS),
-        graphqlClient.request(GET_DEPARTMENTS),
+      // One POST for all three queries; the backend answers with an array.
+      const [coursesResult, professorsResult, departmentsResult]: any = await graphqlClient.batchRequests([
+        { document: GET_COURSES },
+        { document: GET_PROFESSORS },
+        { document: GET_DEPARTMENTS },
       ]);
+      const coursesData = coursesResult.data;
+      const professorsData = professorsResult.data;
+      const departmentsData = departmentsResult.data;
 
       setCourses(coursesData.courses.edges.map((edge: any) => edge.node));
       setProfessors(professorsData.professors.edges.map((edge: any) => edge.node));
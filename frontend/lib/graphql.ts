@@ -2,12 +2,32 @@ import { GraphQLClient } from 'graphql-request';
 
 const GRAPHQL_URL = process.env.NEXT_PUBLIC_GRAPHQL_URL || 'http://localhost:8000/graphql/';
 
+// Read-your-writes: after a mutation the backend answers with X-Primary-Until,
+// until when this client must read from the primary database. Cookies are not
+// sent cross-origin, so echo the header on every request until it expires.
+const PRIMARY_UNTIL_HEADER = 'X-Primary-Until';
+let primaryUntil: string | null = null;
+
+const stickyFetch: typeof fetch = async (input, init) => {
+  const headers = new Headers(init?.headers);
+  if (primaryUntil && parseFloat(primaryUntil) * 1000 > Date.now()) {
+    headers.set(PRIMARY_UNTIL_HEADER, primaryUntil);
+  }
+  const response = await fetch(input, { ...init, headers });
+  const until = response.headers.get(PRIMARY_UNTIL_HEADER);
+  if (until) {
+    primaryUntil = until;
+  }
+  return response;
+};
+
 export const graphqlClient = new GraphQLClient(GRAPHQL_URL, {
   headers: {
     'Content-Type': 'application/json',
   },
   errorPolicy: 'all',
   credentials: 'omit', // Don't send credentials for CORS
+  fetch: stickyFetch,
 });
 
 // Log the GraphQL URL in development
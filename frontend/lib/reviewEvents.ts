@@ -0,0 +1,71 @@
+const GRAPHQL_URL = process.env.NEXT_PUBLIC_GRAPHQL_URL || 'http://localhost:8000/graphql/';
+const EVENTS_URL = process.env.NEXT_PUBLIC_REVIEW_EVENTS_URL || GRAPHQL_URL.replace(/graphql\/?$/, 'events/reviews/');
+
+export interface ReviewAddedEvent {
+  review: {
+    id: string;
+    rating: number;
+    workload: number;
+    difficulty: number;
+    comment: string | null;
+    createdAt: string;
+    course: { code: string; title: string };
+    professor: { id: string; name: string; slug: string } | null;
+  };
+  course: {
+    code: string;
+    reviewCount: number;
+    avgRating: number | null;
+    avgWorkload: number | null;
+    avgDifficulty: number | null;
+  };
+  professor: { slug: string; reviewCount: number; avgRating: number | null } | null;
+}
+
+// How long to wait before reopening a stream the server refused (it answers
+// 503 when a worker already serves its limit of streams).
+const BUSY_RETRY_MS = 30000;
+
+// Listen for new reviews of a course or professor over server-sent events.
+// Returns a function that closes the stream.
+export function subscribeToReviews(
+  target: { courseCode?: string; professorSlug?: string },
+  onReview: (event: ReviewAddedEvent) => void,
+): () => void {
+  if (typeof window === 'undefined' || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  const params = new URLSearchParams();
+  if (target.courseCode) params.set('courseCode', target.courseCode);
+  if (target.professorSlug) params.set('professorSlug', target.professorSlug);
+
+  let source: EventSource | null = null;
+  let retryTimer: ReturnType<typeof setTimeout> | null = null;
+  let closed = false;
+
+  const open = () => {
+    retryTimer = null;
+    source = new EventSource(`${EVENTS_URL}?${params.toString()}`);
+    source.addEventListener('reviewAdded', (message) => {
+      try {
+        onReview(JSON.parse((message as MessageEvent).data));
+      } catch (error) {
+        console.error('Invalid review event:', error);
+      }
+    });
+    source.addEventListener('error', () => {
+      // EventSource reconnects by itself after a dropped stream, but gives
+      // up on an error status such as 503.
+      if (!closed && source?.readyState === EventSource.CLOSED && retryTimer === null) {
+        retryTimer = setTimeout(open, BUSY_RETRY_MS);
+      }
+    });
+  };
+
+  open();
+  return () => {
+    closed = true;
+    if (retryTimer !== null) clearTimeout(retryTimer);
+    source?.close();
+  };
+}